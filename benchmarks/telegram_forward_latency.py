@@ -0,0 +1,212 @@
+"""Telegram → Discord 转发延迟基准测试
+
+在本地启动一个模拟的 Telegram Bot API 服务，分别以 polling 和 webhook 模式运行
+TelegramBot，测量从 "Telegram 收到消息" 到 Discord 频道的 send 被调用的延迟。
+转发经过真实的 discord_forwarder.send_to_discord (构建 Embed、并发广播)，
+只有最终的频道是记录调用时间的替身，因此结果不包含 Discord API 本身的网络往返时间。
+
+用法:
+    python benchmarks/telegram_forward_latency.py --mode both --count 200
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from types import SimpleNamespace
+
+from aiohttp import ClientSession, web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+FAKE_TOKEN = "123456:benchmark"
+API_PORT = 18081
+WEBHOOK_PORT = 18082
+
+
+class FakeBotApi:
+    """最小化的 Bot API 模拟: getMe / getUpdates / setWebhook / deleteWebhook"""
+
+    def __init__(self):
+        self.pending = []
+        self.new_update = asyncio.Event()
+        self.webhook_url = None
+        self.secret_token = None
+        self.injected_at = {}
+        self._next_id = 1
+        self._runner = None
+        self._session = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", API_PORT).start()
+        self._session = ClientSession()
+
+    async def stop(self):
+        await self._session.close()
+        await self._runner.cleanup()
+
+    async def _params(self, request):
+        if request.content_type == "application/json":
+            return await request.json()
+        return dict(await request.post())
+
+    async def _handle(self, request):
+        method = request.match_info["method"]
+        params = await self._params(request)
+        handler = getattr(self, f"api_{method}", None)
+        if handler is None:
+            return web.json_response({"ok": True, "result": True})
+        return web.json_response({"ok": True, "result": await handler(params)})
+
+    async def api_getMe(self, params):
+        return {"id": 123456, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+
+    async def api_setWebhook(self, params):
+        self.webhook_url = params.get("url")
+        self.secret_token = params.get("secret_token")
+        return True
+
+    async def api_deleteWebhook(self, params):
+        self.webhook_url = None
+        return True
+
+    async def api_getUpdates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        self.pending = [u for u in self.pending if u["update_id"] >= offset]
+        if not self.pending and timeout:
+            self.new_update.clear()
+            try:
+                await asyncio.wait_for(self.new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(self.pending)
+
+    async def inject(self):
+        """模拟用户发送一条消息，返回消息文本"""
+        update_id = self._next_id
+        self._next_id += 1
+        text = f"bench-{update_id}"
+        update = {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": 1, "type": "private"},
+                "from": {"id": 2, "is_bot": False, "first_name": "bench"},
+                "text": text,
+            },
+        }
+        self.injected_at[text] = time.perf_counter()
+        if self.webhook_url:
+            await self._session.post(
+                self.webhook_url, json=update,
+                headers={"X-Telegram-Bot-Api-Secret-Token": self.secret_token or ""}
+            )
+        else:
+            self.pending.append(update)
+            self.new_update.set()
+        return text
+
+
+class RecordingChannel:
+    """记录 send 调用时间的 Discord 频道替身"""
+
+    id = 1
+    name = "benchmark"
+    guild = None
+
+    def __init__(self):
+        self.waiters = {}
+        self._next_message_id = 1
+
+    async def send(self, content=None, **kwargs):
+        now = time.perf_counter()
+        embed = kwargs.get("embed") or kwargs["embeds"][0]
+        waiter = self.waiters.pop(embed.description, None)
+        if waiter:
+            waiter.set_result(now)
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return SimpleNamespace(id=message_id, channel=self, content=content, attachments=[])
+
+
+class BenchmarkDiscordBot:
+    """Discord 端替身，经由真实的转发器发送到 RecordingChannel"""
+
+    def __init__(self):
+        self.channel = RecordingChannel()
+        self.channels = {self.channel.id: self.channel}
+
+    async def forward_message(self, payload, channel_id=None):
+        from module import discord_forwarder
+        await discord_forwarder.send_to_discord(self.channels, payload, self.channel.id)
+
+
+async def run_mode(mode: str, count: int):
+    from telegram_bot import TelegramBot
+    from utils.forward_dedup import forward_dedup
+
+    # 每种模式的模拟服务都从消息ID 1 开始，清空上一轮记录的来源消息
+    forward_dedup.clear()
+
+    config.TELEGRAM_BOT_TOKEN = FAKE_TOKEN
+    config.TELEGRAM_API_BASE_URL = f"http://127.0.0.1:{API_PORT}"
+    config.TELEGRAM_UPDATE_MODE = mode
+    config.TELEGRAM_WEBHOOK_URL = f"http://127.0.0.1:{WEBHOOK_PORT}"
+    config.TELEGRAM_WEBHOOK_LISTEN = "127.0.0.1"
+    config.TELEGRAM_WEBHOOK_PORT = WEBHOOK_PORT
+    config.SYNC_TG_TO_DISCORD = True
+
+    api = FakeBotApi()
+    await api.start()
+    discord_bot = BenchmarkDiscordBot()
+    bot = TelegramBot(discord_bot)
+    await bot.start()
+
+    latencies = []
+    loop = asyncio.get_running_loop()
+    try:
+        for _ in range(count):
+            future = loop.create_future()
+            text = f"bench-{api._next_id}"
+            discord_bot.channel.waiters[text] = future
+            await api.inject()
+            received_at = await asyncio.wait_for(future, timeout=15)
+            latencies.append((received_at - api.injected_at[text]) * 1000)
+    finally:
+        await bot.stop()
+        await api.stop()
+    return latencies
+
+
+def report(mode: str, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{mode:8s} n={len(latencies):4d}  "
+        f"min={latencies[0]:7.2f}ms  median={statistics.median(latencies):7.2f}ms  "
+        f"p95={p95:7.2f}ms  max={latencies[-1]:7.2f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Telegram 更新接收方式延迟对比")
+    parser.add_argument("--mode", choices=["polling", "webhook", "both"], default="both")
+    parser.add_argument("--count", type=int, default=100)
+    args = parser.parse_args()
+
+    modes = ["polling", "webhook"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        report(mode, await run_mode(mode, args.count))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
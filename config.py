@@ -10,6 +10,15 @@ BOT_NAME = os.getenv("BOT_NAME", "Telegram-Discord-Sync")
 # Telegram 配置
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHANNEL_ID = os.getenv("TELEGRAM_CHANNEL_ID")
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL") or None  # 自建 Bot API 服务地址，默认使用官方服务
+
+# Telegram 更新接收方式: polling (长轮询) 或 webhook (推送)
+TELEGRAM_UPDATE_MODE = os.getenv("TELEGRAM_UPDATE_MODE", "polling").lower()
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")  # Telegram 可访问的公网地址，如 https://example.com
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram/webhook")
+TELEGRAM_WEBHOOK_LISTEN = os.getenv("TELEGRAM_WEBHOOK_LISTEN", "0.0.0.0")
+TELEGRAM_WEBHOOK_PORT = int(os.getenv("TELEGRAM_WEBHOOK_PORT", 8443))
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET") or None  # 未配置时每次启动随机生成
 
 # Discord 配置
 DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN")
@@ -86,7 +95,8 @@ LOG_CHANNELS = [
 ]
 
 # 私聊器配置
-FEEDBACK_DATA_PATH = os.getenv("FEEDBACK_DATA_PATH", "./data/feedback.json")
+FEEDBACK_DATA_PATH = os.getenv("FEEDBACK_DATA_PATH", "./data/feedback.json")  # 旧版数据，存在时自动迁移到数据库
+FEEDBACK_DB_PATH = os.getenv("FEEDBACK_DB_PATH", "./data/feedback.db")
 REP_RATE  = int(os.getenv("REP_RATE", 1800))
 REJECT_COOLDOWN = int(os.getenv("REJECT_COOLDOWN", 86400))  # 1天冷却
 
@@ -103,3 +113,82 @@ KEEP_ALIVE_INTERVAL_HOURS = int(os.getenv("KEEP_ALIVE_INTERVAL_HOURS", 6))
 GITHUB_REPO_CONFIG_PATH = os.getenv("GITHUB_REPO_CONFIG_PATH", "./config/github_repo.json")
 GITHUB_COMMITS_CACHE_PATH = os.getenv("GITHUB_COMMITS_CACHE_PATH", "./data/github_commits_cache.json")
 GITHUB_CHECK_INTERVAL = int(os.getenv("GITHUB_CHECK_INTERVAL", 300))  # 默认 5 分钟 (300秒)
+
+# 广播配置
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 5))  # 同时进行中的发送数量上限
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", 3))  # 遇到 429 限速时的最大重试次数
+TEXT_IMAGE_FANOUT = os.getenv("TEXT_IMAGE_FANOUT", "true").lower() == "true"  # /text 图片只上传一次，其余频道复用链接
+
+# 频道解析缓存配置
+CHANNEL_CACHE_TTL = int(os.getenv("CHANNEL_CACHE_TTL", 600))  # 通过API获取的频道对象缓存时间(秒)
+CHANNEL_NEGATIVE_CACHE_TTL = int(os.getenv("CHANNEL_NEGATIVE_CACHE_TTL", 3600))  # 不可访问频道ID的缓存时间(秒)
+
+# Webhook 发送通道配置 (格式: "channel1,channel2")，列出的频道改用 Webhook 发送
+WEBHOOK_CHANNELS = [
+    int(channel_id.strip())
+    for channel_id in os.getenv("WEBHOOK_CHANNELS", "").split(",")
+    if channel_id.strip()
+]
+WEBHOOK_DATA_PATH = os.getenv("WEBHOOK_DATA_PATH", "./data/webhooks.json")
+WEBHOOK_TG_USERNAME = os.getenv("WEBHOOK_TG_USERNAME", "Telegram")  # 转发 Telegram 消息时 Webhook 显示的用户名
+WEBHOOK_TG_AVATAR_URL = os.getenv("WEBHOOK_TG_AVATAR_URL") or None  # 转发 Telegram 消息时 Webhook 显示的头像
+
+# Telegram→Discord 出站队列配置
+OUTBOUND_QUEUE_ENABLED = os.getenv("OUTBOUND_QUEUE_ENABLED", "true").lower() == "true"
+OUTBOUND_QUEUE_PATH = os.getenv("OUTBOUND_QUEUE_PATH", "./data/outbound_queue.db")
+OUTBOUND_QUEUE_WORKERS = int(os.getenv("OUTBOUND_QUEUE_WORKERS", 4))  # 并发投递的工作协程数量
+OUTBOUND_QUEUE_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_QUEUE_MAX_ATTEMPTS", 8))  # 超过后转入死信
+OUTBOUND_QUEUE_DEAD_RETENTION = float(os.getenv("OUTBOUND_QUEUE_DEAD_RETENTION", 7 * 86400))  # 死信保留时间(秒)，过期后自动删除
+
+# 频道日志批量发送配置
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", 2))  # 批量发送间隔(秒)
+LOG_STORM_THRESHOLD = int(os.getenv("LOG_STORM_THRESHOLD", 30))  # 单次积压超过此数量时合并为汇总
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", 3))  # 广播进度消息的最小更新间隔(秒)
+
+# Telegram 相册合并配置
+TG_MEDIA_GROUP_WINDOW = float(os.getenv("TG_MEDIA_GROUP_WINDOW", 1.5))  # 等待同一相册其余消息的时间(秒)
+TG_FILE_URL_TTL = int(os.getenv("TG_FILE_URL_TTL", 3600))  # Telegram 文件下载链接缓存时间(秒)，file_path 至少 1 小时有效
+
+# Telegram 媒体流式转存配置 (格式: "photo,video,document")，列出的类型转存为 Discord 附件，其余保持链接
+TG_REHOST_MEDIA = frozenset(
+    kind.strip().lower()
+    for kind in os.getenv("TG_REHOST_MEDIA", "").split(",")
+    if kind.strip()
+)
+TG_REHOST_MAX_BYTES = int(os.getenv("TG_REHOST_MAX_BYTES", 10 * 1024 * 1024))  # 单条消息上传上限(字节)，同时受服务器上传限制约束
+TG_REHOST_CHUNK_SIZE = int(os.getenv("TG_REHOST_CHUNK_SIZE", 64 * 1024))  # 流式转存的分块大小(字节)
+TG_REHOST_BUFFER_CHUNKS = int(os.getenv("TG_REHOST_BUFFER_CHUNKS", 16))  # 每个文件最多缓冲的分块数量
+TG_REHOST_READ_TIMEOUT = float(os.getenv("TG_REHOST_READ_TIMEOUT", 30))  # 等待 Telegram 数据的超时时间(秒)
+
+# Telegram 发送限速配置 (每个会话独立计算)
+TG_SEND_PER_MINUTE = float(os.getenv("TG_SEND_PER_MINUTE", 20))  # 每分钟允许发送的消息数，群组/频道的限制约为 20 条
+TG_SEND_BURST = float(os.getenv("TG_SEND_BURST", 3))  # 允许的突发发送数量
+
+# Telegram file_id 缓存配置 (相同内容的本地图片只上传一次)
+TG_FILE_ID_CACHE_PATH = os.getenv("TG_FILE_ID_CACHE_PATH", "./data/telegram_file_ids.json")
+TG_FILE_ID_CACHE_SIZE = int(os.getenv("TG_FILE_ID_CACHE_SIZE", 1000))  # 最多保存的条目数，超出时淘汰最久未使用的
+
+# Discord→Telegram 实时镜像配置 (格式: "channel1,channel2")，需同时启用 SYNC_DISCORD_TO_TG
+DISCORD_MIRROR_CHANNELS = [
+    int(channel_id.strip())
+    for channel_id in os.getenv("DISCORD_MIRROR_CHANNELS", "").split(",")
+    if channel_id.strip()
+]
+DISCORD_MIRROR_WINDOW = float(os.getenv("DISCORD_MIRROR_WINDOW", 2))  # 合并发送的窗口(秒)
+
+# 跨平台转发去重配置
+FORWARD_DEDUP_TTL = int(os.getenv("FORWARD_DEDUP_TTL", 300))  # 指纹保留时间(秒)
+FORWARD_DEDUP_SIZE = int(os.getenv("FORWARD_DEDUP_SIZE", 4096))  # 最多保留的指纹数量
+
+# JSON 状态存储配置 (反馈、保活、图片元数据等)，修改后延迟合并写入
+JSON_STORE_FLUSH_DELAY = float(os.getenv("JSON_STORE_FLUSH_DELAY", 1))  # 延迟落盘的时间(秒)
+
+# /fetch 图片库目录配置
+FETCH_CATALOG_REFRESH_INTERVAL = float(os.getenv("FETCH_CATALOG_REFRESH_INTERVAL", 5))  # 检查目录变化的最小间隔(秒)
+
+# /fetch_upd 图片下载配置
+FETCH_UPLOAD_MAX_BYTES = int(os.getenv("FETCH_UPLOAD_MAX_BYTES", 10 * 1024 * 1024))  # 单张图片大小上限(字节)
+FETCH_UPLOAD_CONNECT_TIMEOUT = float(os.getenv("FETCH_UPLOAD_CONNECT_TIMEOUT", 10))  # 建立连接的超时时间(秒)
+FETCH_UPLOAD_READ_TIMEOUT = float(os.getenv("FETCH_UPLOAD_READ_TIMEOUT", 30))  # 等待数据的超时时间(秒)
+FETCH_UPLOAD_CONCURRENCY = int(os.getenv("FETCH_UPLOAD_CONCURRENCY", 3))  # 同时下载的图片数量上限
+FETCH_UPLOAD_MAX_URLS = int(os.getenv("FETCH_UPLOAD_MAX_URLS", 10))  # 单条命令最多提交的图片URL数量
@@ -4,11 +4,19 @@ import logging
 import asyncio
 import config
 from utils.channel_logger import ChannelLogger
+from utils import channel_utils, http_session, json_store
+from utils.routing_index import RoutingIndex
+from utils.webhook_transport import WebhookTransport
+from utils.forward_payload import ForwardPayload
+from utils.telegram_media import refresh_media_urls
+from utils.outbound_queue import OutboundQueue, PermanentDeliveryError
 
 # 导入拆分出去的模块
 import module.discord_commands as discord_commands
 import module.discord_forwarder as discord_forwarder
+from module.discord_mirror import DiscordMirror
 from module.commands import keep_alive_utils
+from module.feedback import feedback_store, FeedbackActionButton, FeedbackView
 from module.github_monitor import GitHubMonitor
 
 # 设置日志
@@ -27,6 +35,22 @@ class DiscordBot(discord.Client):
         self.tree = app_commands.CommandTree(self)
         self.telegram_bot = telegram_bot
         self.channels = {}  # 存储多个频道 {channel_id: channel_object}
+        self.routing_index = None  # 转发路由索引，在 on_ready 中构建
+        self.webhook_transport = None  # Webhook 发送通道
+        if config.WEBHOOK_CHANNELS:
+            self.webhook_transport = WebhookTransport(self, config.WEBHOOK_DATA_PATH, config.WEBHOOK_CHANNELS)
+        self.outbound_queue = None  # Telegram→Discord 持久化出站队列
+        if config.OUTBOUND_QUEUE_ENABLED:
+            self.outbound_queue = OutboundQueue(
+                config.OUTBOUND_QUEUE_PATH,
+                self._deliver_forward,
+                workers=config.OUTBOUND_QUEUE_WORKERS,
+                max_attempts=config.OUTBOUND_QUEUE_MAX_ATTEMPTS,
+                dead_retention=config.OUTBOUND_QUEUE_DEAD_RETENTION
+            )
+        self.mirror = None  # Discord→Telegram 实时镜像
+        if config.SYNC_DISCORD_TO_TG and config.DISCORD_MIRROR_CHANNELS:
+            self.mirror = DiscordMirror(self, config.DISCORD_MIRROR_CHANNELS, config.DISCORD_MIRROR_WINDOW)
         self.channel_logger = ChannelLogger(__name__)
         self.github_monitor = None  # GitHub 监听器
     
@@ -62,6 +86,16 @@ class DiscordBot(discord.Client):
                         logger.error(f"在服务器 {guild.name} 中无法找到频道 ID: {channel_id}")
         except Exception as e:
             logger.error(f"设置 Discord 频道时出错: {e}")
+
+        # 构建转发路由索引
+        self.routing_index = RoutingIndex.build(self.channels, config.SPECIAL_CHANNELS)
+
+        # 频道就绪后再开始投递出站队列
+        if self.outbound_queue:
+            try:
+                await self.outbound_queue.start()
+            except Exception as e:
+                logger.error(f"启动出站队列时出错: {e}")
         
         # 启动 GitHub 监听器
         try:
@@ -72,17 +106,81 @@ class DiscordBot(discord.Client):
             logger.error(f"启动 GitHub 监听器时出错: {e}")
     
     
+    async def on_message(self, message):
+        """镜像指定频道的消息到 Telegram"""
+        if self.mirror and self.telegram_bot:
+            self.mirror.handle(message)
+
+    async def on_guild_channel_delete(self, channel):
+        """频道删除时使解析缓存失效并更新路由索引"""
+        channel_utils.channel_cache.mark_inaccessible(channel.id)
+        if self.channels.pop(channel.id, None) is not None and self.routing_index:
+            self.routing_index.remove_channel(channel.id)
+            logger.info(f"已配置的频道 {channel.id} 已被删除，已从路由索引移除")
+        logger.debug(f"频道 {channel.id} 已删除，已更新频道解析缓存")
+
+    async def on_guild_channel_update(self, before, after):
+        """频道更新时使解析缓存失效并更新路由索引"""
+        channel_utils.channel_cache.invalidate(after.id)
+        if after.id in self.channels:
+            self.channels[after.id] = after
+            if self.routing_index:
+                self.routing_index.add_channel(after)
+
+    async def on_thread_delete(self, thread):
+        """子区删除时使解析缓存失效"""
+        await self.on_guild_channel_delete(thread)
+
+    async def on_thread_update(self, before, after):
+        """子区更新时使解析缓存失效"""
+        await self.on_guild_channel_update(before, after)
+
     async def setup_hook(self):
         """设置斜 slash 命令"""
         # 从 discord_commands 模块注册命令
         discord_commands.register_commands(self.tree, self)
         logger.info("Discord 命令已注册")
 
+        # 私聊按钮: 反馈ID编码在 custom_id 中，注册后重启前发送的按钮仍然有效
+        self.add_dynamic_items(FeedbackActionButton)
+        self.add_view(FeedbackView())
+
     # send_to_discord 方法已移至 discord_forwarder.py
     # 保留一个调用转发器的方法
-    async def forward_message(self, message, channel_id=None):
-         """调用 discord_forwarder 来发送消息"""
-         await discord_forwarder.send_to_discord(self.channels, message, channel_id)
+    async def forward_message(self, payload: ForwardPayload, channel_id=None):
+         """调用 discord_forwarder 来发送消息，启用出站队列时只入队并立即返回"""
+         if not self.outbound_queue:
+             await discord_forwarder.send_to_discord(
+                 self.channels, payload, channel_id, self.routing_index, self.webhook_transport
+             )
+             return
+
+         target_channels = discord_forwarder.resolve_target_channels(self.channels, channel_id, self.routing_index)
+         if not target_channels:
+             logger.error("计算后没有目标 Discord 频道，无法发送消息")
+             return
+         count = await self.outbound_queue.enqueue(
+             [channel.id for channel in target_channels], payload.stamp().to_dict()
+         )
+         logger.info(f"消息已加入出站队列，共 {count} 个目标频道")
+
+    async def _deliver_forward(self, channel_id, payload):
+        """出站队列的投递函数"""
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            raise PermanentDeliveryError(f"频道 {channel_id} 不在机器人配置中")
+        payload = ForwardPayload.from_dict(payload)
+        # 队列中只保存 Telegram 文件ID，投递时再获取下载链接 (链接约 1 小时后失效)
+        if self.telegram_bot is not None:
+            await refresh_media_urls(self.telegram_bot.application.bot, payload.media)
+        payload.media = [item for item in payload.media if item.url]
+        try:
+            await discord_forwarder.deliver_to_channel(channel, payload, self.webhook_transport)
+        except discord.HTTPException as e:
+            # 无权限、频道不存在等 4xx 错误重试不会成功 (文本回退已在 deliver_to_channel 中尝试过)
+            if discord_forwarder.is_client_error(e):
+                raise PermanentDeliveryError(str(e)) from e
+            raise
 
 
     async def start_bot(self):
@@ -94,5 +192,23 @@ class DiscordBot(discord.Client):
         # 停止 GitHub 监听器
         if self.github_monitor:
             self.github_monitor.stop()
+
+        # 停止出站队列，未投递的消息保留到下次启动
+        if self.outbound_queue:
+            await self.outbound_queue.stop()
+
+        # 发送剩余的镜像消息
+        if self.mirror:
+            await self.mirror.close()
+
+        # 发送剩余的频道日志
+        await self.channel_logger.close()
+
+        # 关闭 Webhook 等组件共享的 HTTP 会话
+        await http_session.close_session()
+
+        # 写入各 JSON 存储中尚未落盘的修改
+        await json_store.close_all()
+        feedback_store.close()
         
         await super().close()
@@ -4,6 +4,8 @@ import logging
 import json
 from datetime import datetime
 from discord.ui import Button, View
+from utils.file_utils import fetch_metadata_store
+from utils.fetch_catalog import fetch_catalog
 
 logger = logging.getLogger(__name__)
 
@@ -28,20 +30,25 @@ class ConfirmDeleteView(View):
 
     async def handle_delete(self, interaction: discord.Interaction):
         try:
-            file_path = os.path.join(self.base_path, self.item['relative_path'])
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            
-            # 更新元数据文件
-            metadata_path = os.path.join(self.base_path, 'metadata.json')
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata_list = json.load(f)
-            
-            updated_metadata = [item for item in metadata_list if item['relative_path'] != self.item['relative_path']]
-            
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(updated_metadata, f, ensure_ascii=False, indent=2)
-            
+            # 更新元数据，按实际移除的条目释放引用
+            # (多人同时确认或重复点击时，后到的请求不会再次释放同一个引用)
+            async with fetch_metadata_store(self.base_path).transaction() as metadata_list:
+                removed = [item for item in metadata_list if item['relative_path'] == self.item['relative_path']]
+                metadata_list[:] = [item for item in metadata_list if item['relative_path'] != self.item['relative_path']]
+                for item in removed:
+                    if item.get('blob_path'):
+                        # 内容寻址存储中的文件只在最后一个引用删除时才删除
+                        await fetch_catalog.blobs.release(item['blob_path'])
+            if not removed:
+                await interaction.response.send_message(f"❌ 文件已被删除: {self.filename}", ephemeral=True)
+                return
+            fetch_catalog.remove(self.item['relative_path'])
+
+            if any(not item.get('blob_path') for item in removed):
+                file_path = os.path.join(self.base_path, self.item['relative_path'])
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
             logger.info(f"用户 {interaction.user.name} 删除了文件: {self.filename}")
             await interaction.response.send_message(
                 f"✅ 文件已删除: {self.filename}", 
@@ -70,16 +77,13 @@ async def delete_image(interaction: discord.Interaction, filename: str, base_pat
         base_path: 基础存储路径，默认为"data/fetch"
     """
     try:
-        metadata_path = os.path.join(base_path, 'metadata.json')
-        
-        # 读取元数据文件
-        if not os.path.exists(metadata_path):
-            await interaction.response.send_message("❌ 元数据文件不存在", ephemeral=True)
+        # 确保图片库已加载 (包括旧数据迁移和引用计数)
+        await fetch_catalog.refresh()
+        metadata_list = fetch_metadata_store(base_path).data
+        if not metadata_list:
+            await interaction.response.send_message("❌ 元数据为空", ephemeral=True)
             return
             
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            metadata_list = json.load(f)
-            
         # 查找匹配的文件
         found_item = None
         for item in metadata_list:
@@ -1,132 +1,233 @@
 import os
+import re
+import asyncio
+import aiohttp
 import discord
 import logging
-import requests
 from urllib.parse import urlparse
-import json
 from datetime import datetime
+import config
+from utils.file_utils import fetch_metadata_store
+from utils.fetch_catalog import fetch_catalog
+from utils.http_session import get_session
 
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 64 * 1024
+
+# 判断图片格式需要读取的文件头长度 (PNG/JPEG/GIF/WEBP)
+_MAGIC_HEADER_SIZE = 12
+# 部分图床不返回图片类型，这类响应只按文件头判断
+_GENERIC_CONTENT_TYPES = ('application/octet-stream', 'binary/octet-stream')
+_URL_SPLIT = re.compile(r"[\s,，]+")
+DUPLICATE_NOTE = " (内容与已有图片相同，未占用额外空间)"
+
+class ImageRejected(Exception):
+    """下载的内容不是允许的图片或超过大小限制"""
+
+def _sniff_extension(head: bytes):
+    """根据文件头判断图片格式，返回扩展名，无法识别时返回 None"""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return '.png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return '.jpg'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return '.gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+def _unique_filename(metadata_list, save_filename):
+    """文件名已被其他条目使用时追加序号，避免同名条目互相覆盖"""
+    used = {item.get('saved_filename') for item in metadata_list}
+    if save_filename not in used:
+        return save_filename
+    stem, ext = os.path.splitext(save_filename)
+    index = 2
+    while f"{stem}_{index}{ext}" in used:
+        index += 1
+    return f"{stem}_{index}{ext}"
+
+async def _store_upload(interaction: discord.Interaction, chunks, filename: str, save_filename: str, base_path: str):
+    """
+    流式写入内容寻址存储并登记元数据
+    Args:
+        chunks: 异步迭代的文件分块，写入时同时计算 SHA-256
+    Returns:
+        (metadata, 是否与已有图片内容相同)
+    """
+    ext = os.path.splitext(save_filename)[1]
+    date_str = datetime.now().strftime("%Y-%m-%d")
+    async with fetch_catalog.blobs.writer(ext) as writer:
+        async for chunk in chunks:
+            await writer.write(chunk)
+        # 放入存储和登记引用在元数据锁内进行，与删除时的引用释放互斥
+        async with fetch_metadata_store(base_path).transaction() as metadata_list:
+            digest, blob_path = await writer.commit()
+            try:
+                duplicate = fetch_catalog.blobs.references(blob_path) > 1
+                save_filename = _unique_filename(metadata_list, save_filename)
+                metadata = {
+                    'original_filename': filename,
+                    'uploader_id': str(interaction.user.id),
+                    'uploader_name': interaction.user.name,
+                    'upload_time': datetime.now().isoformat(),
+                    'saved_filename': save_filename,
+                    # 逻辑路径，按日期分组显示；实际文件位于 blob_path
+                    'relative_path': os.path.join(date_str, save_filename),
+                    'guild_id': str(interaction.guild.id) if interaction.guild else None,
+                    'sha256': digest,
+                    'blob_path': blob_path,
+                    'size': writer.size,
+                }
+                metadata_list.append(metadata)
+            except BaseException:
+                # 没有元数据条目指向这次登记的引用，释放它 (最后一个引用时同时删除文件)
+                await fetch_catalog.blobs.release(blob_path)
+                raise
+    fetch_catalog.add_upload(metadata)
+    return metadata, duplicate
+
+async def _download_image(interaction: discord.Interaction, url: str, filename: str, stem: str, base_path: str):
+    """
+    通过共享会话流式下载图片并写入存储，边下载边检查类型和大小
+    Args:
+        filename: 原始文件名
+        stem: 保存的文件名 (不含扩展名)，扩展名按文件头确定
+    Returns:
+        (metadata, 是否与已有图片内容相同)
+    Raises:
+        ImageRejected: 不是允许的图片格式或超过 FETCH_UPLOAD_MAX_BYTES
+    """
+    limit = config.FETCH_UPLOAD_MAX_BYTES
+    timeout = aiohttp.ClientTimeout(
+        total=None,
+        sock_connect=config.FETCH_UPLOAD_CONNECT_TIMEOUT,
+        sock_read=config.FETCH_UPLOAD_READ_TIMEOUT
+    )
+    session = await get_session()
+    async with session.get(url, timeout=timeout) as response:
+        response.raise_for_status()
+        content_type = response.content_type
+        if not content_type.startswith('image/') and content_type not in _GENERIC_CONTENT_TYPES:
+            raise ImageRejected(f"不是图片 ({content_type})")
+        if response.content_length and response.content_length > limit:
+            raise ImageRejected(f"文件大小 {response.content_length} 字节超过上限 {limit} 字节")
+
+        # 先读取文件头确认格式，再开始写入
+        chunks = response.content.iter_chunked(CHUNK_SIZE)
+        head = b''
+        async for chunk in chunks:
+            head += chunk
+            if len(head) >= _MAGIC_HEADER_SIZE:
+                break
+        ext = _sniff_extension(head)
+        if ext is None:
+            raise ImageRejected("文件内容不是 PNG/JPEG/GIF/WEBP 图片")
+
+        async def body():
+            received = len(head)
+            if received > limit:
+                raise ImageRejected(f"文件超过大小上限 {limit} 字节")
+            yield head
+            async for chunk in chunks:
+                received += len(chunk)
+                # Content-Length 可能缺失或不准确，按实际接收的字节数截断
+                if received > limit:
+                    raise ImageRejected(f"文件超过大小上限 {limit} 字节")
+                yield chunk
+
+        return await _store_upload(interaction, body(), filename, f"{stem}{ext}", base_path)
+
+async def _attachment_chunks(image_file):
+    """通过共享会话从 CDN 分块读取附件 (附件不做图片格式和大小检查，与原逻辑一致)"""
+    session = await get_session()
+    async with session.get(image_file.url) as response:
+        response.raise_for_status()
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            yield chunk
+
+async def _log_saved(interaction: discord.Interaction, metadata: dict, duplicate: bool, additional_info: str):
+    save_filename = metadata['saved_filename']
+    note = DUPLICATE_NOTE if duplicate else ""
+    logger.info(f"用户 {interaction.user.name} 上传的图片已保存为: {save_filename}{note}")
+    if hasattr(interaction.client, 'channel_logger'):
+        await interaction.client.channel_logger.send_to_channel(
+            source="调取小助手",
+            module="upload_image",
+            description=f"用户 <@{interaction.user.id}> 上传的图片已保存为: {save_filename}",
+            additional_info=f"{additional_info}\nSHA-256: {metadata['sha256']}",
+        )
+    else:
+        logger.info(f"用户 {interaction.user.name} 上传的图片已保存为: {save_filename} (未发送到频道，未找到channel_logger)")
+
+def _saved_line(metadata: dict, duplicate: bool) -> str:
+    note = DUPLICATE_NOTE if duplicate else ""
+    return f"✅ 图片已保存为: {metadata['saved_filename']}{note}"
+
+def _parse_urls(image_url: str):
+    """拆分以空格、换行或逗号分隔的多个图片URL"""
+    return [url for url in _URL_SPLIT.split(image_url or '') if url]
+
 async def upload_image(interaction: discord.Interaction, context: str, image_url: str, sender: str, image_file=None, base_path: str = "data/fetch"):
     """处理图片上传并保存到本地
     Args:
+        image_url: 图片URL，多个URL用空格或逗号分隔，按 FETCH_UPLOAD_CONCURRENCY 并发下载，
+            下载时检查图片格式和 FETCH_UPLOAD_MAX_BYTES (附件不检查)
         base_path: 基础存储路径，默认为"data/fetch"
         image_file: discord.Attachment 或 None
     """
-    # 按日期创建子目录 (YYYY-MM-DD)
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    upload_dir = os.path.join(base_path, date_str)
-    os.makedirs(upload_dir, exist_ok=True)  # 确保目录存在
-    sender_id = str(interaction.user.id)
+    stem = f"{sender}_{context}"
 
     # 附件上传
     if image_file is not None:
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        # 确保图片库已加载 (包括旧数据迁移和引用计数)
+        await fetch_catalog.refresh()
         try:
-            filename = image_file.filename
-            ext = os.path.splitext(filename)[1] or '.png'
-            save_filename = f"{sender}_{context}{ext}"
-            save_path = os.path.join(upload_dir, save_filename)
-            file_bytes = await image_file.read()
-            with open(save_path, 'wb') as f:
-                f.write(file_bytes)
-            metadata = {
-                'original_filename': filename,
-                'uploader_id': sender_id,
-                'uploader_name': interaction.user.name,
-                'upload_time': datetime.now().isoformat(),
-                'saved_filename': save_filename,
-                'relative_path': os.path.join(date_str, save_filename),
-                'guild_id': str(interaction.guild.id) if interaction.guild else None,
-            }
-            metadata_path = os.path.join(base_path, 'metadata.json')
-            try:
-                if os.path.exists(metadata_path):
-                    with open(metadata_path, 'r', encoding='utf-8') as f:
-                        existing_data = json.load(f)
-                else:
-                    existing_data = []
-                existing_data.append(metadata)
-                with open(metadata_path, 'w', encoding='utf-8') as f:
-                    json.dump(existing_data, f, ensure_ascii=False, indent=2)
-            except Exception as e:
-                print(f"无法保存元数据: {str(e)}")
-            logger.info(f"用户 {interaction.user.name} 上传的图片已保存为: {save_filename}")
-            await interaction.response.send_message(
-                f"✅ 图片已保存为: {save_filename}",
-                ephemeral=True
+            ext = os.path.splitext(image_file.filename)[1] or '.png'
+            metadata, duplicate = await _store_upload(
+                interaction, _attachment_chunks(image_file), image_file.filename, f"{stem}{ext}", base_path
             )
-            if hasattr(interaction.client, 'channel_logger'):
-                await interaction.client.channel_logger.send_to_channel(
-                    source="调取小助手",
-                    module="upload_image",
-                    description=f"用户 <@{interaction.user.id}> 上传的图片已保存为: {save_filename}",
-                    additional_info=f"图片文件: {filename}",
-                )
-            else:
-                logger.info(f"用户 {interaction.user.name} 上传的图片已保存为: {save_filename} (未发送到频道，未找到channel_logger)")
+            await _log_saved(interaction, metadata, duplicate, f"图片文件: {image_file.filename}")
+            await interaction.followup.send(_saved_line(metadata, duplicate), ephemeral=True)
         except Exception as e:
             logger.error(f"用户 {interaction.user.name} 上传的图片保存失败 {str(e)}")
-            await interaction.response.send_message(
-                f"❌ 上传失败: {str(e)}",
-                ephemeral=True
-            )
+            await interaction.followup.send(f"❌ 上传失败: {str(e)}", ephemeral=True)
         return
 
     # URL 上传
-    if not image_url or not image_url.startswith(('http://', 'https://')):
+    urls = _parse_urls(image_url)
+    if not urls or any(not url.startswith(('http://', 'https://')) for url in urls):
         await interaction.response.send_message("❌ 无效的图片URL", ephemeral=True)
         return
-
-    try:
-        response = requests.get(image_url, stream=True)
-        response.raise_for_status()
-        parsed = urlparse(image_url)
-        filename = os.path.basename(parsed.path)
-        ext = os.path.splitext(filename)[1] or '.png'
-        save_filename = f"{sender}_{context}{ext}"
-        save_path = os.path.join(upload_dir, save_filename)
-        with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(1024):
-                f.write(chunk)
-        metadata = {
-            'original_filename': filename,
-            'uploader_id': sender_id,
-            'uploader_name': interaction.user.name,
-            'upload_time': datetime.now().isoformat(),
-            'saved_filename': save_filename,
-            'relative_path': os.path.join(date_str, save_filename),
-            'guild_id': str(interaction.guild.id) if interaction.guild else None,
-        }
-        metadata_path = os.path.join(base_path, 'metadata.json')
-        try:
-            if os.path.exists(metadata_path):
-                with open(metadata_path, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-            else:
-                existing_data = []
-            existing_data.append(metadata)
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(existing_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"无法保存元数据: {str(e)}")
-        logger.info(f"用户 {interaction.user.name} 上传的图片已保存为: {save_filename}")
+    if len(urls) > config.FETCH_UPLOAD_MAX_URLS:
         await interaction.response.send_message(
-            f"✅ 图片已保存为: {save_filename}",
-            ephemeral=True
-        )
-        if hasattr(interaction.client, 'channel_logger'):
-            await interaction.client.channel_logger.send_to_channel(
-                source="调取小助手",
-                module="upload_image",
-                description=f"用户 <@{interaction.user.id}> 上传的图片已保存为: {save_filename}",
-                additional_info=f"图片URL: {image_url}",
-            )
-        else:
-            logger.info(f"用户 {interaction.user.name} 上传的图片已保存为: {save_filename} (未发送到频道，未找到channel_logger)")
-    except Exception as e:
-        logger.error(f"用户 {interaction.user.name} 上传的图片保存失败 {str(e)}")
-        await interaction.response.send_message(
-            f"❌ 上传失败: {str(e)}",
+            f"❌ 一次最多上传 {config.FETCH_UPLOAD_MAX_URLS} 个图片URL",
             ephemeral=True
         )
+        return
+
+    # 下载可能耗时较长，先延迟响应避免交互超时
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    await fetch_catalog.refresh()
+    semaphore = asyncio.Semaphore(config.FETCH_UPLOAD_CONCURRENCY)
+
+    async def ingest(url: str) -> str:
+        async with semaphore:
+            try:
+                filename = os.path.basename(urlparse(url).path)
+                metadata, duplicate = await _download_image(interaction, url, filename, stem, base_path)
+            except Exception as e:
+                # aiohttp 的超时异常没有消息文本
+                reason = str(e) or type(e).__name__
+                logger.error(f"用户 {interaction.user.name} 上传的图片保存失败 {url}: {reason}")
+                return f"❌ {url}: {reason}"
+        await _log_saved(interaction, metadata, duplicate, f"图片URL: {url}")
+        return _saved_line(metadata, duplicate)
+
+    lines = await asyncio.gather(*(ingest(url) for url in urls))
+    if len(urls) > 1:
+        saved = sum(line.startswith("✅") for line in lines)
+        lines = [f"已保存 {saved}/{len(urls)} 张图片"] + list(lines)
+    await interaction.followup.send("\n".join(lines)[:2000], ephemeral=True)
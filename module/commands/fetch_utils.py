@@ -1,55 +1,43 @@
 import os
-import random
 import discord
 import logging
-import json
 import config
 from utils.channel_logger import ChannelLogger
+from utils.fetch_catalog import fetch_catalog
 
 logger = logging.getLogger(__name__)
 async def fetch_images(interaction: discord.Interaction, filename: str = None, message_link: str = None):
-    """扫描data/fetch目录并发送指定或随机图片到当前频道或回复指定消息"""
-    image_dir = "data/fetch"
-    if not os.path.exists(image_dir):
-        await interaction.response.send_message("图片目录不存在", ephemeral=True)
-        return
-
-    images = []
-    for root, _, files in os.walk(image_dir):
-        for f in files:
-            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp')):
-                images.append(os.path.join(root, f))
-    
-    if not images:
+    """从图片库目录中发送指定或随机图片到当前频道或回复指定消息"""
+    await fetch_catalog.refresh()
+    if not len(fetch_catalog):
         await interaction.response.send_message("目录中没有图片", ephemeral=True)
         return
 
+    current_guild = str(interaction.guild.id) if interaction.guild else None
+    is_admin = str(interaction.user.id) in config.AUTHORIZED_USERS
+
     if filename:
         # 只比较文件名部分，忽略路径
-        selected = next((f for f in images if os.path.basename(f).lower() == os.path.basename(filename).lower()), None)
-        if not selected:
+        rel_path = fetch_catalog.find(filename)
+        if not rel_path:
             await interaction.response.send_message(f"未找到文件: {filename}", ephemeral=True)
             return
+        # 检查图片服务器权限
+        image_guild = fetch_catalog.guild_of(rel_path)
+        if not is_admin and current_guild and fetch_catalog.has_metadata(rel_path) and image_guild != current_guild:
+            await interaction.response.send_message("❌ 无权调取其他服务器的图片", ephemeral=True)
+            return
     else:
-        selected = random.choice(images)
-
-    # 检查图片服务器权限
-    metadata_path = os.path.join("data/fetch", "metadata.json")
-    if os.path.exists(metadata_path):
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            metadata_list = json.load(f)
-        
-        image_meta = next((m for m in metadata_list if m['saved_filename'] == os.path.basename(selected)), None)
-        if image_meta:
-            current_guild = str(interaction.guild.id) if interaction.guild else None
-            if str(interaction.user.id) in config.AUTHORIZED_USERS:
-                pass
-            elif current_guild and image_meta['guild_id'] != current_guild:
-                await interaction.response.send_message("❌ 无权调取其他服务器的图片", ephemeral=True)
-                return
+        # 随机调取只在当前服务器可见的图片中选择
+        rel_path = fetch_catalog.random_choice(current_guild, is_admin)
+        if not rel_path:
+            await interaction.response.send_message("目录中没有本服务器的图片", ephemeral=True)
+            return
+    selected = fetch_catalog.path_of(rel_path)
 
     with open(selected, 'rb') as f:
-        picture = discord.File(f)
+        # 内容寻址存储中的文件名是哈希，发送时使用原来的文件名
+        picture = discord.File(f, filename=os.path.basename(rel_path))
         
         if message_link:
             try:
@@ -70,7 +58,7 @@ async def fetch_images(interaction: discord.Interaction, filename: str = None, m
                     await interaction.client.channel_logger.send_to_channel(
                         source="调取小助手",
                         module="fetch_images",
-                        description=f"用户 {interaction.user.name} 回复了消息 {message_id} 的图片: {os.path.basename(selected)}",
+                        description=f"用户 {interaction.user.name} 回复了消息 {message_id} 的图片: {os.path.basename(rel_path)}",
                         additional_info=f"图片路径: {selected} \n \n 频道: <#{interaction.channel.id}> \n 用户id: <@{interaction.user.id}>",
                     )
                 
@@ -79,6 +67,7 @@ async def fetch_images(interaction: discord.Interaction, filename: str = None, m
                     await channel.send(file=picture, reference=message)
                 else:
                     await message.reply(file=picture)
+                fetch_catalog.record_fetch(rel_path)
                 await interaction.response.send_message("已回复指定消息", ephemeral=True)
                 logger.info(f"已回复消息 {message_id}")
             except Exception as e:
@@ -86,12 +75,13 @@ async def fetch_images(interaction: discord.Interaction, filename: str = None, m
                 logger.error(f"回复消息失败: {e}")
         else:
             await interaction.response.send_message(file=picture)
+            fetch_catalog.record_fetch(rel_path)
             if hasattr(interaction.client, 'channel_logger'):
                 await interaction.client.channel_logger.send_to_channel(
                     source="调取小助手",
                     module="fetch_images",
-                    description=f"用户 {interaction.user.name} 发送了图片: {os.path.basename(selected)}",
+                    description=f"用户 {interaction.user.name} 发送了图片: {os.path.basename(rel_path)}",
                     additional_info=f"图片路径: {selected} \n 频道: <#{interaction.channel.id}> \n 用户id: <@{interaction.user.id}>",
                 )
             else:
-                logger.info(f"用户 {interaction.user.name} 发送了图片: {os.path.basename(selected)} (未发送到频道，未找到channel_logger)")
+                logger.info(f"用户 {interaction.user.name} 发送了图片: {os.path.basename(rel_path)} (未发送到频道，未找到channel_logger)")
@@ -1,71 +1,48 @@
 import discord
-import json
 import logging
 from pathlib import Path
 from discord.ext import tasks
 
 import config
+from utils.json_store import get_store
 
 logger = logging.getLogger(__name__)
 
 # --- 数据存储逻辑 ---
 
 KEEP_ALIVE_DATA_PATH = Path(config.KEEP_ALIVE_DATA_PATH)
+keep_alive_store = get_store(KEEP_ALIVE_DATA_PATH)
 
-def _load_guilds_data():
-    """从JSON文件加载所有服务器的保活数据"""
-    if not KEEP_ALIVE_DATA_PATH.exists():
-        return {}
-    try:
-        with open(KEEP_ALIVE_DATA_PATH, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if isinstance(data, dict):
-                return data
-            return {}
-    except (json.JSONDecodeError, IOError) as e:
-        logger.error(f"读取保活频道文件失败: {e}")
-        return {}
-
-def _save_guilds_data(data):
-    """将所有服务器的保活数据保存到JSON文件"""
-    try:
-        KEEP_ALIVE_DATA_PATH.parent.mkdir(parents=True, exist_ok=True)
-        with open(KEEP_ALIVE_DATA_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
-    except IOError as e:
-        logger.error(f"写入保活频道文件失败: {e}")
-
-def add_channel(guild_id: int, channel_id: int):
+async def add_channel(guild_id: int, channel_id: int):
     """为指定服务器添加一个频道到保活列表"""
-    data = _load_guilds_data()
-    guild_id_str = str(guild_id)
-    
-    if guild_id_str not in data:
-        data[guild_id_str] = []
-        
-    if channel_id not in data[guild_id_str]:
-        data[guild_id_str].append(channel_id)
-        _save_guilds_data(data)
+    async with keep_alive_store.lock:
+        data = keep_alive_store.data
+        guild_id_str = str(guild_id)
+
+        if channel_id in data.get(guild_id_str, []):
+            return False
+        data.setdefault(guild_id_str, []).append(channel_id)
+        keep_alive_store.mark_dirty()
         return True
-    return False
 
-def remove_channel(guild_id: int, channel_id: int):
+async def remove_channel(guild_id: int, channel_id: int):
     """从指定服务器的保活列表移除一个频道"""
-    data = _load_guilds_data()
-    guild_id_str = str(guild_id)
-
-    if guild_id_str in data and channel_id in data[guild_id_str]:
-        data[guild_id_str].remove(channel_id)
-        # 如果服务器列表为空，则移除该服务器键
-        if not data[guild_id_str]:
-            del data[guild_id_str]
-        _save_guilds_data(data)
-        return True
-    return False
+    async with keep_alive_store.lock:
+        data = keep_alive_store.data
+        guild_id_str = str(guild_id)
+
+        if guild_id_str in data and channel_id in data[guild_id_str]:
+            data[guild_id_str].remove(channel_id)
+            # 如果服务器列表为空，则移除该服务器键
+            if not data[guild_id_str]:
+                del data[guild_id_str]
+            keep_alive_store.mark_dirty()
+            return True
+        return False
 
 def get_all_guilds_data():
-    """获取所有服务器的保活数据"""
-    return _load_guilds_data()
+    """获取所有服务器的保活数据 (副本，遍历期间不受修改影响)"""
+    return {guild_id: list(channels) for guild_id, channels in keep_alive_store.data.items()}
 
 # --- 命令核心处理逻辑 ---
 
@@ -119,13 +96,13 @@ async def handle_keep_alive_command(interaction: discord.Interaction, action: st
         guild_id = interaction.guild.id
 
         if action == "add":
-            if add_channel(guild_id, channel_id):
+            if await add_channel(guild_id, channel_id):
                 await interaction.followup.send(f"✅ 已成功添加频道 <#{channel_id}> 到本服务器的保活列表。", ephemeral=True)
             else:
                 await interaction.followup.send(f"⚠️ 频道 <#{channel_id}> 已存在于本服务器的保活列表中。", ephemeral=True)
         
         elif action == "remove":
-            if remove_channel(guild_id, channel_id):
+            if await remove_channel(guild_id, channel_id):
                 await interaction.followup.send(f"✅ 已成功从本服务器的保活列表移除频道 <#{channel_id}>。", ephemeral=True)
             else:
                 await interaction.followup.send(f"⚠️ 频道 <#{channel_id}> 不在本服务器的保活列表中。", ephemeral=True)
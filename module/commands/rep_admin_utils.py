@@ -1,11 +1,14 @@
 import discord
 from discord import app_commands
-import json
 import uuid
+import asyncio
 from datetime import datetime
 from pathlib import Path
 import logging
-from ..feedback import FeedbackView, FeedbackReplyView, delete_feedback, save_feedback
+import config
+from utils.broadcast_utils import BroadcastResult
+from utils.broadcast_progress import BroadcastProgress
+from ..feedback import FeedbackView, FeedbackReplyView, feedback_store
 
 logger = logging.getLogger(__name__)
 
@@ -27,82 +30,97 @@ async def handle_rep_admin_command(interaction: discord.Interaction, action: str
         )
         logger.info(f"管理员 {interaction.user} 请求了私聊表单")
     elif action == "rebuild":
+        # 立即延迟响应，重建可能耗时较长，结果通过编辑原始响应汇报
+        await interaction.response.defer(ephemeral=True, thinking=True)
         try:
-            # 加载所有反馈数据
-            if not FEEDBACK_DATA_PATH.exists():
-                await interaction.response.send_message(
-                    "⚠️ 没有找到任何反馈数据文件",
-                    ephemeral=True
-                )
-                return
-            
-            with open(FEEDBACK_DATA_PATH, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # 筛选未回复请求（排除已处理记录）
-            pending_requests = [
-                fb for fb in data.values() 
-                if "user_id" in fb and "timestamp" in fb and
-                not any(k.startswith(("rejected_", "ignored_")) for k in data)
-            ]
-            
-            if not pending_requests:
-                await interaction.response.send_message(
-                    "✅ 没有需要重建的未回复请求",
-                    ephemeral=True
-                )
-                return
-            
-            # 获取反馈频道
-            feedback_channel_id = LOG_CHANNELS[0] if LOG_CHANNELS else None
-            if not feedback_channel_id:
-                await interaction.response.send_message(
-                    "⚠️ 未配置反馈频道(LOG_CHANNELS)",
-                    ephemeral=True
-                )
-                return
-            
-            channel = interaction.client.get_channel(feedback_channel_id)
-            if not channel:
-                channel = await interaction.client.fetch_channel(feedback_channel_id)
-            
-            # 重建每个未回复请求
-            count = 0
-            for fb_id, fb_data in data.items():
-                if "user_id" in fb_data and "timestamp" in fb_data:
-                    # 创建新ID避免冲突
-                    new_id = str(uuid.uuid4())
-                    
-                    embed = discord.Embed(
-                        title="🔄 重建的私聊请求",
-                        description=fb_data["content"],
-                        color=discord.Color.orange()
-                    )
-                    embed.add_field(name="原始ID", value=fb_id, inline=False)
-                    embed.add_field(name="新ID", value=new_id, inline=False)
-                    embed.set_author(
-                        name=f"用户ID: {fb_data['user_id']}",
-                        icon_url=None
-                    )
-                    embed.set_footer(text=f"原始提交时间: {datetime.fromtimestamp(fb_data['timestamp']).strftime('%Y-%m-%d %H:%M:%S')}")
-                    
-                    view = FeedbackReplyView(new_id)
-                    await channel.send(embed=embed, view=view)
-                    
-                    # 保存新记录并删除原始数据
-                    save_feedback(new_id, fb_data["user_id"], fb_data["content"])
-                    delete_feedback(fb_id)
-                    count += 1
-            
-            await interaction.response.send_message(
-                f"✅ 已成功重建 {count} 个未回复请求",
-                ephemeral=True
-            )
-            logger.info(f"管理员 {interaction.user} 重建了 {count} 个未回复私聊请求")
-            
+            await _rebuild_pending(interaction, LOG_CHANNELS)
         except Exception as e:
-            await interaction.response.send_message(
-                f"❌ 重建请求失败: {str(e)}",
-                ephemeral=True
-            )
+            await interaction.edit_original_response(content=f"❌ 重建请求失败: {str(e)}", view=None)
             logger.error(f"重建未回复请求失败: {e}")
+
+def _rebuild_embed(fb_data: dict, new_id: str) -> discord.Embed:
+    """重建的私聊请求消息"""
+    embed = discord.Embed(
+        title="🔄 重建的私聊请求",
+        description=fb_data["content"],
+        color=discord.Color.orange()
+    )
+    embed.add_field(name="原始ID", value=fb_data["id"], inline=False)
+    embed.add_field(name="新ID", value=new_id, inline=False)
+    embed.set_author(
+        name=f"用户ID: {fb_data['user_id']}",
+        icon_url=None
+    )
+    embed.set_footer(text=f"原始提交时间: {datetime.fromtimestamp(fb_data['timestamp']).strftime('%Y-%m-%d %H:%M:%S')}")
+    return embed
+
+async def _rebuild_pending(interaction: discord.Interaction, LOG_CHANNELS: list):
+    """
+    并发重建所有未回复请求
+
+    新ID在发送前就在一个事务中登记，按钮发出时记录已经存在；
+    未能发送的请求在结束时一并撤销，恢复为原记录
+    """
+    # 只取状态为 pending 的请求 (已拒绝/忽略/回复的请求不会重建)
+    pending_requests = await feedback_store.pending()
+    if not pending_requests:
+        await interaction.edit_original_response(content="✅ 没有需要重建的未回复请求")
+        return
+
+    # 获取反馈频道
+    feedback_channel_id = LOG_CHANNELS[0] if LOG_CHANNELS else None
+    if not feedback_channel_id:
+        await interaction.edit_original_response(content="⚠️ 未配置反馈频道(LOG_CHANNELS)")
+        return
+
+    channel = interaction.client.get_channel(feedback_channel_id)
+    if not channel:
+        channel = await interaction.client.fetch_channel(feedback_channel_id)
+
+    # 创建新ID避免冲突，期间已被处理的请求不会登记
+    reserved = await feedback_store.remap({fb_data["id"]: str(uuid.uuid4()) for fb_data in pending_requests})
+    pending_requests = [fb_data for fb_data in pending_requests if fb_data["id"] in reserved]
+    if not pending_requests:
+        await interaction.edit_original_response(content="✅ 没有需要重建的未回复请求")
+        return
+
+    progress = BroadcastProgress(
+        interaction, len(pending_requests),
+        title=f"正在重建 {len(pending_requests)} 个未回复请求"
+    )
+
+    # 限制同时进行中的发送数量，同一频道的限速由 discord.py 按路由处理
+    semaphore = asyncio.Semaphore(max(1, config.BROADCAST_CONCURRENCY))
+    sent = set()
+
+    async def rebuild_one(fb_data: dict):
+        async with semaphore:
+            if progress.cancel_event.is_set():
+                progress.record(BroadcastResult(channel, False, reason="已取消", cancelled=True))
+                return
+            new_id = reserved[fb_data["id"]]
+            try:
+                message = await channel.send(embed=_rebuild_embed(fb_data, new_id), view=FeedbackReplyView(new_id))
+            except Exception as e:
+                logger.error(f"重建私聊请求 {fb_data['id']} 失败: {e}")
+                progress.record(BroadcastResult(channel, False, error=e, reason="发送失败"))
+                return
+            sent.add(fb_data["id"])
+            progress.record(BroadcastResult(channel, True, message=message))
+
+    try:
+        await progress.start()
+        await asyncio.gather(*(rebuild_one(fb_data) for fb_data in pending_requests))
+        await progress.finish()
+    finally:
+        # 未发送成功的请求撤销新ID，保持原状
+        await feedback_store.restore({old_id: new_id for old_id, new_id in reserved.items() if old_id not in sent})
+
+    count = len(sent)
+    summary = f"✅ 已成功重建 {count} 个未回复请求"
+    if progress.failed:
+        summary += f"\n⚠️ {progress.failed} 个请求发送失败，保留原记录"
+    if progress.cancelled:
+        summary += f"\n🛑 {progress.cancelled} 个请求因取消未重建，保留原记录"
+    await interaction.edit_original_response(content=summary, view=None)
+    logger.info(f"管理员 {interaction.user} 重建了 {count} 个未回复私聊请求")
@@ -1,8 +1,9 @@
 import discord
 import logging
 from datetime import datetime
-from utils import channel_utils, file_utils
+from utils import broadcast_utils, channel_utils, file_utils, webhook_transport
 import config
+from utils.broadcast_progress import BroadcastProgress
 
 logger = logging.getLogger(__name__)
 
@@ -61,41 +62,26 @@ async def handle_send_command(
     failed_channels = 0
     sent_channel_mentions = []
     failed_channel_mentions = []
+    cancelled_channels = 0
 
     if not target_channels:
         logger.warning("没有找到任何有效的目标频道来发送Embed。")
         await interaction.edit_original_response(content="⚠️ 没有找到任何有效的目标频道。请检查频道ID或转发模式。")
     else:
         logger.info(f"准备发送Embed到 {len(target_channels)} 个最终目标频道")
-        await interaction.edit_original_response(
-            content=f"正在发送Embed到 {len(target_channels)} 个目标频道 (模式: {channel_id_mode})..."
-        )  # 更新状态
+        progress = BroadcastProgress(interaction, len(target_channels), label="Embed")
+        await progress.start()  # 更新状态
 
-        for target_channel_obj in target_channels:
-            try:
-                await target_channel_obj.send(embed=embed)
-                if isinstance(target_channel_obj, discord.Thread):
-                    logger.info(
-                        f"Embed成功发送到子区 {target_channel_obj.id} ({target_channel_obj.name})"
-                    )
-                else:
-                    logger.info(
-                        f"Embed成功发送到频道 {target_channel_obj.id} ({target_channel_obj.name})"
-                    )
-                sent_to_channels += 1
-                sent_channel_mentions.append(target_channel_obj.mention)
-            except discord.Forbidden:
-                logger.error(
-                    f"无权发送Embed到频道 {target_channel_obj.id} ({target_channel_obj.name})"
-                )
-                failed_channels += 1
-                failed_channel_mentions.append(f"{target_channel_obj.mention} (无权限)")
-            except Exception as e:
-                logger.error(
-                    f"Embed发送到频道 {target_channel_obj.id} ({target_channel_obj.name}) 失败: {e}"
-                )
-                failed_channels += 1
-                failed_channel_mentions.append(f"{target_channel_obj.mention} (发送失败)")
+        transport = getattr(bot_instance, "webhook_transport", None)
+        results = await broadcast_utils.broadcast(
+            target_channels,
+            lambda target_channel_obj: webhook_transport.send_message(transport, target_channel_obj, embed=embed),
+            on_result=progress.record,
+            cancel_event=progress.cancel_event
+        )
+        await progress.finish()
+        sent_to_channels, failed_channels, sent_channel_mentions, failed_channel_mentions, cancelled_channels = \
+            broadcast_utils.summarize_results(results)
 
     # 7. 发送到Telegram(如果启用且配置允许)
     tg_sent_status = ""
@@ -108,7 +94,8 @@ async def handle_send_command(
         try:
             await bot_instance.telegram_bot.send_to_telegram(
                 message=tg_caption,
-                image_path=local_image_path  # 传递本地路径给TG
+                image_path=local_image_path,  # 传递本地路径给TG
+                origin=f"discord:{interaction.channel_id}:{interaction.id}"
             )
             tg_sent_status = " 和Telegram"
             logger.info("Embed消息内容已转发到Telegram")
@@ -136,7 +123,9 @@ async def handle_send_command(
         forward_mode,
         tg_sent_status,
         channel_id_mode,
-        config
+        config,
+        cancelled_channels=cancelled_channels
     )
 
-    await interaction.edit_original_response(content=final_response)
+    await interaction.edit_original_response(content=final_response, view=None)
+    return final_response
@@ -8,6 +8,7 @@ import asyncio
 import config
 from datetime import datetime
 from typing import Tuple, Dict, Union
+from utils.forward_dedup import forward_dedup
 
 logger = logging.getLogger(__name__)
 
@@ -101,7 +102,22 @@ async def build_status_embed(bot_instance) -> discord.Embed:
     
     embed.add_field(name="🖼️ 本地图片数", value=str(image_count), inline=True)
     embed.add_field(name="📂 图片目录状态", value=image_dir_status, inline=True)
-    embed.add_field(name=" ", value=" ", inline=True)
+    telegram_bot = getattr(bot_instance, "telegram_bot", None)
+    if telegram_bot:
+        outbox_stats = telegram_bot.outbox.stats()
+        embed.add_field(
+            name="📮 TG 发送队列",
+            value=f"排队 {outbox_stats['queued']} | 已合并 {outbox_stats['merged']} | 限速 {outbox_stats['retry_after']} 次",
+            inline=True
+        )
+    else:
+        embed.add_field(name=" ", value=" ", inline=True)
+    dedup_stats = forward_dedup.stats()
+    embed.add_field(
+        name="🔁 转发去重",
+        value=f"拦截 {dedup_stats['hits']} | 放行 {dedup_stats['misses']} | 指纹 {dedup_stats['size']}",
+        inline=True
+    )
     
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S %Z")
     embed.set_footer(text=f"{config.BOT_NAME} · 自动转发系统丨查询时间: {timestamp}")
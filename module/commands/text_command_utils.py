@@ -1,8 +1,9 @@
 import discord
 import logging
 from typing import  Optional
-from utils import channel_utils, file_utils
+from utils import broadcast_utils, channel_utils, file_utils, webhook_transport
 import config
+from utils.broadcast_progress import BroadcastProgress
 
 logger = logging.getLogger(__name__)
 
@@ -39,49 +40,64 @@ async def handle_text_command(
             await interaction.edit_original_response(content="❌ 处理上传的图片时出错。")
             return "❌ 处理上传的图片时出错。"
 
-    # 发送消息到目标频道
-    sent_to_channels = 0
-    failed_channels = 0
-    sent_channel_mentions = []
-    failed_channel_mentions = []
-
     if not target_channels:
         logger.warning("没有找到任何有效的目标频道来发送消息。")
         await interaction.edit_original_response(content="⚠️ 没有找到任何有效的目标频道。请检查频道ID或转发模式。")
         return "⚠️ 没有找到任何有效的目标频道。请检查频道ID或转发模式。"
     
     logger.info(f"准备发送消息到 {len(target_channels)} 个最终目标频道")
-    await interaction.edit_original_response(content=f"正在发送到 {len(target_channels)} 个目标频道 (模式: {channel_id_mode})...")
-
-    for target_channel_obj in target_channels:
-        try:
-            file_to_send_this_time = None
-            if local_image_path:
-                file_to_send_this_time = discord.File(local_image_path, filename=image_file.filename)
+    progress = BroadcastProgress(interaction, len(target_channels), label="消息")
+    await progress.start()
 
-            if isinstance(target_channel_obj, discord.Thread):
-                await target_channel_obj.send(content=content if content else None, file=file_to_send_this_time)
-                logger.info(f"消息成功发送到子区 {target_channel_obj.id} ({target_channel_obj.name})")
-            else:
-                await target_channel_obj.send(content=content if content else None, file=file_to_send_this_time)
-                logger.info(f"消息成功发送到频道 {target_channel_obj.id} ({target_channel_obj.name})")
-            sent_to_channels += 1
-            sent_channel_mentions.append(target_channel_obj.mention)
+    transport = getattr(bot_instance, "webhook_transport", None)
 
+    async def send_to_channel(target_channel_obj):
+        file_to_send_this_time = None
+        if local_image_path:
+            file_to_send_this_time = discord.File(local_image_path, filename=image_file.filename)
+        try:
+            return await webhook_transport.send_message(
+                transport, target_channel_obj,
+                content=content if content else None,
+                file=file_to_send_this_time or discord.utils.MISSING
+            )
+        finally:
             if file_to_send_this_time:
                 file_to_send_this_time.close()
-        except discord.Forbidden:
-            logger.error(f"无权发送消息到频道 {target_channel_obj.id} ({target_channel_obj.name})")
-            failed_channels += 1
-            failed_channel_mentions.append(f"{target_channel_obj.mention} (无权限)")
-            if 'file_to_send_this_time' in locals() and file_to_send_this_time:
-                file_to_send_this_time.close()
-        except Exception as e:
-            logger.error(f"消息发送到频道 {target_channel_obj.id} ({target_channel_obj.name}) 失败: {e}")
-            failed_channels += 1
-            failed_channel_mentions.append(f"{target_channel_obj.mention} (发送失败)")
-            if 'file_to_send_this_time' in locals() and file_to_send_this_time:
-                file_to_send_this_time.close()
+
+    async def reuse_uploaded_image(target_channel_obj, attachment_url):
+        # 没有嵌入链接权限的频道无法显示图片链接，只能单独上传
+        guild = getattr(target_channel_obj, "guild", None)
+        if guild and not target_channel_obj.permissions_for(guild.me).embed_links:
+            return await send_to_channel(target_channel_obj)
+        embed = discord.Embed(color=discord.Color.blue())
+        embed.set_image(url=attachment_url)
+        return await webhook_transport.send_message(
+            transport, target_channel_obj,
+            content=content if content else None,
+            embed=embed
+        )
+
+    is_image = bool(image_file and (image_file.content_type or "").startswith("image/"))
+    if local_image_path and is_image and config.TEXT_IMAGE_FANOUT and len(target_channels) > 1:
+        # 图片只上传一次，其余频道复用 CDN 链接
+        results = await broadcast_utils.broadcast_shared_attachment(
+            target_channels,
+            send_to_channel,
+            reuse_uploaded_image,
+            on_result=progress.record,
+            cancel_event=progress.cancel_event
+        )
+    else:
+        results = await broadcast_utils.broadcast(
+            target_channels,
+            send_to_channel,
+            on_result=progress.record,
+            cancel_event=progress.cancel_event
+        )
+    await progress.finish()
+    sent_to_channels, failed_channels, sent_channel_mentions, failed_channel_mentions, cancelled_channels = \
+        broadcast_utils.summarize_results(results)
 
     # 发送到Telegram
     tg_sent_status = ""
@@ -89,7 +105,8 @@ async def handle_text_command(
         try:
             await bot_instance.telegram_bot.send_to_telegram(
                 message=content,
-                image_path=local_image_path
+                image_path=local_image_path,
+                origin=f"discord:{interaction.channel_id}:{interaction.id}"
             )
             tg_sent_status = " 和Telegram"
             logger.info("消息已转发到Telegram")
@@ -118,5 +135,6 @@ async def handle_text_command(
         forward_mode,
         tg_sent_status,
         channel_id_mode,
-        config
+        config,
+        cancelled_channels=cancelled_channels
     )
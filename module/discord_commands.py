@@ -9,6 +9,7 @@ from typing import List
 from .commands import text_command_utils, send_card_utils, delet_command_utils, status_utils
 from .commands import rep_admin_utils, go_top_utils, fetch_utils, fetch_upd_utils, fetch_del_utils, down_image_utils, keep_alive_utils
 from .feedback import FeedbackView, FeedbackReplyView, delete_feedback, FEEDBACK_DATA_PATH, save_feedback
+from utils.fetch_catalog import fetch_catalog
 
 logger = logging.getLogger(__name__)
 
@@ -137,7 +138,7 @@ def register_commands(tree: app_commands.CommandTree, bot_instance):
             forward_to_tg=forward_to_tg,
             forward_mode=forward_mode
         )
-        await interaction.edit_original_response(content=final_response)
+        await interaction.edit_original_response(content=final_response, view=None)
 
     @tree.command(name="send", description="发送Embed消息到指定频道(ID)或所有频道")
     @app_commands.check(check_auth)
@@ -183,7 +184,7 @@ def register_commands(tree: app_commands.CommandTree, bot_instance):
         forward_mode=forward_mode
     )
 
-        await interaction.edit_original_response(content=final_response)
+        await interaction.edit_original_response(content=final_response, view=None)
 
 
     @tree.command(name="del", description="（敏感）删除Discord消息")
@@ -323,39 +324,16 @@ def register_commands(tree: app_commands.CommandTree, bot_instance):
         if not await has_basic_permission(interaction):
             return []
 
-        image_dir = "data/fetch"
-        if not os.path.exists(image_dir):
-            return []
-            
-        # 递归获取所有支持的图片文件
-        images = []
-        for root, _, files in os.walk(image_dir):
-            for f in files:
-                if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp')):
-                    rel_path = os.path.relpath(os.path.join(root, f), image_dir)
-                    images.append(rel_path)
-
-        metadata_path = os.path.join("data/fetch", "metadata.json")
-        if os.path.exists(metadata_path):
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata_list = json.load(f)
-            if not (config.AUTHORIZED_USERS and str(interaction.user.id) in config.AUTHORIZED_USERS):
-                current_guild = str(interaction.guild.id) if interaction.guild else None
-                if current_guild:
-                    # 过滤出当前服务器的图片
-                    server_images = []
-                    for img_path in images:
-                        img_name = os.path.basename(img_path)
-                        img_meta = next((m for m in metadata_list if m['saved_filename'] == img_name), None)
-                        if img_meta and img_meta['guild_id'] == current_guild:
-                            server_images.append(img_path)
-                    images = server_images
-        
+        await fetch_catalog.refresh()
+        is_admin = bool(config.AUTHORIZED_USERS and str(interaction.user.id) in config.AUTHORIZED_USERS)
+        current_guild = str(interaction.guild.id) if interaction.guild else None
+        # 非管理员只能看到当前服务器的图片，结果按匹配质量、调取次数和上传时间排序
+        images = fetch_catalog.search(current, current_guild, is_admin, user_id=interaction.user.id, limit=25)
+
         return [
             app_commands.Choice(name=os.path.basename(f), value=f)
-            for f in images 
-            if current.lower() in f.lower()
-        ][:25]  # 限制最多返回25个选项
+            for f in images
+        ]
 
     @tree.command(name="fetch", description="发送指定或随机图片到当前频道或回复指定消息")
     @app_commands.check(check_auth)
@@ -377,7 +355,7 @@ def register_commands(tree: app_commands.CommandTree, bot_instance):
     @app_commands.describe(
         sender="发送者标识",
         context="上下文标识",
-        image_url="图片URL(可选)",
+        image_url="图片URL(可选，多个URL用空格或逗号分隔)",
         image_file="图片文件附件(可选)"
     )
     async def fetch_upd_command(
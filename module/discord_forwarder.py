@@ -2,123 +2,220 @@ import discord
 import logging
 import config
 from datetime import datetime
+from utils import broadcast_utils
+from utils import webhook_transport
+from utils.forward_payload import ForwardPayload
+from utils.media_rehost import MediaUpload, rehost_cache
+from utils.routing_index import RoutingIndex
+from utils.webhook_transport import WebhookTransport
 
 logger = logging.getLogger(__name__)
 
-async def send_to_discord(channels: dict, message: str, channel_id=None):
-    """发送消息到 Discord 频道，使用Embed卡片格式
+# Discord 单条消息最多携带 10 个Embed
+MAX_EMBEDS_PER_MESSAGE = 10
+
+def resolve_target_channels(channels: dict, channel_id=None, routing_index: RoutingIndex = None) -> list:
+    """计算 Telegram 消息的目标频道
     Args:
         channels (dict): 包含 {channel_id: channel_object} 的字典
-        message (str): 要发送的消息内容
         channel_id: 指定发送到哪个频道，None表示发送到配置的默认频道(特殊频道优先)
+        routing_index (RoutingIndex): 转发路由索引，None时根据 channels 临时构建
+    Returns:
+        list: 目标频道对象列表
     """
     if not channels:
         logger.error("没有可用的 Discord 频道，无法发送消息")
-        return
+        return []
 
-    target_channels = []
     if channel_id:
         # 发送到指定频道
         target_channel = channels.get(channel_id)
         if target_channel:
-            target_channels.append(target_channel)
-        else:
-            logger.error(f"指定的频道ID {channel_id} 未在机器人配置中找到")
-            return
-    else:
-        # 发送到默认频道 (优先特殊频道)
-        special_channels = [
-            channels[channel_id] 
-            for channel_id in config.SPECIAL_CHANNELS 
-            if channel_id in channels
-        ]
-        if special_channels:
-            target_channels = special_channels
-            logger.info(f"来自Telegram的消息将发送到特殊频道: {', '.join(str(c.id) for c in special_channels)}")
+            return [target_channel]
+        logger.error(f"指定的频道ID {channel_id} 未在机器人配置中找到")
+        return []
+
+    if routing_index is None:
+        routing_index = RoutingIndex.build(channels, config.SPECIAL_CHANNELS)
+    # 发送到默认频道 (优先特殊频道)
+    special_channels = [
+        channels[special_id]
+        for special_id in routing_index.forward_special_ids
+        if special_id in channels
+    ]
+    if special_channels:
+        logger.info(f"来自Telegram的消息将发送到特殊频道: {', '.join(str(c.id) for c in special_channels)}")
+        return special_channels
+    # 如果未设置特殊频道或无效，则发送到所有频道 (按原逻辑)
+    logger.info("未设置特殊频道或特殊频道无效，Telegram消息将发送到所有频道")
+    return list(channels.values())
+
+def _media_fields(embed: discord.Embed, payload: ForwardPayload, uploaded: dict):
+    """为视频和文件添加链接字段，已转存为附件的媒体不再重复列出"""
+    for item in payload.attachments:
+        if item.url in uploaded:
+            continue
+        if item.kind == "video":
+            embed.add_field(name="视频", value=f"[点击查看]({item.url})", inline=False)
         else:
-            # 如果未设置特殊频道或无效，则发送到所有频道 (按原逻辑)
-            target_channels = list(channels.values())
-            logger.info("未设置特殊频道或特殊频道无效，Telegram消息将发送到所有频道")
+            embed.add_field(name="文件", value=f"[{item.name}]({item.url})", inline=False)
+
+def build_forward_embed(payload: ForwardPayload, uploaded: dict = None) -> discord.Embed:
+    """将转发消息构建为Embed卡片
+    Args:
+        payload (ForwardPayload): 要发送的消息
+        uploaded (dict): 已转存为附件的媒体 {原始链接: attachment://文件名}
+    """
+    uploaded = uploaded or {}
+    # 区分标题
+    embed = discord.Embed(
+        title="来自Telegram的消息" if payload.auto_forwarded else "消息",
+        description=payload.text,
+        color=discord.Color.blue()
+    )
+
+    photos = payload.photos
+    if photos:
+        embed.set_image(url=uploaded.get(photos[0].url, photos[0].url))
+    _media_fields(embed, payload, uploaded)
+
+    # 添加时间戳和来源
+    timestamp = payload.timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    footer_text = f"{config.BOT_NAME} ·自动转发系统 | {timestamp}" if payload.auto_forwarded else f"{config.BOT_NAME} · 转发系统 | {timestamp}"
+    embed.set_footer(text=footer_text)
+    return embed
+
+def build_album_embeds(payload: ForwardPayload, uploaded: dict = None) -> list:
+    """将多张图片构建为一组Embed卡片，在一条消息中发送
+    Args:
+        payload (ForwardPayload): 要发送的消息，最多使用前 10 张图片
+        uploaded (dict): 已转存为附件的媒体 {原始链接: attachment://文件名}
+    """
+    uploaded = uploaded or {}
+    image_urls = [uploaded.get(item.url, item.url) for item in payload.photos[:MAX_EMBEDS_PER_MESSAGE]]
+    # 相同 url 的Embed会被 Discord 合并为图集显示，attachment:// 不能作为 url，使用第一张的原始链接
+    gallery_url = payload.photos[0].url if payload.photos else None
+    timestamp = payload.timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    first = discord.Embed(
+        title="来自Telegram的消息" if payload.auto_forwarded else "消息",
+        description=payload.text or None,
+        url=gallery_url,
+        color=discord.Color.blue()
+    )
+    _media_fields(first, payload, uploaded)
+    first.set_footer(text=f"{config.BOT_NAME} · 转发系统 | 相册 {len(image_urls)} 张 | {timestamp}")
+    embeds = [first]
+    for index, image_url in enumerate(image_urls):
+        if index == 0:
+            first.set_image(url=image_url)
+            continue
+        embed = discord.Embed(url=gallery_url, color=discord.Color.blue())
+        embed.set_image(url=image_url)
+        embeds.append(embed)
+    return embeds
+
+def build_forward_kwargs(payload: ForwardPayload, uploaded: dict = None) -> dict:
+    """多张图片时以图集形式发送，否则发送单个Embed"""
+    if len(payload.photos) > 1:
+        return {"embeds": build_album_embeds(payload, uploaded)}
+    return {"embed": build_forward_embed(payload, uploaded)}
+
+def is_client_error(error: Exception) -> bool:
+    """请求本身被拒绝的 4xx 错误 (不含限速 429)，原样重试不会成功"""
+    return isinstance(error, discord.HTTPException) and 400 <= error.status < 500 and error.status != 429
+
+async def deliver_to_channel(channel, payload: ForwardPayload, transport: WebhookTransport = None):
+    """发送单条转发消息到单个频道，失败时抛出异常由调用方处理 (供出站队列使用)
 
+    TG_REHOST_MEDIA 中的媒体类型会流式转存为附件，转存失败或超过上传限制时保持链接形式发送；
+    Embed 被拒绝 (例如字段或图片链接无效) 时回退为发送原始文本
+    """
+    async def send(**kwargs):
+        return await webhook_transport.send_message(
+            transport, channel,
+            username=config.WEBHOOK_TG_USERNAME,
+            avatar_url=config.WEBHOOK_TG_AVATAR_URL,
+            **kwargs
+        )
+
+    try:
+        return await _deliver_embed(channel, payload, send)
+    except (discord.Forbidden, discord.NotFound):
+        raise
+    except discord.HTTPException as e:
+        if not is_client_error(e):
+            raise
+        logger.warning(f"Embed 发送到频道 {channel.id} 被拒绝 ({e.status})，回退到文本格式: {e}")
+        return await send(content=f"**(Embed发送失败)**\n{payload.to_text()}")
+
+async def _deliver_embed(channel, payload: ForwardPayload, send):
+    """以Embed卡片形式发送，按需流式转存媒体"""
+    rehost_items = [item for item in payload.media if item.kind in config.TG_REHOST_MEDIA]
+    if not rehost_items:
+        return await send(**build_forward_kwargs(payload))
+
+    # 同一条消息的媒体只下载、上传一次，其他频道引用第一次上传得到的 CDN 链接
+    async with rehost_cache.claim(rehost_items):
+        payload = ForwardPayload(payload.text, rehost_cache.apply(payload.media), payload.source,
+                                 payload.auto_forwarded, payload.timestamp)
+        pending = [item for item in payload.media if any(item is original for original in rehost_items)]
+        if pending:
+            try:
+                async with MediaUpload(channel, pending) as upload:
+                    if upload.files:
+                        message = await send(files=upload.files, **build_forward_kwargs(payload, upload.uploaded))
+                        rehost_cache.record(upload, message)
+                        return message
+            except (discord.Forbidden, discord.NotFound):
+                raise
+            except Exception as e:
+                logger.warning(f"流式转存媒体到频道 {channel.id} 失败，改为发送链接: {e}")
+        return await send(**build_forward_kwargs(payload))
+
+async def send_to_discord(channels: dict, payload: ForwardPayload, channel_id=None, routing_index: RoutingIndex = None,
+                          transport: WebhookTransport = None):
+    """发送消息到 Discord 频道，使用Embed卡片格式
+    Args:
+        channels (dict): 包含 {channel_id: channel_object} 的字典
+        payload (ForwardPayload): 要发送的消息
+        channel_id: 指定发送到哪个频道，None表示发送到配置的默认频道(特殊频道优先)
+        routing_index (RoutingIndex): 转发路由索引，None时根据 channels 临时构建
+        transport (WebhookTransport): Webhook 发送通道，None时全部使用机器人账号发送
+    """
+    target_channels = resolve_target_channels(channels, channel_id, routing_index)
     if not target_channels:
          logger.error("计算后没有目标 Discord 频道，无法发送消息")
          return
 
     try:
-        # 检查是否是自动转发的消息 (来自Telegram Bot的标记)
-        is_forwarded = message.startswith("[自动转发]")
-        clean_message = message.replace("[自动转发]", "").strip() if is_forwarded else message
-
-        # 创建Embed卡片
-        embed = discord.Embed(
-            title="来自Telegram的消息" if is_forwarded else "消息", # 区分标题
-            description=clean_message,
-            color=discord.Color.blue()
+        # 并发发送Embed卡片到所有目标频道
+        results = await broadcast_utils.broadcast(
+            target_channels,
+            lambda channel: deliver_to_channel(channel, payload, transport)
         )
 
-        # 解析消息中的链接 (简化处理，假设格式固定)
-        image_url = None
-        video_url = None
-        file_info = None
-
-        parts = clean_message.split("](")
-        if len(parts) > 1:
-            link_part = parts[0]
-            url_part = parts[1].split(")")[0]
-            if "[图片" in link_part:
-                image_url = url_part
-            elif "[视频" in link_part:
-                video_url = url_part
-            elif "[文件:" in link_part:
-                file_name = link_part.split("[文件:")[1]
-                file_info = {"name": file_name, "url": url_part}
-
-        # 设置Embed内容
-        if image_url:
-            embed.set_image(url=image_url)
-            # 从描述中移除图片标记文本，避免重复
-            embed.description = embed.description.split("[图片](")[0].strip()
-        if video_url:
-            embed.add_field(name="视频", value=f"[点击查看]({video_url})", inline=False)
-            embed.description = embed.description.split("[视频](")[0].strip()
-        if file_info:
-            embed.add_field(name="文件", value=f"[{file_info['name']}]({file_info['url']})", inline=False)
-            embed.description = embed.description.split("[文件:")[0].strip()
-
-
-        # 添加时间戳和来源
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        footer_text = f"{config.BOT_NAME} ·自动转发系统 | {timestamp}" if is_forwarded else f"{config.BOT_NAME} · 转发系统 | {timestamp}"
-        embed.set_footer(text=footer_text)
-
-        # 发送Embed卡片到所有目标频道
-        sent_count = 0
-        fail_count = 0
-        for channel in target_channels:
-            try:
-                await channel.send(embed=embed)
-                logger.info(f"Embed卡片已发送到 Discord 频道 {channel.name} ({channel.id})")
-                sent_count += 1
-            except Exception as e:
-                logger.error(f"发送Embed到 Discord 频道 {channel.name} ({channel.id}) 失败: {e}")
-                fail_count += 1
-                # 如果Embed失败，尝试发送原始文本作为后备
-                try:
-                    fallback_message = f"**(Embed发送失败)**\n{message}"
-                    await channel.send(fallback_message)
-                    logger.warning(f"已回退到文本格式发送到频道 {channel.name} ({channel.id})")
-                except Exception as fallback_e:
-                    logger.error(f"文本格式回退发送到频道 {channel.name} ({channel.id}) 也失败: {fallback_e}")
-
-        if fail_count > 0:
-             logger.warning(f"有 {fail_count} 个频道发送失败")
+        failed_targets = [r.channel for r in results if not r.success]
+        if failed_targets:
+            logger.warning(f"有 {len(failed_targets)} 个频道发送失败")
+            # 如果Embed失败，尝试发送原始文本作为后备
+            fallback_message = f"**(Embed发送失败)**\n{payload.to_text()}"
+            fallback_results = await broadcast_utils.broadcast(
+                failed_targets,
+                lambda channel: channel.send(fallback_message)
+            )
+            for result in fallback_results:
+                if result.success:
+                    logger.warning(f"已回退到文本格式发送到频道 {result.channel.name} ({result.channel.id})")
+                else:
+                    logger.error(f"文本格式回退发送到频道 {result.channel.name} ({result.channel.id}) 也失败: {result.error}")
 
     except Exception as e:
         logger.error(f"处理并发送消息到 Discord 时发生意外错误: {e}")
         # 尝试发送原始文本到第一个目标频道作为最终后备
         if target_channels:
             try:
-                await target_channels[0].send(f"**(处理消息时出错，发送原始消息)**\n{message}")
+                await target_channels[0].send(f"**(处理消息时出错，发送原始消息)**\n{payload.to_text()}")
                 logger.warning(f"因处理错误，已发送原始消息到频道 {target_channels[0].name} ({target_channels[0].id})")
             except Exception as final_fallback_e:
                  logger.error(f"最终后备发送原始消息也失败: {final_fallback_e}")
@@ -0,0 +1,149 @@
+"""Discord → Telegram 实时镜像
+
+on_message 中只做 O(1) 的频道过滤和入缓冲，不进行任何网络请求；
+缓冲的消息每隔一个短窗口合并为 Telegram 发送，附件直接使用 Discord CDN 链接，不下载到本地。
+"""
+import asyncio
+import logging
+from typing import Iterable, List, Optional
+
+import discord
+
+import config
+from utils.forward_dedup import forward_dedup
+
+logger = logging.getLogger(__name__)
+
+# Telegram 单条消息文本长度上限
+MAX_TELEGRAM_TEXT = 4096
+# Telegram 通过 URL 发送图片的大小上限，超过时改为发送链接
+MAX_TELEGRAM_URL_PHOTO = 5 * 1024 * 1024
+
+
+def _is_image(attachment: discord.Attachment) -> bool:
+    return (attachment.content_type or "").startswith("image/")
+
+
+def _file_line(attachment: discord.Attachment) -> str:
+    # 文本不使用 parse_mode 发送，只能使用纯文本链接
+    return f"{attachment.filename}: {attachment.url}"
+
+
+class DiscordMirror:
+    """将指定频道中的消息镜像到 Telegram"""
+
+    def __init__(self, bot: discord.Client, channel_ids: Iterable[int], window: float = 2.0):
+        """
+        参数:
+            bot: Discord 机器人实例 (通过 bot.telegram_bot 发送)
+            channel_ids: 需要镜像的频道ID，子区跟随父频道
+            window: 合并发送的窗口(秒)
+        """
+        self.bot = bot
+        self.channel_ids = frozenset(channel_ids)
+        self.window = window
+        self._buffer: List[discord.Message] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def is_mirrored(self, message: discord.Message) -> bool:
+        """预过滤：只处理镜像频道中的真人消息 (机器人和 Webhook 消息均视为机器人)"""
+        if message.author.bot:
+            return False
+        channel = message.channel
+        return channel.id in self.channel_ids or getattr(channel, "parent_id", None) in self.channel_ids
+
+    def handle(self, message: discord.Message):
+        """on_message 入口，只入缓冲，不阻塞网关事件循环"""
+        if not self.is_mirrored(message):
+            return
+        if not (message.content or message.attachments):
+            return
+        if forward_dedup.is_duplicate("discord", message.channel.id, message.id):
+            return
+        self._buffer.append(message)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window)
+        # 发送期间到达的新消息开始新的窗口
+        self._flush_task = None
+        await self.flush()
+
+    @staticmethod
+    def _format(message: discord.Message) -> str:
+        line = f"{config.DISCORD_MESSAGE_PREFIX}{message.author.display_name}: {message.clean_content}".rstrip()
+        for attachment in message.attachments:
+            if not _is_image(attachment) or attachment.size > MAX_TELEGRAM_URL_PHOTO:
+                line += f"\n{_file_line(attachment)}"
+        return line
+
+    @staticmethod
+    def _chunk(lines: List[str]) -> List[str]:
+        """按 Telegram 长度上限将多行合并为尽量少的消息"""
+        chunks, current = [], ""
+        for line in lines:
+            line = line[:MAX_TELEGRAM_TEXT]
+            if current and len(current) + 1 + len(line) > MAX_TELEGRAM_TEXT:
+                chunks.append(current)
+                current = line
+            else:
+                current = f"{current}\n{line}" if current else line
+        if current:
+            chunks.append(current)
+        return chunks
+
+    @staticmethod
+    def _send_photo(outbox, chat_id, image: discord.Attachment, caption: Optional[str]):
+        """按 URL 发送图片 (立即入队以保持顺序)，Telegram 无法获取时改为发送链接，避免消息丢失"""
+        return DiscordMirror._link_on_failure(
+            outbox.submit_photo(chat_id, image.url, caption=caption), outbox, chat_id, image, caption
+        )
+
+    @staticmethod
+    async def _link_on_failure(future, outbox, chat_id, image: discord.Attachment, caption: Optional[str]):
+        try:
+            return await future
+        except Exception as e:
+            logger.warning(f"图片 {image.filename} 无法按 URL 发送到 Telegram，改为发送链接: {e}")
+            line = _file_line(image)
+            return await outbox.submit_text(chat_id, f"{caption}\n{line}" if caption else line)
+
+    async def flush(self):
+        """将缓冲中的消息发送到 Telegram"""
+        messages, self._buffer = self._buffer, []
+        telegram_bot = self.bot.telegram_bot
+        if not messages or telegram_bot is None:
+            return
+
+        outbox = telegram_bot.outbox
+        chat_id = config.TELEGRAM_CHANNEL_ID
+        futures = []
+        lines = []
+        for message in messages:
+            images = [a for a in message.attachments if _is_image(a) and a.size <= MAX_TELEGRAM_URL_PHOTO]
+            if not images:
+                lines.append(self._format(message))
+                continue
+            # 图片按 URL 发送，保持与前后文本的顺序
+            for chunk in self._chunk(lines):
+                futures.append(outbox.submit_text(chat_id, chunk))
+            lines = []
+            caption = self._format(message)[:1024]
+            for index, image in enumerate(images):
+                futures.append(self._send_photo(outbox, chat_id, image, caption if index == 0 else None))
+        for chunk in self._chunk(lines):
+            futures.append(outbox.submit_text(chat_id, chunk))
+
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        failed = [r for r in results if isinstance(r, BaseException)]
+        if failed:
+            logger.error(f"镜像 {len(messages)} 条 Discord 消息到 Telegram 时有 {len(failed)} 次发送失败: {failed[0]}")
+        else:
+            logger.debug(f"已镜像 {len(messages)} 条 Discord 消息到 Telegram")
+
+    async def close(self):
+        """发送剩余的缓冲消息"""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
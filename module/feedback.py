@@ -3,59 +3,30 @@ import time
 import logging
 import config
 import uuid
-import json
 import asyncio
 from pathlib import Path
+from utils.feedback_store import FeedbackStore
 
 logger = logging.getLogger(__name__)
 
 FEEDBACK_DATA_PATH = Path(config.FEEDBACK_DATA_PATH)
+feedback_store = FeedbackStore(config.FEEDBACK_DB_PATH, config.REJECT_COOLDOWN, legacy_json_path=FEEDBACK_DATA_PATH)
 
-def save_feedback(feedback_id, user_id, content):
-    """保存反馈到本地JSON文件"""
-    try:
-        data = {}
-        if FEEDBACK_DATA_PATH.exists():
-            with open(FEEDBACK_DATA_PATH, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        
-        data[feedback_id] = {
-            "user_id": user_id,
-            "content": content,
-            "timestamp": time.time(),
-        }
-        
-        with open(FEEDBACK_DATA_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-            
-    except Exception as e:
-        logger.error(f"保存反馈失败: {e}")
+async def save_feedback(feedback_id, user_id, content):
+    """保存反馈记录"""
+    await feedback_store.add(feedback_id, user_id, content)
 
-def load_feedback(feedback_id):
-    """从本地加载反馈数据"""
-    try:
-        if FEEDBACK_DATA_PATH.exists():
-            with open(FEEDBACK_DATA_PATH, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get(feedback_id)
-    except Exception as e:
-        logger.error(f"加载反馈失败: {e}")
-    return None
+async def load_feedback(feedback_id):
+    """读取未处理的反馈数据"""
+    return await feedback_store.get(feedback_id)
 
-def delete_feedback(feedback_id):
-    """删除本地数据"""
-    try:
-        if FEEDBACK_DATA_PATH.exists():
-            with open(FEEDBACK_DATA_PATH, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            if feedback_id in data:
-                del data[feedback_id]
-                
-                with open(FEEDBACK_DATA_PATH, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logger.error(f"删除反馈数据失败: {e}")
+async def delete_feedback(feedback_id, status="replied"):
+    """将反馈标记为已处理"""
+    await feedback_store.resolve(feedback_id, status)
+
+async def mark_user(kind, user_id, feedback_id=None):
+    """记录被拒绝/忽略的用户 (kind 为 rejected / ignored)，REJECT_COOLDOWN 后自动失效"""
+    await feedback_store.set_cooldown(user_id, kind, feedback_id)
 
 class FeedbackModal(discord.ui.Modal, title='请求私聊'):
     """反馈表单模态框"""
@@ -86,7 +57,7 @@ class FeedbackModal(discord.ui.Modal, title='请求私聊'):
                 channel = await interaction.client.fetch_channel(feedback_channel_id)
                 
             feedback_id = str(uuid.uuid4())
-            save_feedback(feedback_id, interaction.user.id, self.feedback.value)
+            await save_feedback(feedback_id, interaction.user.id, self.feedback.value)
             
             embed = discord.Embed(
                 title="📢 新私聊来了",
@@ -107,127 +78,73 @@ class FeedbackModal(discord.ui.Modal, title='请求私聊'):
         except Exception as e:
             logger.error(f"发送反馈到频道失败: {e}")
 
-class FeedbackReplyView(discord.ui.View):
-    """管理员回复视图"""
-    def __init__(self, feedback_id):
-        super().__init__(timeout=None)
+# 管理员按钮: 动作 -> (标签, 样式)
+FEEDBACK_ACTIONS = {
+    "reply": ("回复", discord.ButtonStyle.success),
+    "ignore": ("忽略", discord.ButtonStyle.secondary),
+    "reject": ("拒绝", discord.ButtonStyle.danger),
+}
+
+# 处理结果: 动作 -> (记录状态, 标题, 颜色, 提示文本)
+RESOLVE_ACTIONS = {
+    "ignore": ("ignored", "⏸️ 已忽略私聊", discord.Color.light_grey(), "忽略"),
+    "reject": ("rejected", "❌ 已拒绝私聊", discord.Color.red(), "拒绝"),
+}
+
+def _feedback_id_from_message(message):
+    """旧版按钮没有在 custom_id 中携带反馈ID，从消息 Embed 的 ID 字段中读取"""
+    if not message or not message.embeds:
+        return None
+    fields = {field.name: field.value for field in message.embeds[0].fields}
+    return fields.get("新ID") or fields.get("ID")
+
+class FeedbackActionButton(discord.ui.DynamicItem[discord.ui.Button], template=r"(?:feedback:(?P<action>reply|ignore|reject):(?P<id>[\w-]+)|(?P<legacy>reply|ignore|reject)_button)"):
+    """
+    管理员回复/忽略/拒绝按钮
+
+    反馈ID编码在 custom_id 中 (feedback:<动作>:<反馈ID>)，启动时注册一次即可处理所有消息上的按钮，
+    不需要为每条请求在内存中保留视图，重启后按钮依然有效。
+    同时兼容旧版固定 custom_id (reply_button 等) 的按钮。
+    """
+    def __init__(self, action, feedback_id):
+        label, style = FEEDBACK_ACTIONS[action]
+        super().__init__(
+            discord.ui.Button(label=label, style=style, custom_id=f"feedback:{action}:{feedback_id}")
+        )
+        self.action = action
         self.feedback_id = feedback_id
-        
-    @discord.ui.button(
-        label="回复",
-        style=discord.ButtonStyle.success,
-        custom_id="reply_button"
-    )
-    async def reply_button_callback(self, interaction: discord.Interaction, button: discord.ui.Button):
-        """回复按钮点击处理"""
-        feedback_data = load_feedback(self.feedback_id)
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        if match["legacy"]:
+            return cls(match["legacy"], _feedback_id_from_message(interaction.message))
+        return cls(match["action"], match["id"])
+
+    async def callback(self, interaction: discord.Interaction):
+        """按钮点击处理"""
+        feedback_data = await load_feedback(self.feedback_id) if self.feedback_id else None
         if not feedback_data:
             await interaction.response.send_message("⚠️ 找不到该记录", ephemeral=True)
             return
-            
-        await interaction.response.send_modal(ReplyModal(self.feedback_id, feedback_data["user_id"]))
-        
-    @discord.ui.button(
-        label="忽略",
-        style=discord.ButtonStyle.secondary,
-        custom_id="ignore_button"
-    )
-    async def ignore_button_callback(self, interaction: discord.Interaction, button: discord.ui.Button):
-        """忽略按钮点击处理"""
-        feedback_data = load_feedback(self.feedback_id)
-        if not feedback_data:
-            await interaction.response.send_message("⚠️ 找不到该记录", ephemeral=True)
+
+        if self.action == "reply":
+            await interaction.response.send_modal(ReplyModal(self.feedback_id, feedback_data["user_id"]))
             return
-            
-        # 记录被忽略用户ID和当前时间
-        try:
-            data = {}
-            if FEEDBACK_DATA_PATH.exists():
-                with open(FEEDBACK_DATA_PATH, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            
-            data[f"ignored_{feedback_data['user_id']}"] = {
-                "timestamp": time.time(),
-                "feedback_id": self.feedback_id
-            }
-            
-            with open(FEEDBACK_DATA_PATH, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"记录忽略用户失败: {e}")
 
-        # 删除反馈数据
-        delete_feedback(self.feedback_id)
+        status, title, color, verb = RESOLVE_ACTIONS[self.action]
+        # 记录被忽略/拒绝用户ID和当前时间
+        await mark_user(status, feedback_data['user_id'], feedback_id=self.feedback_id)
 
-        try:
-            # 更新原始消息状态
-            message = await interaction.channel.fetch_message(interaction.message.id)
-            new_embed = discord.Embed(
-                title="⏸️ 已忽略私聊",
-                description=message.embeds[0].description,
-                color=discord.Color.light_grey()
-            )
-            for field in message.embeds[0].fields:
-                new_embed.add_field(name=field.name, value=field.value, inline=field.inline)
-            if message.embeds[0].author:
-                new_embed.set_author(
-                    name=message.embeds[0].author.name,
-                    icon_url=message.embeds[0].author.icon_url
-                )
-            if message.embeds[0].footer:
-                new_embed.set_footer(text=message.embeds[0].footer.text)
-            
-            await message.edit(embed=new_embed, view=None)
-            
-            await interaction.response.send_message(
-                '✅ 已忽略该私聊请求',
-                ephemeral=True
-            )
-        except Exception as e:
-            logger.error(f"忽略私聊处理失败: {e}")
-            await interaction.response.send_message(
-                '❌ 忽略处理失败: ' + str(e),
-                ephemeral=True
-            )
+        # 标记反馈为已处理
+        await delete_feedback(self.feedback_id, status)
 
-    @discord.ui.button(
-        label="拒绝",
-        style=discord.ButtonStyle.danger,
-        custom_id="reject_button"
-    )
-    async def reject_button_callback(self, interaction: discord.Interaction, button: discord.ui.Button):
-        """拒绝按钮点击处理"""
-        feedback_data = load_feedback(self.feedback_id)
-        if not feedback_data:
-            await interaction.response.send_message("⚠️ 找不到该记录", ephemeral=True)
-            return
-            
-        # 记录被拒绝用户ID和当前时间
-        try:
-            data = {}
-            if FEEDBACK_DATA_PATH.exists():
-                with open(FEEDBACK_DATA_PATH, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            
-            data[f"rejected_{feedback_data['user_id']}"] = {
-                "timestamp": time.time()
-            }
-            
-            with open(FEEDBACK_DATA_PATH, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"记录拒绝用户失败: {e}")
-
-        # 删除反馈数据
-        delete_feedback(self.feedback_id)
-        
         try:
             # 更新原始消息状态
             message = await interaction.channel.fetch_message(interaction.message.id)
             new_embed = discord.Embed(
-                title="❌ 已拒绝私聊",
+                title=title,
                 description=message.embeds[0].description,
-                color=discord.Color.red()
+                color=color
             )
             for field in message.embeds[0].fields:
                 new_embed.add_field(name=field.name, value=field.value, inline=field.inline)
@@ -242,16 +159,25 @@ class FeedbackReplyView(discord.ui.View):
             await message.edit(embed=new_embed, view=None)
             
             await interaction.response.send_message(
-                '✅ 已拒绝该私聊请求',
+                f'✅ 已{verb}该私聊请求',
                 ephemeral=True
             )
         except Exception as e:
-            logger.error(f"拒绝私聊处理失败: {e}")
+            logger.error(f"{verb}私聊处理失败: {e}")
             await interaction.response.send_message(
-                '❌ 拒绝处理失败: ' + str(e),
+                f'❌ {verb}处理失败: ' + str(e),
                 ephemeral=True
             )
 
+class FeedbackReplyView(discord.ui.View):
+    """管理员回复视图，只用于发送按钮，点击由 FeedbackActionButton 处理"""
+    def __init__(self, feedback_id):
+        super().__init__(timeout=None)
+        for action in FEEDBACK_ACTIONS:
+            self.add_item(FeedbackActionButton(action, feedback_id))
+        # 提前结束视图，发送后不会保存在 discord.py 的视图存储中
+        self.stop()
+
 class ReplyModal(discord.ui.Modal, title='回复'):
     """回复表单模态框"""
     def __init__(self, feedback_id, user_id):
@@ -280,8 +206,8 @@ class ReplyModal(discord.ui.Modal, title='回复'):
                 f"📨 管理员回复了你的私聊 (ID: {self.feedback_id}):\n\n{self.reply.value} \n\n私信 bot 的话，管理员将无法收到你对 bot 的私信内容"
             )
             
-            # 删除反馈数据
-            delete_feedback(self.feedback_id)
+            # 标记反馈为已处理
+            await delete_feedback(self.feedback_id, "replied")
             
             try:
                 # 更新原始消息状态
@@ -338,44 +264,31 @@ class FeedbackView(discord.ui.View):
         
         # 检查冷却时间
         try:
-            if FEEDBACK_DATA_PATH.exists():
-                with open(FEEDBACK_DATA_PATH, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                    # 检查是否被拒绝或忽略过
-                    rejected_key = f"rejected_{interaction.user.id}"
-                    ignored_key = f"ignored_{interaction.user.id}"
-                    
-                    if rejected_key in data:
-                        last_rejected = data[rejected_key]["timestamp"]
-                        if current_time - last_rejected < config.REJECT_COOLDOWN:
-                            remaining = int(config.REJECT_COOLDOWN - (current_time - last_rejected))
-                            await interaction.response.send_message(
-                                f"⛔ 您最近被拒绝过申请，请等待 {remaining}秒 后再试",
-                                ephemeral=True
-                            )
-                            return
-                    
-                    if ignored_key in data:
-                        # 模拟超时失败的婉拒方式
-                        logger.info(f"模拟超时处理中...控制台出现报错是正常行为")
-                        await asyncio.sleep(5) 
-                        return
-                    
-                    # 检查是否有未处理的请求
-                    pending_requests = [
-                        fb_id for fb_id, fb_data in data.items()
-                        if not fb_id.startswith("rejected_") and 
-                           "user_id" in fb_data and 
-                           fb_data["user_id"] == interaction.user.id
-                    ]
-                    
-                    if pending_requests:
-                        await interaction.response.send_message(
-                            "⛔ 您已有一个未处理的私聊请求，请等待管理员处理后再提交新的请求",
-                            ephemeral=True
-                        )
-                        return
+            # 按索引查询该用户的冷却记录和未处理请求，不扫描历史数据
+            status = await feedback_store.check_user(interaction.user.id)
+            
+            # 检查是否被拒绝或忽略过 (记录过期后自动失效)
+            if "rejected" in status["cooldowns"]:
+                remaining = int(status["cooldowns"]["rejected"] - current_time)
+                await interaction.response.send_message(
+                    f"⛔ 您最近被拒绝过申请，请等待 {remaining}秒 后再试",
+                    ephemeral=True
+                )
+                return
+            
+            if "ignored" in status["cooldowns"]:
+                # 模拟超时失败的婉拒方式
+                logger.info(f"模拟超时处理中...控制台出现报错是正常行为")
+                await asyncio.sleep(5) 
+                return
+            
+            # 检查是否有未处理的请求
+            if status["has_pending"]:
+                await interaction.response.send_message(
+                    "⛔ 您已有一个未处理的私聊请求，请等待管理员处理后再提交新的请求",
+                    ephemeral=True
+                )
+                return
                             
         except Exception as e:
             logger.error(f"检查冷却时间失败: {e}")
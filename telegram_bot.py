@@ -1,8 +1,15 @@
 import asyncio
 import logging
+from pathlib import Path
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 import config
+from utils.forward_payload import AUTO_FORWARD_TAG, ForwardPayload
+from utils.forward_dedup import forward_dedup
+from utils.telegram_media import resolve_media
+from utils.telegram_webhook import TelegramWebhookServer
+from utils.telegram_outbox import TelegramOutbox
+from utils.telegram_file_cache import FileIdCache
 
 # 设置日志
 logging.basicConfig(
@@ -15,8 +22,24 @@ logger = logging.getLogger(__name__)
 
 class TelegramBot:
     def __init__(self, discord_bot=None):
-        self.application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+        builder = Application.builder().token(config.TELEGRAM_BOT_TOKEN)
+        if config.TELEGRAM_API_BASE_URL:
+            # 自建 Bot API 服务或基准测试使用的本地模拟服务
+            base_url = config.TELEGRAM_API_BASE_URL.rstrip("/")
+            builder = builder.base_url(f"{base_url}/bot").base_file_url(f"{base_url}/file/bot")
+        self.application = builder.build()
         self.discord_bot = discord_bot
+        self.webhook_server = None
+        # 发往 Telegram 的消息统一经由发送队列限速
+        self.outbox = TelegramOutbox(
+            self.application.bot,
+            rate=config.TG_SEND_PER_MINUTE / 60,
+            burst=config.TG_SEND_BURST,
+            file_cache=FileIdCache(config.TG_FILE_ID_CACHE_PATH, config.TG_FILE_ID_CACHE_SIZE)
+        )
+        # 相册 (media_group) 缓冲: {media_group_id: [message, ...]}
+        self._media_groups = {}
+        self._media_group_tasks = {}
         self.setup_handlers()
         
     def setup_handlers(self):
@@ -58,34 +81,22 @@ class TelegramBot:
         if not self.discord_bot:
             await update.message.reply_text("Discord机器人未连接")
             return
+
+        if forward_dedup.is_duplicate("telegram", update.message.chat.id, update.message.message_id):
+            logger.info(f"忽略重复的 /send 命令 (消息 {update.message.message_id})")
+            return
             
-        # 处理文本消息
-        content = message if message else ""
-        
-        # 处理图片
-        if update.message.photo:
-            photo = update.message.photo[-1]
-            file = await context.bot.get_file(photo.file_id)
-            file_url = file.file_path
-            content += f"\n[图片]({file_url})"
-        
-        # 处理文件
-        if update.message.document:
-            file = await context.bot.get_file(update.message.document.file_id)
-            file_url = file.file_path
-            content += f"\n[文件: {update.message.document.file_name}]({file_url})"
-        
-        # 处理视频
-        if update.message.video:
-            file = await context.bot.get_file(update.message.video.file_id)
-            file_url = file.file_path
-            content += f"\n[视频]({file_url})"
-            
+        # 并发解析图片/文件/视频
+        payload = ForwardPayload(message, await resolve_media(context.bot, [update.message]))
+        origin = f"telegram:{update.message.chat.id}:{update.message.message_id}"
+
         # 调用新的转发方法
-        await self.discord_bot.forward_message(content)
+        if not forward_dedup.is_forwarded("discord", origin, payload.text):
+            await self.discord_bot.forward_message(payload)
         if config.SYNC_DISCORD_TO_TG:
-            await self.send_to_telegram(f"[自动转发] \n {content.strip()}")
-        await update.message.reply_text("消息和附件已发送到Discord并自动转发回Telegram")
+            # 推回 Telegram 的内容按来源消息记录指纹，同一内容不会被再次推回
+            await self.send_to_telegram(f"{AUTO_FORWARD_TAG} \n {payload.to_text()}", origin=origin)
+        await update.message.reply_text("消息和附件已提交发送到Discord并自动转发回Telegram")
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         help_text = (
@@ -108,81 +119,116 @@ class TelegramBot:
         if not config.SYNC_TG_TO_DISCORD or self.discord_bot is None:
             return
             
+        # 相册中的每张图片都是一条独立的更新，先缓冲再合并发送
+        if message.media_group_id:
+            if not forward_dedup.is_duplicate("telegram", message.chat.id, message.message_id):
+                self._buffer_media_group(message)
+            return
+
+        # 在解析媒体 (调用 API) 之前丢弃重复的消息
+        if forward_dedup.is_duplicate("telegram", message.chat.id, message.message_id):
+            logger.info(f"忽略重复的 Telegram 消息 {message.message_id}")
+            return
+        text = message.text or message.caption
+
         logger.info(f"收到 Telegram 消息 (from target chat {message.chat.id}): {message.text}")
         
-        content = message.text or ""
-        
-        if message.photo:
-            photo = message.photo[-1]
-            file = await context.bot.get_file(photo.file_id)
-            file_url = file.file_path
-            content += f"\n[图片]({file_url})"
-        
-        if message.document:
-            file = await context.bot.get_file(message.document.file_id)
-            file_url = file.file_path
-            content += f"\n[文件: {message.document.file_name}]({file_url})"
-        
-        if message.video:
-            file = await context.bot.get_file(message.video.file_id)
-            file_url = file.file_path
-            content += f"\n[视频]({file_url})"
+        payload = ForwardPayload.from_text(text, await resolve_media(context.bot, [message]))
         
         # 调用新的转发方法
-        await self.discord_bot.forward_message(content)
-    
-    async def send_to_telegram(self, message=None, embed=None, image_path=None):
-        """发送消息、嵌入内容或本地图片到 Telegram 频道"""
+        await self.discord_bot.forward_message(payload)
+
+    def _buffer_media_group(self, message):
+        """缓冲相册消息，窗口期内没有新消息到达后合并发送"""
+        group_id = message.media_group_id
+        self._media_groups.setdefault(group_id, []).append(message)
+
+        # 每收到一条新消息就重新计时
+        pending_task = self._media_group_tasks.get(group_id)
+        if pending_task and not pending_task.done():
+            pending_task.cancel()
+        self._media_group_tasks[group_id] = asyncio.create_task(self._flush_media_group(group_id))
+
+    async def _flush_media_group(self, group_id):
+        """等待窗口期结束后，将相册合并为一条消息转发到 Discord"""
+        try:
+            await asyncio.sleep(config.TG_MEDIA_GROUP_WINDOW)
+        except asyncio.CancelledError:
+            return
+        self._media_group_tasks.pop(group_id, None)
+        messages = sorted(self._media_groups.pop(group_id, []), key=lambda m: m.message_id)
+        if not messages:
+            return
+
+        logger.info(f"收到 Telegram 相册 {group_id} (from target chat {messages[0].chat.id})，共 {len(messages)} 条")
+
+        # 相册的说明文字只附在其中一条消息上
+        content = next((m.caption or m.text for m in messages if m.caption or m.text), "")
+        try:
+            payload = ForwardPayload.from_text(content, await resolve_media(self.application.bot, messages))
+            await self.discord_bot.forward_message(payload)
+        except Exception as e:
+            logger.error(f"转发 Telegram 相册 {group_id} 失败: {e}")
+
+    async def send_to_telegram(self, message=None, embed=None, image_path=None, origin=None):
+        """
+        发送消息、嵌入内容或本地图片到 Telegram 频道
+
+        origin: 来源消息 "平台:会话:消息ID"，提供时同一来源的同一内容只发送一次 (回环和重复抑制)
+        """
+        if origin and forward_dedup.is_forwarded("telegram", origin, message):
+            logger.info(f"忽略已转发到 Telegram 的内容 (来源 {origin})")
+            return
         try:
             # 优先处理本地图片路径
             if image_path:
                 try:
-                    with open(image_path, 'rb') as photo_file:
-                        await self.application.bot.send_photo(
-                            chat_id=config.TELEGRAM_CHANNEL_ID,
-                            photo=photo_file,
-                            caption=f"{config.DISCORD_MESSAGE_PREFIX}{message}" if message else None
-                        )
+                    # 本地文件在轮到发送时才读取
+                    await self.outbox.submit_photo(
+                        config.TELEGRAM_CHANNEL_ID,
+                        Path(image_path),
+                        caption=f"{config.DISCORD_MESSAGE_PREFIX}{message}" if message else None
+                    )
                     logger.info(f"本地图片已发送到 Telegram: {image_path}")
                 except FileNotFoundError:
                     logger.error(f"Telegram 发送失败：找不到本地图片文件 {image_path}")
                     # 如果图片发送失败，尝试只发送文本（如果存在）
                     if message:
-                        await self.application.bot.send_message(
-                            chat_id=config.TELEGRAM_CHANNEL_ID,
-                            text=f"{config.DISCORD_MESSAGE_PREFIX}{message} (图片发送失败)"
+                        await self.outbox.submit_text(
+                            config.TELEGRAM_CHANNEL_ID,
+                            f"{config.DISCORD_MESSAGE_PREFIX}{message} (图片发送失败)"
                         )
                         logger.info(f"图片发送失败后，消息已发送到 Telegram: {message}")
                 except Exception as e:
                     logger.error(f"使用本地图片发送到 Telegram 失败: {e}")
                     # 同样尝试只发送文本
                     if message:
-                        await self.application.bot.send_message(
-                            chat_id=config.TELEGRAM_CHANNEL_ID,
-                            text=f"{config.DISCORD_MESSAGE_PREFIX}{message} (图片发送失败: {e})"
+                        await self.outbox.submit_text(
+                            config.TELEGRAM_CHANNEL_ID,
+                            f"{config.DISCORD_MESSAGE_PREFIX}{message} (图片发送失败: {e})"
                         )
                         logger.info(f"图片发送失败后，消息已发送到 Telegram: {message}")
 
             # 如果没有本地图片，检查是否有embed图片
             elif embed and embed.image:
-                await self.application.bot.send_photo(
-                    chat_id=config.TELEGRAM_CHANNEL_ID,
-                    photo=embed.image.url, # 使用 embed 中的 URL
+                await self.outbox.submit_photo(
+                    config.TELEGRAM_CHANNEL_ID,
+                    embed.image.url, # 使用 embed 中的 URL
                     caption=f"{config.DISCORD_MESSAGE_PREFIX}{message}" if message else None
                 )
                 logger.info(f"Embed 图片已发送到 Telegram: {embed.image.url}")
                 # 如果 embed 也有文本，并且没有和图片一起发送，则单独发送文本
                 if message and not (f"{config.DISCORD_MESSAGE_PREFIX}{message}" if message else None):
-                     await self.application.bot.send_message(
-                        chat_id=config.TELEGRAM_CHANNEL_ID,
-                        text=f"{config.DISCORD_MESSAGE_PREFIX}{message}"
+                     await self.outbox.submit_text(
+                        config.TELEGRAM_CHANNEL_ID,
+                        f"{config.DISCORD_MESSAGE_PREFIX}{message}"
                     )
                      logger.info(f"补充发送 Embed 消息文本到 Telegram: {message}")
 
             elif message:
-                await self.application.bot.send_message(
-                    chat_id=config.TELEGRAM_CHANNEL_ID,
-                    text=f"{config.DISCORD_MESSAGE_PREFIX}{message}"
+                await self.outbox.submit_text(
+                    config.TELEGRAM_CHANNEL_ID,
+                    f"{config.DISCORD_MESSAGE_PREFIX}{message}"
                 )
                 logger.info(f"消息已发送到 Telegram: {message}")
                 
@@ -194,18 +240,35 @@ class TelegramBot:
         logger.error(f"更新 {update} 导致错误 {context.error}")
     
     async def start(self):
-        """启动 Telegram 机器人"""
+        """启动 Telegram 机器人 (轮询或 Webhook 模式)"""
         try:
             await self.application.initialize()
             await self.application.start()
-            await self.application.updater.start_polling()
+            if config.TELEGRAM_UPDATE_MODE == "webhook":
+                if not config.TELEGRAM_WEBHOOK_URL:
+                    raise ValueError("Webhook 模式需要配置 TELEGRAM_WEBHOOK_URL")
+                self.webhook_server = TelegramWebhookServer(
+                    self.application,
+                    listen=config.TELEGRAM_WEBHOOK_LISTEN,
+                    port=config.TELEGRAM_WEBHOOK_PORT,
+                    path=config.TELEGRAM_WEBHOOK_PATH,
+                    secret_token=config.TELEGRAM_WEBHOOK_SECRET
+                )
+                await self.webhook_server.start(config.TELEGRAM_WEBHOOK_URL)
+            else:
+                await self.application.updater.start_polling()
         except Exception as e:
             logger.error(f"无法连接 Telegram 服务器: {e}")
             raise
     
     async def stop(self):
         """停止 Telegram 机器人"""
-        await self.application.updater.stop()
+        if self.webhook_server:
+            await self.webhook_server.stop()
+            self.webhook_server = None
+        elif self.application.updater and self.application.updater.running:
+            await self.application.updater.stop()
+        await self.outbox.close()
         await self.application.stop()
         await self.application.shutdown()
         logger.info("Telegram 机器人已停止")
@@ -0,0 +1,120 @@
+"""广播进度汇报
+
+在广播过程中节流更新交互原始响应，显示成功/失败/剩余数量和预计剩余时间，
+并提供取消按钮停止尚未开始的发送。无论发送多少频道，每 N 秒最多编辑一次消息。
+"""
+import time
+import asyncio
+import logging
+from typing import Optional
+
+import discord
+
+import config
+from utils.broadcast_utils import BroadcastResult
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastCancelView(discord.ui.View):
+    """广播取消按钮"""
+
+    def __init__(self, progress: "BroadcastProgress", owner_id: int):
+        super().__init__(timeout=None)
+        self.progress = progress
+        self.owner_id = owner_id
+
+    @discord.ui.button(label="取消发送", style=discord.ButtonStyle.danger)
+    async def cancel_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        """取消剩余的发送"""
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("❌ 只有发起者可以取消此次发送", ephemeral=True)
+            return
+        self.progress.cancel()
+        button.disabled = True
+        button.label = "正在取消..."
+        await interaction.response.edit_message(content=self.progress.render(), view=self)
+        logger.info(f"用户 {interaction.user} 取消了广播")
+
+
+class BroadcastProgress:
+    """节流的广播进度汇报器"""
+
+    def __init__(self, interaction: discord.Interaction, total: int, label: str = "消息",
+                 interval: Optional[float] = None, title: Optional[str] = None):
+        self.interaction = interaction
+        self.total = total
+        self.label = label
+        self.title = title or f"正在发送{label}到 {total} 个频道"
+        self.interval = config.BROADCAST_PROGRESS_INTERVAL if interval is None else interval
+        self.sent = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.cancel_event = asyncio.Event()
+        self.view = BroadcastCancelView(self, interaction.user.id)
+        self._started_at = time.monotonic()
+        self._last_edit = 0.0
+        self._edit_task: Optional[asyncio.Task] = None
+        self._finished = False
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed + self.cancelled
+
+    def cancel(self):
+        """停止尚未开始的发送"""
+        self.cancel_event.set()
+
+    def render(self) -> str:
+        """进度文本"""
+        remaining = self.total - self.done
+        parts = [
+            self.title,
+            f"✅ 成功 {self.sent} | ❌ 失败 {self.failed} | ⏳ 剩余 {remaining}",
+        ]
+        if self.cancelled:
+            parts[-1] += f" | 🛑 已取消 {self.cancelled}"
+        if self.cancel_event.is_set():
+            parts.append("🛑 已请求取消，正在等待进行中的发送完成...")
+        elif self.done and remaining:
+            elapsed = time.monotonic() - self._started_at
+            eta = elapsed / self.done * remaining
+            parts.append(f"预计剩余时间: {eta:.0f} 秒")
+        return "\n".join(parts)
+
+    async def start(self):
+        """显示初始进度和取消按钮"""
+        self._started_at = time.monotonic()
+        self._last_edit = self._started_at
+        await self.interaction.edit_original_response(content=self.render(), view=self.view)
+
+    def record(self, result: BroadcastResult):
+        """记录单个频道的结果，并按节流间隔安排一次编辑"""
+        if result.success:
+            self.sent += 1
+        elif result.cancelled:
+            self.cancelled += 1
+        else:
+            self.failed += 1
+        if self._finished or (self._edit_task and not self._edit_task.done()):
+            return
+        delay = max(0.0, self._last_edit + self.interval - time.monotonic())
+        self._edit_task = asyncio.create_task(self._edit_after(delay))
+
+    async def _edit_after(self, delay: float):
+        if delay:
+            await asyncio.sleep(delay)
+        if self._finished:
+            return
+        self._last_edit = time.monotonic()
+        try:
+            await self.interaction.edit_original_response(content=self.render(), view=self.view)
+        except Exception as e:
+            logger.warning(f"更新广播进度失败: {e}")
+
+    async def finish(self):
+        """停止进度更新并移除取消按钮 (最终结果由调用方编辑)"""
+        self._finished = True
+        if self._edit_task and not self._edit_task.done():
+            self._edit_task.cancel()
+        self.view.stop()
@@ -0,0 +1,216 @@
+"""并发广播引擎
+
+将同一条消息并发发送到多个频道，限制同时进行中的发送数量，
+并遵守 Discord 的路由限速 (每个频道一个 bucket) 与 429 retry_after。
+"""
+import asyncio
+import time
+import logging
+import weakref
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+
+import discord
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# 发送消息的路由按频道划分 bucket，同一频道同一时间只允许一个发送
+_route_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+class BroadcastResult:
+    """单个频道的发送结果"""
+
+    def __init__(self, channel, success: bool, message: Optional[discord.Message] = None,
+                 error: Optional[BaseException] = None, reason: Optional[str] = None, cancelled: bool = False):
+        self.channel = channel
+        self.success = success
+        self.message = message
+        self.error = error
+        self.reason = reason
+        self.cancelled = cancelled  # 因取消而未发送，不计为失败
+
+    @property
+    def mention(self) -> str:
+        """用于响应消息的频道提及文本，失败时附带原因"""
+        mention = getattr(self.channel, "mention", f"<#{self.channel.id}>")
+        if self.success or not self.reason:
+            return mention
+        return f"{mention} ({self.reason})"
+
+    def __repr__(self):
+        return (f"BroadcastResult(channel={self.channel.id}, success={self.success}, "
+                f"cancelled={self.cancelled}, reason={self.reason})")
+
+
+class _RateLimitGate:
+    """全局限速闸门，遇到全局 429 时暂停所有发送"""
+
+    def __init__(self):
+        self._resume_at = 0.0
+
+    def pause(self, seconds: float):
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def wait(self):
+        delay = self._resume_at - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._resume_at - time.monotonic()
+
+
+def _get_route_lock(channel_id: int) -> asyncio.Lock:
+    lock = _route_locks.get(channel_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _route_locks[channel_id] = lock
+    return lock
+
+
+def _parse_rate_limit(e: BaseException) -> Optional[Tuple[float, bool]]:
+    """从异常中提取 (retry_after, 是否全局限速)，非限速异常返回 None"""
+    if isinstance(e, discord.RateLimited):
+        return e.retry_after, False
+    if isinstance(e, discord.HTTPException) and e.status == 429:
+        headers = getattr(e.response, "headers", {}) or {}
+        try:
+            retry_after = float(headers.get("Retry-After", 1))
+        except (TypeError, ValueError):
+            retry_after = 1.0
+        is_global = str(headers.get("X-RateLimit-Global", "")).lower() == "true"
+        return retry_after, is_global
+    return None
+
+
+async def broadcast(
+    channels: Iterable,
+    send_func: Callable[..., Awaitable[Optional[discord.Message]]],
+    concurrency: Optional[int] = None,
+    max_retries: Optional[int] = None,
+    on_result: Optional[Callable[[BroadcastResult], None]] = None,
+    cancel_event: Optional[asyncio.Event] = None,
+) -> List[BroadcastResult]:
+    """
+    并发发送到多个频道
+
+    参数:
+        channels: 目标频道对象列表
+        send_func: 接收频道对象并执行发送的协程函数，返回发送的消息(可选)
+        concurrency: 同时进行中的发送数量上限，默认 config.BROADCAST_CONCURRENCY
+        max_retries: 遇到 429 时的最大重试次数，默认 config.BROADCAST_MAX_RETRIES
+        on_result: 每个频道完成后调用的回调 (用于进度汇报)
+        cancel_event: 被设置后，尚未开始的发送将直接标记为已取消
+
+    返回:
+        List[BroadcastResult]: 与输入顺序一致的发送结果
+    """
+    channels = list(channels)
+    if not channels:
+        return []
+
+    semaphore = asyncio.Semaphore(max(1, concurrency or config.BROADCAST_CONCURRENCY))
+    retries = config.BROADCAST_MAX_RETRIES if max_retries is None else max_retries
+    gate = _RateLimitGate()
+
+    async def _send_one(channel) -> BroadcastResult:
+        result = await _attempt(channel)
+        if on_result:
+            on_result(result)
+        return result
+
+    async def _attempt(channel) -> BroadcastResult:
+        async with semaphore:
+            if cancel_event and cancel_event.is_set():
+                return BroadcastResult(channel, False, reason="已取消", cancelled=True)
+            attempt = 0
+            while True:
+                await gate.wait()
+                try:
+                    async with _get_route_lock(channel.id):
+                        message = await send_func(channel)
+                    logger.info(f"消息成功发送到频道 {channel.id} ({getattr(channel, 'name', '')})")
+                    return BroadcastResult(channel, True, message=message)
+                except discord.Forbidden as e:
+                    logger.error(f"无权发送消息到频道 {channel.id} ({getattr(channel, 'name', '')})")
+                    return BroadcastResult(channel, False, error=e, reason="无权限")
+                except Exception as e:
+                    rate_limit = _parse_rate_limit(e)
+                    if rate_limit and attempt < retries:
+                        retry_after, is_global = rate_limit
+                        attempt += 1
+                        logger.warning(
+                            f"发送到频道 {channel.id} 被限速，{retry_after:.2f}s 后重试 "
+                            f"({attempt}/{retries}{', 全局' if is_global else ''})"
+                        )
+                        if is_global:
+                            gate.pause(retry_after)
+                            continue
+                        await asyncio.sleep(retry_after)
+                        continue
+                    logger.error(f"消息发送到频道 {channel.id} ({getattr(channel, 'name', '')}) 失败: {e}")
+                    return BroadcastResult(channel, False, error=e, reason="发送失败")
+
+    return list(await asyncio.gather(*(_send_one(channel) for channel in channels)))
+
+
+async def broadcast_shared_attachment(
+    channels: Iterable,
+    upload_func: Callable[..., Awaitable[Optional[discord.Message]]],
+    reuse_func: Callable[..., Awaitable[Optional[discord.Message]]],
+    max_seed_attempts: int = 3,
+    on_result: Optional[Callable[[BroadcastResult], None]] = None,
+    cancel_event: Optional[asyncio.Event] = None,
+) -> List[BroadcastResult]:
+    """
+    附件只上传一次的并发广播
+
+    先逐个尝试向频道上传附件，直到某个频道上传成功并拿到 CDN 链接，
+    其余频道通过 reuse_func 复用该链接发送。若多次上传都失败，则回退为逐频道上传。
+
+    参数:
+        channels: 目标频道对象列表
+        upload_func: 接收频道对象，上传附件并返回消息的协程函数
+        reuse_func: 接收 (频道对象, 附件URL)，复用已上传附件发送的协程函数
+        max_seed_attempts: 寻找首个上传频道的最大尝试次数
+        on_result: 每个频道完成后调用的回调
+        cancel_event: 被设置后，尚未开始的发送将直接标记为已取消
+
+    返回:
+        List[BroadcastResult]: 所有频道的发送结果
+    """
+    remaining = list(channels)
+    results: List[BroadcastResult] = []
+    attachment_url = None
+
+    while remaining and attachment_url is None and len(results) < max_seed_attempts:
+        seed_result = (await broadcast([remaining.pop(0)], upload_func,
+                                       on_result=on_result, cancel_event=cancel_event))[0]
+        results.append(seed_result)
+        if seed_result.success and seed_result.message and seed_result.message.attachments:
+            attachment_url = seed_result.message.attachments[0].url
+
+    if not remaining:
+        return results
+
+    if attachment_url:
+        logger.info(f"附件已上传一次，其余 {len(remaining)} 个频道复用链接: {attachment_url}")
+        results.extend(await broadcast(remaining, lambda channel: reuse_func(channel, attachment_url),
+                                       on_result=on_result, cancel_event=cancel_event))
+    else:
+        logger.warning("未能获取已上传附件的链接，回退为逐频道上传")
+        results.extend(await broadcast(remaining, upload_func, on_result=on_result, cancel_event=cancel_event))
+    return results
+
+
+def summarize_results(results: List[BroadcastResult]) -> Tuple[int, int, List[str], List[str], int]:
+    """
+    将发送结果汇总为 build_response_message 所需的统计信息
+
+    返回:
+        tuple: (成功数, 失败数, 成功频道提及列表, 失败频道提及列表, 已取消数)
+    """
+    sent = [r.mention for r in results if r.success]
+    failed = [r.mention for r in results if not r.success and not r.cancelled]
+    cancelled = sum(1 for r in results if r.cancelled)
+    return len(sent), len(failed), sent, failed, cancelled
@@ -1,21 +1,36 @@
+import asyncio
 import logging
-from typing import Optional
+from collections import Counter
+from typing import Dict, List, Optional
 from datetime import datetime
 import discord
 from discord import Embed
 import config
 
+# Discord 单条消息最多 10 个 Embed，且所有 Embed 总字数不超过 6000
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
 class ChannelLogger:
-    """统一频道日志记录器，支持标准日志和格式化频道消息"""
+    """统一频道日志记录器，支持标准日志和格式化频道消息
+
+    频道消息先进入内存队列立即返回，由后台协程按固定间隔批量发送:
+    每条消息最多打包 10 个 Embed；单个频道积压超过阈值时合并为一条汇总消息。
+    """
     
     def __init__(self, name: str):
         self.logger = logging.getLogger(name)
         self.bot = None
         self.default_channel = None
+        self._pending: Dict[int, List[Embed]] = {}
+        self._channels: Dict[int, discord.abc.Messageable] = {}
+        self._flush_task: Optional[asyncio.Task] = None
         
     def set_bot(self, bot: discord.Client):
-        """设置Discord bot实例"""
+        """设置Discord bot实例并启动后台发送协程"""
         self.bot = bot
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
         
     def set_default_channel(self):
         """设置默认日志频道"""
@@ -35,7 +50,7 @@ class ChannelLogger:
         channel_id: Optional[int] = None
     ) -> bool:
         """
-        发送格式化日志消息到指定频道
+        发送格式化日志消息到指定频道 (入队后立即返回，由后台协程批量发送)
         
         参数:
             source: 操作来源
@@ -45,7 +60,7 @@ class ChannelLogger:
             channel_id: 目标频道ID(可选，默认使用self.default_channel)
             
         返回:
-            bool: 是否发送成功
+            bool: 是否成功入队
         """
         if not self.bot:
             self.logger.info("Discord bot实例未初始化，跳过频道消息发送")
@@ -56,33 +71,111 @@ class ChannelLogger:
             self.logger.error("未指定日志频道且无默认频道设置")
             return False
             
-        try:
-            # 创建格式化消息
-            embed = Embed(
-                title="操作记录",
-                color=0x3498db
-            )
-            embed.add_field(name="来源", value=source, inline=True)
-            embed.add_field(name="模块", value=module, inline=True)
-            embed.add_field(name="说明", value=description, inline=False)
-            
-            if additional_info:
-                embed.add_field(name="附加信息", value=additional_info, inline=False)
-                
-            # 在页脚显示操作时间
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            embed.set_footer(text=f"操作时间: {current_time} | 青崖")
-            
-            # 获取频道并发送消息
-            target_channel = await self.bot.fetch_channel(channel)
-            await target_channel.send(embed=embed)
-            
-            self.logger.info(f"已发送日志消息到频道 {channel}: {description}")
-            return True
+        # 创建格式化消息
+        embed = Embed(
+            title="操作记录",
+            color=0x3498db
+        )
+        embed.add_field(name="来源", value=source, inline=True)
+        embed.add_field(name="模块", value=module, inline=True)
+        embed.add_field(name="说明", value=description, inline=False)
+        
+        if additional_info:
+            embed.add_field(name="附加信息", value=additional_info, inline=False)
             
-        except Exception as e:
-            self.logger.error(f"发送日志消息到频道失败: {e}")
+        # 在页脚显示操作时间
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        embed.set_footer(text=f"操作时间: {current_time} | 青崖")
+
+        return self.enqueue_embed(embed, channel)
+
+    def enqueue_embed(self, embed: Embed, channel_id: Optional[int] = None) -> bool:
+        """
+        将 Embed 加入指定频道的发送队列，由后台协程批量发送
+        
+        返回:
+            bool: 是否成功入队
+        """
+        channel = channel_id or self.default_channel
+        if not channel:
+            self.logger.error("未指定日志频道且无默认频道设置")
             return False
+        self._pending.setdefault(channel, []).append(embed)
+        return True
+
+    async def _get_channel(self, channel_id: int):
+        """获取日志频道对象，只在首次使用时请求 API"""
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
+            self._channels[channel_id] = channel
+        return channel
+
+    def _summarize(self, embeds: List[Embed]) -> Embed:
+        """将大量积压的日志合并为一条汇总"""
+        counter = Counter()
+        for embed in embeds:
+            fields = {field.name: field.value for field in embed.fields}
+            counter[(fields.get("来源", "未知"), fields.get("模块", "未知"))] += 1
+        summary = Embed(
+            title="操作记录汇总",
+            description=f"短时间内产生了 {len(embeds)} 条操作记录，已合并显示",
+            color=0xe67e22
+        )
+        for (source, module), count in counter.most_common(20):
+            summary.add_field(name=f"{source} / {module}", value=f"{count} 条", inline=True)
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        summary.set_footer(text=f"汇总时间: {current_time} | 青崖")
+        return summary
+
+    @staticmethod
+    def _pack(embeds: List[Embed]) -> List[List[Embed]]:
+        """按数量和总字数上限将 Embed 分组"""
+        batches, batch, size = [], [], 0
+        for embed in embeds:
+            embed_size = len(embed)
+            if batch and (len(batch) >= MAX_EMBEDS_PER_MESSAGE or size + embed_size > MAX_EMBED_CHARS_PER_MESSAGE):
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(embed)
+            size += embed_size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def flush(self):
+        """立即发送所有积压的日志消息"""
+        pending, self._pending = self._pending, {}
+        for channel_id, embeds in pending.items():
+            if len(embeds) > config.LOG_STORM_THRESHOLD:
+                self.logger.warning(f"日志频道 {channel_id} 积压 {len(embeds)} 条消息，合并为汇总发送")
+                embeds = [self._summarize(embeds)]
+            try:
+                target_channel = await self._get_channel(channel_id)
+                for batch in self._pack(embeds):
+                    await target_channel.send(embeds=batch)
+                self.logger.info(f"已发送 {len(embeds)} 条日志消息到频道 {channel_id}")
+            except Exception as e:
+                self._channels.pop(channel_id, None)
+                self.logger.error(f"发送日志消息到频道失败: {e}")
+
+    async def _flush_loop(self):
+        """后台定时批量发送"""
+        while True:
+            await asyncio.sleep(config.LOG_FLUSH_INTERVAL)
+            if self._pending:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    self.logger.error(f"批量发送日志消息时出错: {e}")
+
+    async def close(self):
+        """停止后台协程并发送剩余消息"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self.bot and self._pending:
+            await self.flush()
             
     def info(self, msg: str, *args, **kwargs):
         """记录info级别日志"""
@@ -1,16 +1,28 @@
 """Discord频道工具函数"""
+import asyncio
+import time
 import discord
 import logging
-from typing import Set, List, Tuple, Optional, Union
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Set, List, Tuple, Optional, Union
+
+import config
+from utils.routing_index import RoutingIndex
 
 logger = logging.getLogger(__name__)
 
 def parse_channel_ids(channel_ids_str: Optional[str]) -> Tuple[Set[int], List[str]]:
     """解析逗号分隔的频道ID字符串"""
+    if not channel_ids_str:
+        return set(), []
+    parsed_ids, parse_errors = _parse_channel_ids_cached(channel_ids_str)
+    return set(parsed_ids), list(parse_errors)
+
+@lru_cache(maxsize=128)
+def _parse_channel_ids_cached(channel_ids_str: str) -> Tuple[FrozenSet[int], Tuple[str, ...]]:
+    """解析结果缓存，同一ID字符串只解析一次"""
     parsed_ids = set()
     parse_errors = []
-    if not channel_ids_str:
-        return parsed_ids, parse_errors
 
     id_list = [id_str.strip() for id_str in channel_ids_str.split(',') if id_str.strip()]
     logger.debug(f"解析频道ID列表: {id_list}")
@@ -23,36 +35,118 @@ def parse_channel_ids(channel_ids_str: Optional[str]) -> Tuple[Set[int], List[st
             logger.warning(f"无效的频道ID格式: {channel_id_str}")
             parse_errors.append(error_msg)
 
-    return parsed_ids, parse_errors
+    return frozenset(parsed_ids), tuple(parse_errors)
+
+class ChannelResolveCache:
+    """频道解析缓存
+
+    - 正向缓存: 通过 API 获取到的频道对象，在 TTL 内直接复用
+    - 负缓存: NotFound/Forbidden 的频道ID，在 TTL 内不再请求 API
+    频道删除/更新事件到达时通过 invalidate 使对应条目失效。
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._channels: Dict[int, Tuple[Union[discord.TextChannel, discord.Thread], float]] = {}
+        self._inaccessible: Dict[int, float] = {}
+
+    def get(self, channel_id: int) -> Optional[Union[discord.TextChannel, discord.Thread]]:
+        """获取缓存的频道对象，过期或不存在时返回 None"""
+        entry = self._channels.get(channel_id)
+        if not entry:
+            return None
+        channel, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._channels[channel_id]
+            return None
+        return channel
+
+    def put(self, channel: Union[discord.TextChannel, discord.Thread]):
+        """缓存频道对象"""
+        self._channels[channel.id] = (channel, time.monotonic() + self.ttl)
+        self._inaccessible.pop(channel.id, None)
+
+    def is_inaccessible(self, channel_id: int) -> bool:
+        """检查频道ID是否在负缓存中"""
+        expires_at = self._inaccessible.get(channel_id)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._inaccessible[channel_id]
+            return False
+        return True
+
+    def mark_inaccessible(self, channel_id: int):
+        """将频道ID加入负缓存"""
+        self._inaccessible[channel_id] = time.monotonic() + self.negative_ttl
+        self._channels.pop(channel_id, None)
+
+    def invalidate(self, channel_id: int):
+        """使频道ID的正向与负缓存全部失效"""
+        self._channels.pop(channel_id, None)
+        self._inaccessible.pop(channel_id, None)
+
+
+# 全局频道解析缓存
+channel_cache = ChannelResolveCache(
+    ttl=config.CHANNEL_CACHE_TTL,
+    negative_ttl=config.CHANNEL_NEGATIVE_CACHE_TTL
+)
 
 async def fetch_channels_from_ids(
     bot_instance, 
-    channel_ids_set: Set[int]
+    channel_ids_set: Iterable[int]
 ) -> List[Union[discord.TextChannel, discord.Thread]]:
-    """根据频道ID集合获取有效的频道对象"""
+    """根据频道ID集合获取有效的频道对象，缓存未命中的ID并发通过API获取，结果按传入顺序排列"""
     target_channels = []
     if not channel_ids_set:
         return target_channels
 
     logger.debug(f"从 {len(channel_ids_set)} 个ID获取频道对象")
-    
+
+    missing_ids = []
     for channel_id in channel_ids_set:
-        try:
-            channel = bot_instance.get_channel(channel_id)
-            if not channel:
+        if channel_cache.is_inaccessible(channel_id):
+            logger.debug(f"频道ID {channel_id} 在不可访问缓存中，跳过")
+            continue
+        channel = bot_instance.get_channel(channel_id) or channel_cache.get(channel_id)
+        if channel is None:
+            missing_ids.append(channel_id)
+        elif isinstance(channel, (discord.TextChannel, discord.Thread)):
+            target_channels.append(channel)
+        else:
+            logger.warning(f"频道ID {channel_id} 不是文本频道或子区")
+
+    if not missing_ids:
+        return target_channels
+
+    semaphore = asyncio.Semaphore(max(1, config.BROADCAST_CONCURRENCY))
+
+    async def _fetch(channel_id: int):
+        async with semaphore:
+            try:
                 channel = await bot_instance.fetch_channel(channel_id)
                 logger.debug(f"从API获取频道: {channel.name} ({channel.id})")
+            except (discord.NotFound, discord.Forbidden):
+                logger.warning(f"无法访问频道ID: {channel_id}")
+                channel_cache.mark_inaccessible(channel_id)
+                return None
+            except Exception as e:
+                logger.error(f"处理频道ID {channel_id} 时出错: {e}")
+                return None
 
-            if isinstance(channel, (discord.TextChannel, discord.Thread)):
-                target_channels.append(channel)
-            else:
-                logger.warning(f"频道ID {channel_id} 不是文本频道或子区")
-                
-        except (discord.NotFound, discord.Forbidden):
-            logger.warning(f"无法访问频道ID: {channel_id}")
-        except Exception as e:
-            logger.error(f"处理频道ID {channel_id} 时出错: {e}")
+        if not isinstance(channel, (discord.TextChannel, discord.Thread)):
+            logger.warning(f"频道ID {channel_id} 不是文本频道或子区")
+            return None
+        channel_cache.put(channel)
+        return channel
 
+    fetched = await asyncio.gather(*(_fetch(channel_id) for channel_id in missing_ids))
+    target_channels.extend(channel for channel in fetched if channel is not None)
+    # API 获取的频道排在缓存命中的频道之后，恢复为传入的顺序
+    position = {channel_id: index for index, channel_id in enumerate(channel_ids_set)}
+    target_channels.sort(key=lambda channel: position.get(channel.id, len(position)))
     return target_channels
 
 async def prepare_target_channels(
@@ -63,41 +157,25 @@ async def prepare_target_channels(
     config
 ):
     """准备目标频道集合"""
-    # 获取特殊频道ID集合
-    special_channel_ids = set()
-    if isinstance(config.SPECIAL_CHANNELS, list):
-        special_channel_ids = {int(id) for id in config.SPECIAL_CHANNELS}
-    elif isinstance(config.SPECIAL_CHANNELS, str):
-        special_channel_ids = {
-            int(id_str.strip()) 
-            for id_str in config.SPECIAL_CHANNELS.split(',') 
-            if id_str.strip()
-        }
-
-    # 获取所有文本频道ID
-    all_channel_ids = {
-        id for id, ch in bot_instance.channels.items()
-        if isinstance(ch, (discord.TextChannel, discord.Thread))
-    }
+    # 优先使用机器人就绪时构建的路由索引
+    routing_index = getattr(bot_instance, "routing_index", None)
+    if routing_index is None:
+        routing_index = RoutingIndex.build(bot_instance.channels, config.SPECIAL_CHANNELS)
 
     # 解析用户指定的频道ID
     parsed_target_ids, parse_errors = parse_channel_ids(channel_ids)
 
-    # 根据转发模式确定基础频道集合
-    if forward_mode == 0:  # 不转发到特殊频道
-        base_channel_ids = all_channel_ids - special_channel_ids
-    elif forward_mode == 1:  # 转发到所有频道
-        base_channel_ids = all_channel_ids
-    else:  # 只转发到特殊频道
-        base_channel_ids = special_channel_ids
+    # 根据转发模式确定基础频道 (按配置顺序)
+    base_channel_ids = routing_index.base_order(forward_mode)
 
     # 根据频道ID模式确定最终目标
     if channel_id_mode == 'none':
         final_ids = parsed_target_ids if parsed_target_ids else base_channel_ids
     elif channel_id_mode == 'and':
-        final_ids = base_channel_ids.union(parsed_target_ids)
+        base_set = routing_index.base_ids(forward_mode)
+        final_ids = base_channel_ids + tuple(channel_id for channel_id in parsed_target_ids if channel_id not in base_set)
     else:  # 'ban'模式
-        final_ids = base_channel_ids.difference(parsed_target_ids)
+        final_ids = tuple(channel_id for channel_id in base_channel_ids if channel_id not in parsed_target_ids)
 
     return await fetch_channels_from_ids(bot_instance, final_ids), parse_errors
 
@@ -113,7 +191,8 @@ async def build_response_message(
     forward_mode,
     tg_sent_status,
     channel_id_mode="none",
-    config=None
+    config=None,
+    cancelled_channels=0
 ):
     """构建响应消息"""
     response_parts = []
@@ -153,6 +232,10 @@ async def build_response_message(
                 mentions += f", 等另外 {len(failed_channel_mentions)-display_count} 个"
             response_parts.append(f"   - 失败详情: {mentions}")
 
+    # 取消信息 (点击取消按钮后未开始的发送，不计为失败)
+    if cancelled_channels > 0:
+        response_parts.append(f"🛑 已取消发送到 {cancelled_channels} 个频道")
+
     # 解析错误
     if parse_errors:
         error_count = min(5, len(parse_errors))
@@ -172,9 +255,18 @@ async def build_response_message(
     elif len(response) > 2000:
         response = response[:1997] + "..."
 
-    # 发送到日志频道
+    # 发送到日志频道 (通过 channel_logger 批量发送，不阻塞命令响应)
     if config and hasattr(config, 'LOG_CHANNELS') and config.LOG_CHANNELS:
+        log_embed = discord.Embed(
+            title="广播结果",
+            description=response,
+            color=0x3498db
+        )
+        channel_logger = getattr(bot_instance, "channel_logger", None)
         for channel_id in config.LOG_CHANNELS:
+            if channel_logger and channel_logger.bot:
+                channel_logger.enqueue_embed(log_embed, channel_id)
+                continue
             try:
                 channel = bot_instance.get_channel(channel_id)
                 if not channel:
@@ -0,0 +1,264 @@
+"""私聊反馈存储
+
+反馈记录和冷却记录保存在 SQLite (WAL) 中：
+- feedback 表按 (user_id, status) 建立索引，查询用户未处理的请求不随历史数量增长
+- cooldown 表以 (user_id, kind) 为主键，记录带有过期时间，查询时忽略已过期的记录并顺带清理
+首次启动时从旧的 feedback.json 迁移数据，迁移后原文件重命名为 .migrated。
+数据库操作通过 asyncio.to_thread 在线程中执行，不阻塞事件循环。
+"""
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+COOLDOWN_KINDS = ("rejected", "ignored")
+
+
+class FeedbackStore:
+    """基于 SQLite 的反馈与冷却记录存储"""
+
+    def __init__(self, db_path: str, cooldown: float, legacy_json_path: Optional[str] = None):
+        """
+        参数:
+            db_path: SQLite 数据库路径
+            cooldown: 拒绝/忽略记录的有效期(秒)，过期后自动失效
+            legacy_json_path: 旧版 JSON 数据文件，存在时在首次打开数据库时迁移
+        """
+        self.db_path = Path(db_path)
+        self.cooldown = cooldown
+        self.legacy_json_path = Path(legacy_json_path) if legacy_json_path else None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    # --- 数据库操作 (在线程中执行) ---
+
+    def _open(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS feedback (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at REAL NOT NULL,
+                resolved_at REAL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_user ON feedback(user_id, status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_status ON feedback(status, created_at)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cooldown (
+                user_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                feedback_id TEXT,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (user_id, kind)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cooldown_expires ON cooldown(expires_at)")
+        self._conn = conn
+        self._migrate_legacy()
+
+    def _migrate_legacy(self):
+        """从旧版 feedback.json 导入未处理的请求和未过期的拒绝/忽略记录"""
+        path = self.legacy_json_path
+        if path is None or not path.exists():
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"读取旧版反馈数据失败，跳过迁移: {e}")
+            return
+
+        now = time.time()
+        feedback_rows, cooldown_rows = [], []
+        for key, value in data.items():
+            if not isinstance(value, dict):
+                continue
+            kind, _, user_id = key.partition("_")
+            if kind in COOLDOWN_KINDS and user_id.isdigit():
+                created_at = value.get("timestamp", now)
+                if created_at + self.cooldown > now:
+                    cooldown_rows.append((int(user_id), kind, value.get("feedback_id"), created_at, created_at + self.cooldown))
+            elif "user_id" in value and "content" in value:
+                feedback_rows.append((key, value["user_id"], value["content"], value.get("timestamp", now)))
+
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO feedback (id, user_id, content, created_at) VALUES (?, ?, ?, ?)",
+                feedback_rows
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cooldown (user_id, kind, feedback_id, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                cooldown_rows
+            )
+        path.rename(path.with_name(f"{path.name}.migrated"))
+        logger.info(f"已从 {path} 迁移 {len(feedback_rows)} 条反馈和 {len(cooldown_rows)} 条冷却记录")
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._db_lock:
+            if self._conn is None:
+                self._open()
+            return self._conn.execute(sql, params).fetchall()
+
+    def _check_user(self, user_id: int, now: float) -> Dict:
+        with self._db_lock:
+            if self._conn is None:
+                self._open()
+            cooldowns = self._conn.execute(
+                "SELECT kind, expires_at FROM cooldown WHERE user_id = ? AND expires_at > ?",
+                (user_id, now)
+            ).fetchall()
+            pending = self._conn.execute(
+                "SELECT 1 FROM feedback WHERE user_id = ? AND status = ? LIMIT 1",
+                (user_id, STATUS_PENDING)
+            ).fetchone()
+        return {"cooldowns": dict(cooldowns), "has_pending": pending is not None}
+
+    def _set_cooldown(self, user_id: int, kind: str, feedback_id: Optional[str], now: float):
+        with self._db_lock:
+            if self._conn is None:
+                self._open()
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cooldown (user_id, kind, feedback_id, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, kind, feedback_id, now, now + self.cooldown)
+                )
+                # 顺带清理已过期的记录 (按 expires_at 索引删除)
+                self._conn.execute("DELETE FROM cooldown WHERE expires_at <= ?", (now,))
+
+    def _remap(self, mapping: Dict[str, str], now: float) -> Dict[str, str]:
+        remapped = {}
+        with self._db_lock:
+            if self._conn is None:
+                self._open()
+            with self._conn:
+                self._conn.execute("BEGIN")
+                for old_id, new_id in mapping.items():
+                    self._conn.execute(
+                        """
+                        INSERT INTO feedback (id, user_id, content, created_at)
+                        SELECT ?, user_id, content, created_at FROM feedback WHERE id = ? AND status = 'pending'
+                        """,
+                        (new_id, old_id)
+                    )
+                    cursor = self._conn.execute(
+                        "UPDATE feedback SET status = 'rebuilt', resolved_at = ? WHERE id = ? AND status = 'pending'",
+                        (now, old_id)
+                    )
+                    if cursor.rowcount:
+                        remapped[old_id] = new_id
+        return remapped
+
+    def _restore(self, mapping: Dict[str, str]):
+        with self._db_lock:
+            if self._conn is None:
+                self._open()
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "DELETE FROM feedback WHERE id = ? AND status = 'pending'",
+                    [(new_id,) for new_id in mapping.values()]
+                )
+                self._conn.executemany(
+                    "UPDATE feedback SET status = 'pending', resolved_at = NULL WHERE id = ? AND status = 'rebuilt'",
+                    [(old_id,) for old_id in mapping]
+                )
+
+    # --- 公共接口 ---
+
+    async def add(self, feedback_id: str, user_id: int, content: str):
+        """保存一条新的反馈请求"""
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO feedback (id, user_id, content, created_at) VALUES (?, ?, ?, ?)",
+            (feedback_id, user_id, content, time.time())
+        )
+
+    async def get(self, feedback_id: str) -> Optional[Dict]:
+        """获取未处理的反馈，已处理或不存在时返回 None"""
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT user_id, content, created_at FROM feedback WHERE id = ? AND status = ?",
+            (feedback_id, STATUS_PENDING)
+        )
+        if not rows:
+            return None
+        user_id, content, created_at = rows[0]
+        return {"user_id": user_id, "content": content, "timestamp": created_at}
+
+    async def resolve(self, feedback_id: str, status: str):
+        """将反馈标记为已处理 (replied / rejected / ignored)"""
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE feedback SET status = ?, resolved_at = ? WHERE id = ?",
+            (status, time.time(), feedback_id)
+        )
+
+    async def pending(self) -> List[Dict]:
+        """所有未处理的反馈，按提交时间排序"""
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT id, user_id, content, created_at FROM feedback WHERE status = ? ORDER BY created_at",
+            (STATUS_PENDING,)
+        )
+        return [
+            {"id": fb_id, "user_id": user_id, "content": content, "timestamp": created_at}
+            for fb_id, user_id, content, created_at in rows
+        ]
+
+    async def remap(self, mapping: Dict[str, str]) -> Dict[str, str]:
+        """
+        在同一事务中将一批未处理的反馈迁移到新ID (保留原提交时间)，原记录标记为 rebuilt
+
+        参数:
+            mapping: {原ID: 新ID}
+
+        返回:
+            dict: 实际迁移的 {原ID: 新ID}，期间已被处理的请求不会迁移
+        """
+        if not mapping:
+            return {}
+        return await asyncio.to_thread(self._remap, mapping, time.time())
+
+    async def restore(self, mapping: Dict[str, str]):
+        """撤销 remap：删除尚未处理的新记录，原记录恢复为未处理"""
+        if mapping:
+            await asyncio.to_thread(self._restore, mapping)
+
+    async def set_cooldown(self, user_id: int, kind: str, feedback_id: Optional[str] = None):
+        """记录被拒绝/忽略的用户，cooldown 秒后自动失效"""
+        await asyncio.to_thread(self._set_cooldown, user_id, kind, feedback_id, time.time())
+
+    async def check_user(self, user_id: int) -> Dict:
+        """
+        查询用户当前的限制状态
+
+        返回:
+            dict: {"cooldowns": {kind: expires_at}, "has_pending": bool}
+        """
+        return await asyncio.to_thread(self._check_user, user_id, time.time())
+
+    def close(self):
+        if self._conn is not None:
+            with self._db_lock:
+                self._conn.close()
+            self._conn = None
@@ -0,0 +1,192 @@
+"""/fetch 图片库的内容寻址存储
+
+图片按内容的 SHA-256 保存为 blobs/<前两位>/<sha256><扩展名>，元数据条目通过 sha256/blob_path 指向文件：
+- 上传时边接收边计算哈希并写入临时文件，完成后重命名为最终路径；内容已存在时直接丢弃临时文件
+- 相同内容在不同用户、不同服务器间只保存一份，按 blob_path 引用计数，最后一个引用删除时才删除文件
+- 放入文件/登记引用与释放引用都需在元数据存储的锁内进行，避免删除文件的同时有相同内容上传
+- migrate_legacy 将旧版按日期目录保存的图片一次性迁移到 blobs 下
+"""
+import os
+import uuid
+import shutil
+import hashlib
+import asyncio
+import logging
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = "blobs"
+
+
+class BlobWriter:
+    """单次上传的流式写入器，写入的同时计算 SHA-256"""
+
+    def __init__(self, store: "BlobStore", ext: str):
+        self.store = store
+        self.ext = ext.lower()
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._tmp_path = os.path.join(store.tmp_dir, f"{uuid.uuid4().hex}.part")
+        self._file = None
+
+    async def __aenter__(self) -> "BlobWriter":
+        self._file = await asyncio.to_thread(self._open)
+        return self
+
+    def _open(self):
+        os.makedirs(self.store.tmp_dir, exist_ok=True)
+        return open(self._tmp_path, 'wb')
+
+    async def write(self, chunk: bytes):
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        await asyncio.to_thread(self._file.write, chunk)
+
+    async def commit(self) -> Tuple[str, str]:
+        """
+        完成写入并放入内容寻址路径 (调用方需持有元数据存储的锁)
+
+        返回:
+            tuple: (sha256, blob_path)，blob_path 相对于图片库根目录
+        """
+        self._file.close()
+        digest = self._hash.hexdigest()
+        blob_path = self.store.blob_path(digest, self.ext)
+        await asyncio.to_thread(self.store._place, self._tmp_path, blob_path)
+        self.store.acquire(blob_path)
+        return digest, blob_path
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._file and not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class BlobStore:
+    """内容寻址的图片文件存储及其引用计数"""
+
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        self.tmp_dir = os.path.join(base_path, BLOB_DIR, "tmp")
+        self._refs: Counter = Counter()
+
+    @staticmethod
+    def blob_path(digest: str, ext: str) -> str:
+        return os.path.join(BLOB_DIR, digest[:2], f"{digest}{ext}")
+
+    def full_path(self, blob_path: str) -> str:
+        return os.path.join(self.base_path, blob_path)
+
+    def _place(self, src: str, blob_path: str):
+        """将临时文件移动到内容寻址路径，内容已存在时删除临时文件 (在线程中执行)"""
+        target = self.full_path(blob_path)
+        if os.path.exists(target):
+            os.remove(src)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(src, target)
+
+    # --- 引用计数 ---
+
+    # 引用计数以 blob_path 为键: 相同内容保存为不同扩展名时是不同的文件，需要分别计数
+
+    def load_refs(self, entries: Iterable[dict]):
+        """从元数据条目统计引用计数"""
+        self._refs = Counter(entry['blob_path'] for entry in entries if entry.get('blob_path'))
+
+    def acquire(self, blob_path: str):
+        self._refs[blob_path] += 1
+
+    async def release(self, blob_path: str) -> bool:
+        """
+        释放一个引用，最后一个引用释放时删除文件，返回是否已删除
+
+        调用方需持有元数据存储的锁，使删除文件与相同内容的上传 (_place + acquire) 互斥
+        """
+        self._refs[blob_path] -= 1
+        if self._refs[blob_path] > 0:
+            return False
+        del self._refs[blob_path]
+        target = self.full_path(blob_path)
+        if os.path.exists(target):
+            await asyncio.to_thread(os.remove, target)
+        logger.info(f"图片文件 {blob_path} 已无引用，已删除")
+        return True
+
+    def references(self, blob_path: str) -> int:
+        return self._refs.get(blob_path, 0)
+
+    def writer(self, ext: str) -> BlobWriter:
+        return BlobWriter(self, ext)
+
+    # --- 旧数据迁移 ---
+
+    def _copy_legacy(self, relative_path: str) -> Optional[dict]:
+        """计算旧文件的哈希并复制到 blobs 下 (在线程中执行)，文件不存在时返回 None"""
+        source = os.path.join(self.base_path, relative_path)
+        if not os.path.isfile(source):
+            return None
+        digest = hashlib.sha256()
+        size = 0
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+                size += len(chunk)
+        ext = os.path.splitext(source)[1].lower() or '.png'
+        blob_path = self.blob_path(digest.hexdigest(), ext)
+        if not os.path.exists(self.full_path(blob_path)):
+            os.makedirs(self.tmp_dir, exist_ok=True)
+            tmp_path = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.part")
+            shutil.copyfile(source, tmp_path)
+            self._place(tmp_path, blob_path)
+        return {'sha256': digest.hexdigest(), 'blob_path': blob_path, 'size': size}
+
+    def _remove_legacy(self, relative_paths: Iterable[str]):
+        """删除已迁移的旧文件以及因此变空的日期目录 (在线程中执行)"""
+        base = os.path.normpath(self.base_path)
+        for relative_path in relative_paths:
+            source = os.path.join(self.base_path, relative_path)
+            try:
+                os.remove(source)
+                directory = os.path.dirname(os.path.normpath(source))
+                if directory != base and not os.listdir(directory):
+                    os.rmdir(directory)
+            except OSError as e:
+                logger.warning(f"删除已迁移的旧文件 {relative_path} 失败: {e}")
+
+    async def migrate_legacy(self, store) -> int:
+        """
+        将元数据中尚未迁移的条目 (没有 sha256) 的文件移入 blobs，并补全条目字段
+
+        先复制文件并写入元数据，确认落盘后才删除旧文件，迁移中途崩溃不会丢失图片。
+        返回迁移的条目数量
+        """
+        # 旧版同名上传会覆盖文件，多个条目可能指向同一个文件
+        moved = {}
+        async with store.transaction() as metadata_list:
+            for entry in metadata_list:
+                relative_path = entry.get('relative_path')
+                if entry.get('sha256') or not relative_path:
+                    continue
+                fields = moved.get(relative_path)
+                if fields is None:
+                    try:
+                        fields = await asyncio.to_thread(self._copy_legacy, relative_path)
+                    except OSError as e:
+                        logger.error(f"迁移图片 {relative_path} 失败: {e}")
+                        continue
+                    if fields is None:
+                        continue
+                    moved[relative_path] = fields
+                entry.update(fields)
+        if not moved:
+            return 0
+        if not await store.flush():
+            logger.error("元数据写入失败，保留旧文件，下次启动时重新迁移")
+            return 0
+        await asyncio.to_thread(self._remove_legacy, list(moved))
+        logger.info(f"已将 {len(moved)} 张旧版图片迁移到内容寻址存储")
+        return len(moved)
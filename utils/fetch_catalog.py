@@ -0,0 +1,266 @@
+"""/fetch 图片库目录
+
+图片列表和元数据在首次使用时加载到内存，按路径建立字典并按服务器分区：
+- 通过 /fetch_upd 上传的图片以元数据为准，文件保存在内容寻址存储 (BlobStore) 中
+- 上传/删除时由命令直接增量更新
+- 查询前检查各目录的 mtime (节流)，只重新扫描发生变化的目录，以感知手动放入的文件
+自动补全 (通过 FetchSearchIndex) 和随机调取直接从内存返回，不再遍历目录和元数据列表。
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import config
+from utils.file_utils import FETCH_BASE_PATH, fetch_metadata_store
+from utils.fetch_search import FetchSearchIndex
+from utils.fetch_blobs import BLOB_DIR, BlobStore
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+
+def _scan_dir(path: str) -> Tuple[float, List[str]]:
+    """读取单个目录的 mtime 和其中的图片文件名 (在线程中执行)"""
+    mtime = os.stat(path).st_mtime
+    with os.scandir(path) as entries:
+        names = [entry.name for entry in entries if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)]
+    return mtime, names
+
+
+class FetchCatalog:
+    """内存中的 /fetch 图片索引"""
+
+    def __init__(self, base_path: str = FETCH_BASE_PATH, refresh_interval: float = 5.0,
+                 search_index: Optional[FetchSearchIndex] = None):
+        """
+        参数:
+            base_path: 图片库根目录
+            refresh_interval: 两次检查目录 mtime 的最小间隔(秒)
+            search_index: 自动补全使用的搜索索引
+        """
+        self.base_path = base_path
+        self.search_index = search_index or FetchSearchIndex(os.path.join(base_path, 'popularity.json'))
+        self.blobs = BlobStore(base_path)
+        self.refresh_interval = refresh_interval
+        # 相对路径 (如 2024-01-01/a_b.png)，对内容寻址存储中的图片是元数据中的逻辑路径
+        self._images: Set[str] = set()
+        # 逻辑路径 -> 实际文件路径 (blob_path)，不在其中的图片逻辑路径即实际路径
+        self._files: Dict[str, str] = {}
+        # 目录相对路径 -> 该目录中的图片相对路径
+        self._dir_images: Dict[str, Set[str]] = {}
+        self._dir_mtimes: Dict[str, float] = {}
+        # 文件名(小写) -> 相对路径
+        self._by_name: Dict[str, str] = {}
+        # 元数据: 相对路径 -> 条目，以及兼容旧数据的 saved_filename -> 条目
+        self._meta_by_path: Dict[str, dict] = {}
+        self._meta_by_name: Dict[str, dict] = {}
+        # 服务器ID -> 相对路径 (没有元数据或没有服务器的图片在 None 分区)
+        self._by_guild: Dict[Optional[str], Set[str]] = {}
+        self._image_guild: Dict[str, Optional[str]] = {}
+        self._loaded = False
+        self._last_refresh = 0.0
+        self._refresh_lock = asyncio.Lock()
+
+    # --- 索引维护 ---
+
+    async def _load_metadata(self):
+        store = fetch_metadata_store(self.base_path)
+        # 首次加载时将旧版按日期目录保存的图片迁移到内容寻址存储
+        if any(not entry.get('sha256') for entry in store.data):
+            await self.blobs.migrate_legacy(store)
+        self.blobs.load_refs(store.data)
+        self._meta_by_path.clear()
+        self._meta_by_name.clear()
+        for entry in store.data:
+            self._index_meta(entry)
+            if entry.get('blob_path'):
+                self._add_image(os.path.normpath(entry['relative_path']))
+
+    def _index_meta(self, entry: dict):
+        rel_path = os.path.normpath(entry.get('relative_path') or entry.get('saved_filename', ''))
+        self._meta_by_path[rel_path] = entry
+        self._meta_by_name.setdefault(entry.get('saved_filename'), entry)
+
+    def _meta_of(self, rel_path: str) -> Optional[dict]:
+        return self._meta_by_path.get(rel_path) or self._meta_by_name.get(os.path.basename(rel_path))
+
+    @staticmethod
+    def _uploaded_at(meta: Optional[dict]) -> float:
+        try:
+            return datetime.fromisoformat(meta['upload_time']).timestamp() if meta else 0.0
+        except (KeyError, TypeError, ValueError):
+            return 0.0
+
+    def _add_image(self, rel_path: str):
+        if rel_path in self._images:
+            self._remove_image(rel_path)
+        self._images.add(rel_path)
+        self._by_name.setdefault(os.path.basename(rel_path).lower(), rel_path)
+        meta = self._meta_of(rel_path)
+        if meta and meta.get('blob_path'):
+            self._files[rel_path] = meta['blob_path']
+        guild_id = meta.get('guild_id') if meta else None
+        self._image_guild[rel_path] = guild_id
+        self._by_guild.setdefault(guild_id, set()).add(rel_path)
+        # 文件名 (含发送者_内容) 和上传者都参与搜索
+        uploader = meta.get('uploader_name', '') if meta else ''
+        self.search_index.add(rel_path, f"{rel_path}\n{uploader}", self._uploaded_at(meta))
+
+    def _remove_image(self, rel_path: str):
+        if rel_path not in self._images:
+            return
+        self._images.discard(rel_path)
+        name = os.path.basename(rel_path).lower()
+        if self._by_name.get(name) == rel_path:
+            del self._by_name[name]
+            # 同名文件存在于其他目录时改为指向其中之一
+            other = next((p for p in self._images if os.path.basename(p).lower() == name), None)
+            if other:
+                self._by_name[name] = other
+        self._files.pop(rel_path, None)
+        guild_id = self._image_guild.pop(rel_path, None)
+        self._by_guild.get(guild_id, set()).discard(rel_path)
+        self.search_index.remove(rel_path)
+
+    def _apply_dir(self, dir_rel: str, mtime: float, names: List[str]):
+        """用一次目录扫描的结果替换该目录的索引"""
+        # 已由元数据登记的图片不受目录扫描影响
+        current = {os.path.normpath(os.path.join(dir_rel, name)) for name in names} - self._files.keys()
+        previous = self._dir_images.get(dir_rel, set())
+        for rel_path in previous - current:
+            self._remove_image(rel_path)
+        for rel_path in current - previous:
+            self._add_image(rel_path)
+        self._dir_images[dir_rel] = current
+        self._dir_mtimes[dir_rel] = mtime
+
+    def _changed_dirs(self) -> Tuple[List[str], List[str]]:
+        """对比目录 mtime，返回 (需要重新扫描的目录, 已消失的目录)"""
+        if not os.path.isdir(self.base_path):
+            return [], list(self._dir_images)
+        # 根目录 mtime 变化说明有日期目录增删，需要重新列出子目录
+        dirs = ["."]
+        with os.scandir(self.base_path) as entries:
+            dirs.extend(entry.name for entry in entries if entry.is_dir() and entry.name != BLOB_DIR)
+        changed = []
+        for dir_rel in dirs:
+            try:
+                mtime = os.stat(os.path.join(self.base_path, dir_rel)).st_mtime
+            except OSError:
+                continue
+            if self._dir_mtimes.get(dir_rel) != mtime:
+                changed.append(dir_rel)
+        removed = [dir_rel for dir_rel in self._dir_images if dir_rel not in dirs]
+        return changed, removed
+
+    async def refresh(self, force: bool = False):
+        """检查目录变化并增量更新索引 (按 refresh_interval 节流)"""
+        now = time.monotonic()
+        if not force and self._loaded and now - self._last_refresh < self.refresh_interval:
+            return
+        async with self._refresh_lock:
+            if not force and self._loaded and time.monotonic() - self._last_refresh < self.refresh_interval:
+                return
+            if not self._loaded:
+                await self._load_metadata()
+            changed, removed = await asyncio.to_thread(self._changed_dirs)
+            for dir_rel in removed:
+                self._apply_dir(dir_rel, 0.0, [])
+                self._dir_images.pop(dir_rel, None)
+                self._dir_mtimes.pop(dir_rel, None)
+            for dir_rel in changed:
+                try:
+                    mtime, names = await asyncio.to_thread(_scan_dir, os.path.join(self.base_path, dir_rel))
+                except OSError as e:
+                    logger.warning(f"扫描图片目录 {dir_rel} 失败: {e}")
+                    continue
+                self._apply_dir(dir_rel, mtime, names)
+            if not self._loaded:
+                logger.info(f"图片库目录已加载: {len(self._images)} 张图片，{len(self._meta_by_path)} 条元数据")
+            elif changed or removed:
+                logger.debug(f"图片库目录已更新: {len(changed)} 个目录发生变化")
+            self._loaded = True
+            self._last_refresh = time.monotonic()
+
+    # --- 命令调用的增量更新 ---
+
+    def add_upload(self, entry: dict):
+        """上传完成后登记新图片及其元数据"""
+        if not self._loaded:
+            return
+        self._index_meta(entry)
+        self._add_image(os.path.normpath(entry['relative_path']))
+
+    def remove(self, rel_path: str):
+        """删除图片后移除索引"""
+        if not self._loaded:
+            return
+        rel_path = os.path.normpath(rel_path)
+        meta = self._meta_by_path.pop(rel_path, None)
+        if meta and self._meta_by_name.get(meta.get('saved_filename')) is meta:
+            del self._meta_by_name[meta['saved_filename']]
+        self._remove_image(rel_path)
+        self.search_index.forget(rel_path)
+        self._dir_images.get(os.path.dirname(rel_path) or ".", set()).discard(rel_path)
+
+    # --- 查询 ---
+
+    def visible(self, guild_id: Optional[str], is_admin: bool, include_unowned: bool = False) -> Set[str]:
+        """
+        当前用户可见的图片相对路径
+
+        参数:
+            guild_id: 当前服务器ID，私信中为 None (不过滤)
+            is_admin: 管理员可见全部图片
+            include_unowned: 是否包含没有元数据 (不属于任何服务器) 的图片
+        """
+        if is_admin or not guild_id or not self._meta_by_path:
+            return self._images
+        images = self._by_guild.get(guild_id, set())
+        if include_unowned:
+            images = images | self._by_guild.get(None, set())
+        return images
+
+    def find(self, filename: str) -> Optional[str]:
+        """按文件名 (忽略目录和大小写) 查找图片"""
+        return self._by_name.get(os.path.basename(filename).lower())
+
+    def search(self, query: str, guild_id: Optional[str], is_admin: bool, user_id: Optional[int] = None,
+               limit: int = 25) -> List[str]:
+        """在当前用户可见的图片中按匹配质量、调取次数和上传时间搜索"""
+        images = self.visible(guild_id, is_admin)
+        return self.search_index.search(query, images, scope=(guild_id, is_admin), user_id=user_id, limit=limit)
+
+    def record_fetch(self, rel_path: str):
+        """记录一次调取 (用于搜索排序)"""
+        self.search_index.record_fetch(rel_path)
+
+    def guild_of(self, rel_path: str) -> Optional[str]:
+        return self._image_guild.get(rel_path)
+
+    def has_metadata(self, rel_path: str) -> bool:
+        return rel_path in self._meta_by_path or os.path.basename(rel_path) in self._meta_by_name
+
+    def random_choice(self, guild_id: Optional[str], is_admin: bool) -> Optional[str]:
+        images = self.visible(guild_id, is_admin, include_unowned=True)
+        if not images:
+            return None
+        return random.choice(tuple(images))
+
+    def path_of(self, rel_path: str) -> str:
+        """图片的实际文件路径"""
+        return os.path.join(self.base_path, self._files.get(rel_path, rel_path))
+
+    def exists(self, rel_path: str) -> bool:
+        return rel_path in self._images
+
+    def __len__(self):
+        return len(self._images)
+
+
+fetch_catalog = FetchCatalog(FETCH_BASE_PATH, config.FETCH_CATALOG_REFRESH_INTERVAL)
@@ -0,0 +1,183 @@
+"""/fetch 自动补全的 n-gram 搜索索引
+
+- 对 "相对路径 + 上传者" 文本建立 1~3 字符的 n-gram 倒排索引，查询时只求交集后校验，不遍历全部图片
+- 结果按匹配质量 (完整文件名 > 词首 > 子串 > 仅匹配上传者)、调取次数和上传时间排序，返回前 N 个
+- 每个用户缓存上一次查询的候选集合，继续输入时在上一次的结果中收窄，不重新查询索引
+"""
+import math
+import time
+import heapq
+import logging
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.json_store import get_store
+
+logger = logging.getLogger(__name__)
+
+MAX_GRAM = 3
+_TOKEN_SPLIT = re.compile(r"[\s_\-./\\]+")
+
+
+def _grams(text: str, size: int) -> Set[str]:
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class _Entry:
+    __slots__ = ("name", "text", "tokens", "uploaded_at")
+
+    def __init__(self, name: str, text: str, uploaded_at: float):
+        self.name = name  # 不含扩展名的文件名 (小写)
+        self.text = text  # 参与匹配的完整文本 (小写)
+        # 文件名中的词 (发送者、内容等)，用于词首匹配
+        self.tokens = tuple(token for token in _TOKEN_SPLIT.split(name) if token)
+        self.uploaded_at = uploaded_at
+
+
+class FetchSearchIndex:
+    """图片文件名搜索索引"""
+
+    def __init__(self, popularity_path: str, cache_size: int = 256, cache_ttl: float = 60.0):
+        """
+        参数:
+            popularity_path: 调取次数的持久化文件
+            cache_size: 按用户缓存的查询数量上限
+            cache_ttl: 用户查询缓存的有效期(秒)
+        """
+        self._entries: Dict[str, _Entry] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        # 调取次数 {相对路径: 次数}
+        self.popularity_store = get_store(popularity_path)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        # 用户ID -> (可见范围, 查询, 候选集合, 索引版本, 时间)
+        self._user_cache: "OrderedDict[int, Tuple]" = OrderedDict()
+        self._version = 0
+
+    # --- 索引维护 ---
+
+    def add(self, key: str, text: str, uploaded_at: float = 0.0):
+        """登记或更新一张图片，key 为相对路径，text 为参与匹配的文本"""
+        if key in self._entries:
+            self.remove(key)
+        text = text.lower()
+        basename = key.replace("\\", "/").rsplit("/", 1)[-1].lower()
+        entry = _Entry(basename.rsplit(".", 1)[0], text, uploaded_at)
+        self._entries[key] = entry
+        for size in range(1, MAX_GRAM + 1):
+            for gram in _grams(text, size):
+                self._postings.setdefault(gram, set()).add(key)
+        self._version += 1
+
+    def remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for size in range(1, MAX_GRAM + 1):
+            for gram in _grams(entry.text, size):
+                keys = self._postings.get(gram)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._postings[gram]
+        self._version += 1
+
+    def forget(self, key: str):
+        """删除图片时清除其调取次数，避免之后同路径的新图片继承"""
+        if self.popularity_store.data.pop(key, None) is not None:
+            self.popularity_store.mark_dirty()
+
+    def record_fetch(self, key: str):
+        """记录一次调取，用于排序"""
+        popularity = self.popularity_store.data
+        popularity[key] = popularity.get(key, 0) + 1
+        self.popularity_store.mark_dirty()
+
+    # --- 查询 ---
+
+    def _lookup(self, query: str) -> Set[str]:
+        """从倒排索引取出包含查询文本的全部图片"""
+        size = min(MAX_GRAM, len(query))
+        postings = []
+        for gram in _grams(query, size):
+            keys = self._postings.get(gram)
+            if not keys:
+                return set()
+            postings.append(keys)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for keys in postings[1:]:
+            candidates &= keys
+            if not candidates:
+                return candidates
+        if len(query) <= MAX_GRAM:
+            return candidates
+        # 超过 n-gram 长度时校验实际包含关系
+        return {key for key in candidates if query in self._entries[key].text}
+
+    def _candidates(self, query: str, scope, visible: Set[str], user_id: Optional[int]) -> Set[str]:
+        now = time.monotonic()
+        cached = self._user_cache.get(user_id) if user_id is not None else None
+        if cached:
+            cached_scope, cached_query, cached_keys, cached_version, cached_at = cached
+            # 同一范围内继续输入: 在上一次的候选中收窄
+            if (cached_scope == scope and cached_version == self._version
+                    and now - cached_at < self.cache_ttl and query.startswith(cached_query)):
+                if query == cached_query:
+                    candidates = cached_keys
+                else:
+                    candidates = {key for key in cached_keys if query in self._entries[key].text}
+                self._remember(user_id, scope, query, candidates, now)
+                return candidates
+
+        if not query:
+            # 空查询直接在可见集合上排序，不缓存整个集合
+            return visible
+        matched = self._lookup(query)
+        candidates = matched & visible if len(matched) <= len(visible) else visible & matched
+        if user_id is not None:
+            self._remember(user_id, scope, query, candidates, now)
+        return candidates
+
+    def _remember(self, user_id: int, scope, query: str, candidates: Set[str], now: float):
+        self._user_cache[user_id] = (scope, query, candidates, self._version, now)
+        self._user_cache.move_to_end(user_id)
+        while len(self._user_cache) > self.cache_size:
+            self._user_cache.popitem(last=False)
+
+    def _score(self, key: str, query: str, now: float) -> Tuple[int, float]:
+        entry = self._entries[key]
+        if not query:
+            quality = 0
+        elif entry.name == query:
+            quality = 4
+        elif entry.name.startswith(query) or any(token.startswith(query) for token in entry.tokens):
+            quality = 3
+        elif query in key.lower():
+            quality = 2
+        else:
+            quality = 1  # 只匹配到上传者
+        popularity = math.log1p(self.popularity_store.data.get(key, 0))
+        age_days = max(0.0, now - entry.uploaded_at) / 86400 if entry.uploaded_at else 365.0
+        recency = 1.0 / (1.0 + age_days / 30)
+        return quality, popularity + recency
+
+    def search(self, query: str, visible: Set[str], scope=None, user_id: Optional[int] = None, limit: int = 25) -> List[str]:
+        """
+        在可见图片中搜索并排序
+
+        参数:
+            query: 用户输入
+            visible: 当前用户可见的图片集合
+            scope: 可见范围的标识 (如服务器ID)，范围变化时不复用缓存
+            user_id: 用于按用户缓存候选集合，None 表示不缓存
+            limit: 返回数量
+        """
+        query = query.strip().lower()
+        candidates = self._candidates(query, scope, visible, user_id)
+        now = time.time()
+        return heapq.nlargest(limit, candidates, key=lambda key: self._score(key, query, now))
+
+    def __len__(self):
+        return len(self._entries)
@@ -4,9 +4,16 @@ import uuid
 import discord
 import logging
 from typing import Optional, Tuple
+from utils.json_store import JsonStore, get_store
 
 logger = logging.getLogger(__name__)
 
+FETCH_BASE_PATH = "data/fetch"
+
+def fetch_metadata_store(base_path: str = FETCH_BASE_PATH) -> JsonStore:
+    """/fetch 图片库的元数据存储 (metadata.json，条目列表)"""
+    return get_store(os.path.join(base_path, 'metadata.json'), default=list)
+
 async def save_uploaded_file(attachment: discord.Attachment, save_dir: str) -> Tuple[Optional[str], Optional[discord.File]]:
     """
     保存上传的文件并创建 Discord File 对象
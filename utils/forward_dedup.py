@@ -0,0 +1,115 @@
+"""跨平台转发的回环与重复抑制
+
+以有界的 LRU/TTL 缓存记录两类指纹，在调用任何 API 之前检查：
+- 来源消息: "平台:会话:消息ID"，同一条消息再次到达 (更新重放、重试) 时丢弃
+- 已转发内容: "目标平台:来源消息:文本哈希"，在内容进入另一个平台时记录，
+  同一来源的同一内容再次被推送到该平台 (例如 /send 转发到 Discord 后又推回 Telegram 的回环) 时丢弃；
+  其他用户发送的相同文本来源不同，不受影响
+"""
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import config
+from utils.forward_payload import AUTO_FORWARD_TAG
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+# 发送时可能附加在文本开头的标记和前缀
+_TAGS = (AUTO_FORWARD_TAG, config.DISCORD_MESSAGE_PREFIX.strip(), config.TG_MESSAGE_PREFIX.strip())
+
+
+def content_fingerprint(text: Optional[str]) -> Optional[str]:
+    """
+    计算文本内容指纹，忽略转发标记、平台前缀和空白差异
+
+    没有文本 (如不带说明的图片) 时返回 None，这类消息只按来源消息ID去重
+    """
+    text = (text or "").strip()
+    stripped = True
+    while stripped:
+        stripped = False
+        for tag in _TAGS:
+            if tag and text.startswith(tag):
+                text = text[len(tag):].strip()
+                stripped = True
+    text = _WHITESPACE.sub(" ", text)
+    if not text:
+        return None
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ForwardDedupCache:
+    """有界的 LRU/TTL 指纹缓存"""
+
+    def __init__(self, ttl: float, max_size: int = 4096):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _contains(self, key: str) -> bool:
+        expires_at = self._entries.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return False
+        self._entries.move_to_end(key)
+        return True
+
+    def add(self, key: str):
+        self._entries[key] = time.monotonic() + self.ttl
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def seen(self, key: str) -> bool:
+        """检查指纹是否存在并计数"""
+        if self._contains(key):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def seen_or_add(self, key: str) -> bool:
+        """已存在时返回 True，否则记录并返回 False"""
+        if self.seen(key):
+            return True
+        self.add(key)
+        return False
+
+    # --- 便捷方法 ---
+
+    def is_duplicate(self, platform: str, chat_id, message_id) -> bool:
+        """来源消息是否已处理过 (首次出现时记录)"""
+        return self.seen_or_add(f"origin:{platform}:{chat_id}:{message_id}")
+
+    def is_forwarded(self, target: str, origin: str, text: Optional[str]) -> bool:
+        """
+        来源消息的这段内容是否已经转发到 target 平台 (首次转发时记录)
+
+        参数:
+            target: 目标平台 ("discord" / "telegram")
+            origin: 来源消息 "平台:会话:消息ID"
+            text: 转发的文本，忽略转发标记、平台前缀和空白差异
+        """
+        return self.seen_or_add(f"forward:{target}:{origin}:{content_fingerprint(text) or ''}")
+
+    def clear(self):
+        """清空全部指纹和计数"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# 全局缓存，两个方向的转发共用
+forward_dedup = ForwardDedupCache(config.FORWARD_DEDUP_TTL, config.FORWARD_DEDUP_SIZE)
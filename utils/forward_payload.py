@@ -0,0 +1,136 @@
+"""转发消息载荷
+
+Telegram 处理器构建 ForwardPayload 后原样传递给转发器、出站队列以及 Discord/Telegram 发送端，
+媒体以有序列表保存，不再拼接为 "[图片](url)" 之类的文本再重新解析。
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Telegram 侧消息文本中的自动转发标记，只在入口处识别一次
+AUTO_FORWARD_TAG = "[自动转发]"
+
+SOURCE_TELEGRAM = "telegram"
+SOURCE_DISCORD = "discord"
+
+
+class MediaItem:
+    """一个媒体附件"""
+
+    __slots__ = ("kind", "url", "name", "size", "file_id", "file_unique_id")
+
+    def __init__(self, kind: str, url: Optional[str], name: Optional[str] = None, size: Optional[int] = None,
+                 file_id: Optional[str] = None, file_unique_id: Optional[str] = None):
+        self.kind = kind  # photo / video / document
+        self.url = url
+        self.name = name
+        self.size = size
+        # Telegram 媒体的文件ID，下载链接会过期，持久化时只保存文件ID，发送前重新解析
+        self.file_id = file_id
+        self.file_unique_id = file_unique_id
+
+    @property
+    def key(self) -> str:
+        """同一文件的唯一标识 (Telegram 媒体使用 file_unique_id)"""
+        return self.file_unique_id or self.url
+
+    def link(self) -> str:
+        """Markdown 链接文本，用于纯文本回退和转发到 Telegram"""
+        if self.kind == "photo":
+            return f"[图片]({self.url})"
+        if self.kind == "document":
+            return f"[文件: {self.name}]({self.url})"
+        return f"[视频]({self.url})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"kind": self.kind, "url": self.url, "name": self.name, "size": self.size}
+        if self.file_id:
+            # 下载链接约 1 小时后失效且包含机器人令牌，不写入出站队列
+            data.update(url=None, file_id=self.file_id, file_unique_id=self.file_unique_id)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MediaItem":
+        return cls(data["kind"], data.get("url"), data.get("name"), data.get("size"),
+                   data.get("file_id"), data.get("file_unique_id"))
+
+    def __repr__(self) -> str:
+        return f"MediaItem({self.kind!r}, {self.url!r})"
+
+
+class ForwardPayload:
+    """一条待转发的消息"""
+
+    __slots__ = ("text", "media", "source", "auto_forwarded", "timestamp")
+
+    def __init__(self, text: str = "", media: Optional[List[MediaItem]] = None, source: str = SOURCE_TELEGRAM,
+                 auto_forwarded: bool = False, timestamp: Optional[str] = None):
+        """
+        参数:
+            text: 消息文本 (不含媒体链接)
+            media: 按原始顺序排列的媒体列表
+            source: 消息来源 (telegram / discord)
+            auto_forwarded: 是否为机器人自动转发回来的消息
+            timestamp: 页脚显示的时间，None 表示发送时的当前时间
+        """
+        self.text = text
+        self.media = media or []
+        self.source = source
+        self.auto_forwarded = auto_forwarded
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_text(cls, text: Optional[str], media: Optional[List[MediaItem]] = None,
+                  source: str = SOURCE_TELEGRAM) -> "ForwardPayload":
+        """从收到的消息文本构建，识别并去除自动转发标记"""
+        text = text or ""
+        auto_forwarded = text.startswith(AUTO_FORWARD_TAG)
+        if auto_forwarded:
+            text = text[len(AUTO_FORWARD_TAG):].strip()
+        return cls(text, media, source, auto_forwarded)
+
+    @property
+    def photos(self) -> List[MediaItem]:
+        return [item for item in self.media if item.kind == "photo"]
+
+    @property
+    def attachments(self) -> List[MediaItem]:
+        """图片以外的媒体 (视频、文件)"""
+        return [item for item in self.media if item.kind != "photo"]
+
+    def stamp(self) -> "ForwardPayload":
+        """记录入队时间，保证重试时页脚时间不变"""
+        if self.timestamp is None:
+            self.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return self
+
+    def to_text(self) -> str:
+        """文本加媒体链接的纯文本形式"""
+        lines = [self.text] if self.text else []
+        lines.extend(item.link() for item in self.media)
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "text": self.text,
+            "media": [item.to_dict() for item in self.media],
+            "source": self.source,
+            "auto_forwarded": self.auto_forwarded,
+            "timestamp": self.timestamp,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ForwardPayload":
+        if "text" not in data:
+            # 旧版出站队列条目: {"message", "timestamp", "images"}，链接已包含在文本中
+            media = [MediaItem("photo", url) for url in data.get("images") or []]
+            return cls(data.get("message", ""), media, timestamp=data.get("timestamp"))
+        return cls(
+            data["text"],
+            [MediaItem.from_dict(item) for item in data.get("media") or []],
+            data.get("source", SOURCE_TELEGRAM),
+            data.get("auto_forwarded", False),
+            data.get("timestamp"),
+        )
+
+    def __repr__(self) -> str:
+        return f"ForwardPayload(source={self.source!r}, text={self.text[:30]!r}, media={len(self.media)})"
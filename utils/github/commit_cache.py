@@ -1,8 +1,8 @@
-import json
 import logging
-from pathlib import Path
 from typing import Dict, Optional, Set
 
+from utils.json_store import get_store
+
 logger = logging.getLogger(__name__)
 
 
@@ -10,47 +10,26 @@ class CommitCache:
     """GitHub 提交缓存管理器"""
     
     def __init__(self, cache_path: str):
-        self.cache_path = Path(cache_path)
-        self.cache: Dict[str, Dict[str, str]] = {}
-        self._ensure_cache_file()
-        self.load_cache()
+        self.store = get_store(cache_path)
+        logger.debug(f"已加载缓存，包含 {len(self.cache)} 个仓库")
     
-    def _ensure_cache_file(self):
-        """确保缓存文件和目录存在"""
-        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
-        if not self.cache_path.exists():
-            self.cache_path.write_text('{}', encoding='utf-8')
-            logger.info(f"创建新的缓存文件: {self.cache_path}")
+    @property
+    def cache(self) -> Dict[str, Dict[str, str]]:
+        """缓存字典，格式: {"repo_id": {"branch_name": "commit_sha"}}"""
+        return self.store.data
     
     def load_cache(self) -> Dict[str, Dict[str, str]]:
         """
-        从文件加载缓存
+        获取缓存 (启动时已由存储层加载到内存)
         
         Returns:
             缓存字典，格式: {"repo_id": {"branch_name": "commit_sha"}}
         """
-        try:
-            with open(self.cache_path, 'r', encoding='utf-8') as f:
-                self.cache = json.load(f)
-            logger.debug(f"已加载缓存，包含 {len(self.cache)} 个仓库")
-            return self.cache
-        except json.JSONDecodeError as e:
-            logger.error(f"解析缓存文件失败: {e}，将使用空缓存")
-            self.cache = {}
-            return self.cache
-        except Exception as e:
-            logger.error(f"加载缓存文件时出错: {e}")
-            self.cache = {}
-            return self.cache
+        return self.cache
     
     def save_cache(self):
-        """保存缓存到文件"""
-        try:
-            with open(self.cache_path, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, indent=2, ensure_ascii=False)
-            logger.debug(f"缓存已保存到 {self.cache_path}")
-        except Exception as e:
-            logger.error(f"保存缓存文件时出错: {e}")
+        """标记缓存需要保存，由存储层合并后原子写入文件"""
+        self.store.mark_dirty()
     
     def get_last_commit(self, repo_id: str, branch: str) -> Optional[str]:
         """
@@ -124,6 +103,6 @@ class CommitCache:
     
     def clear_all(self):
         """清除所有缓存"""
-        self.cache = {}
+        self.cache.clear()
         self.save_cache()
         logger.info("已清除所有缓存")
\ No newline at end of file
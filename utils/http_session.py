@@ -0,0 +1,31 @@
+"""共享 aiohttp 会话
+
+为需要长连接的组件 (Webhook 发送、媒体下载等) 提供进程内唯一的 ClientSession，
+避免每次请求都重新建立连接。
+"""
+import logging
+from typing import Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """获取共享的 aiohttp 会话，不存在或已关闭时自动创建"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession()
+        logger.debug("已创建共享 aiohttp 会话")
+    return _session
+
+
+async def close_session():
+    """关闭共享的 aiohttp 会话"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.debug("已关闭共享 aiohttp 会话")
+    _session = None
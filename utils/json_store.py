@@ -0,0 +1,185 @@
+"""统一的JSON状态存储
+
+状态常驻内存，修改在事件循环中进行并由每个存储独立的 asyncio.Lock 串行化；
+修改后只标记为脏数据，短暂延迟后合并为一次落盘 (write-behind)。
+落盘在线程中执行：先写入同目录下的临时文件并 fsync，再通过 os.replace 原子替换，
+写入过程中崩溃只会留下临时文件，原文件始终完整。
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_DELAY = config.JSON_STORE_FLUSH_DELAY
+# 写入失败后重试的最大间隔(秒)
+MAX_RETRY_DELAY = 60.0
+
+
+def atomic_write_json(path: Path, text: str):
+    """原子地写入JSON文本 (临时文件 + fsync + os.replace)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonStore:
+    """单个JSON文件的内存状态与延迟落盘"""
+
+    def __init__(self, path: str, default: Callable[[], Any] = dict, flush_delay: float = DEFAULT_FLUSH_DELAY):
+        """
+        参数:
+            path: JSON文件路径
+            default: 文件不存在或无法解析时的初始值工厂 (dict / list)
+            flush_delay: 修改后延迟落盘的时间(秒)，期间的多次修改合并为一次写入
+        """
+        self.path = Path(path)
+        self.default = default
+        self.flush_delay = flush_delay
+        self.lock = asyncio.Lock()
+        self._write_lock = threading.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._dirty = False
+        # 快照序号，避免较早的快照在较新的快照之后写入
+        self._seq = 0
+        self._written_seq = 0
+        self.data = self._load()
+
+    # --- 加载与迁移 ---
+
+    def _load(self) -> Any:
+        """加载现有文件；无法解析的旧文件 (非原子写入时代的残留) 会被移到一旁并从默认值开始"""
+        # 上次写入中断留下的临时文件不可信，直接丢弃
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        if tmp_path.exists():
+            logger.warning(f"发现未完成的写入 {tmp_path}，已丢弃")
+            tmp_path.unlink()
+
+        if not self.path.exists():
+            return self.default()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            corrupt_path = self.path.with_name(f"{self.path.name}.corrupt-{int(time.time())}")
+            os.replace(self.path, corrupt_path)
+            logger.error(f"JSON 文件 {self.path} 已损坏 ({e})，已移至 {corrupt_path}，使用空数据")
+            return self.default()
+        except IOError as e:
+            logger.error(f"读取 JSON 文件 {self.path} 失败: {e}")
+            return self.default()
+
+        expected = type(self.default())
+        if not isinstance(data, expected):
+            logger.error(f"JSON 文件 {self.path} 的格式不是 {expected.__name__}，使用空数据")
+            return self.default()
+        return data
+
+    # --- 修改 ---
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        串行化的读-改-写，退出时标记为脏数据
+
+        用法:
+            async with store.transaction() as data:
+                data[key] = value
+        """
+        async with self.lock:
+            yield self.data
+            self.mark_dirty()
+
+    def mark_dirty(self):
+        """标记需要落盘；有事件循环时延迟合并写入，否则立即同步写入"""
+        self._dirty = True
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_now()
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    # --- 落盘 ---
+
+    def _snapshot(self) -> Tuple[int, str]:
+        self._dirty = False
+        self._seq += 1
+        return self._seq, json.dumps(self.data, ensure_ascii=False)
+
+    def _write(self, seq: int, text: str):
+        with self._write_lock:
+            if seq < self._written_seq:
+                return  # 已有更新的快照写入
+            atomic_write_json(self.path, text)
+            self._written_seq = seq
+
+    def _write_now(self):
+        try:
+            self._write(*self._snapshot())
+        except (IOError, OSError) as e:
+            self._dirty = True
+            logger.error(f"写入 JSON 文件 {self.path} 失败: {e}")
+
+    async def _flush_later(self):
+        # 写入期间产生的新修改和写入失败都由同一个任务继续处理，失败时按指数退避重试
+        delay = self.flush_delay
+        while self._dirty:
+            await asyncio.sleep(delay)
+            if await self.flush():
+                delay = self.flush_delay
+            else:
+                delay = min(MAX_RETRY_DELAY, max(delay, 1.0) * 2)
+
+    async def flush(self) -> bool:
+        """立即落盘 (没有未保存的修改时跳过)，返回数据是否已全部写入文件"""
+        if not self._dirty:
+            return True
+        # 在事件循环中序列化，保证快照不会与修改交错
+        seq, text = self._snapshot()
+        try:
+            await asyncio.to_thread(self._write, seq, text)
+            logger.debug(f"已保存 {self.path}")
+            return True
+        except (IOError, OSError) as e:
+            self._dirty = True
+            logger.error(f"写入 JSON 文件 {self.path} 失败: {e}")
+            return False
+
+    async def close(self):
+        """取消延迟任务并写入剩余的修改"""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+
+
+_stores: Dict[Path, JsonStore] = {}
+
+
+def get_store(path: str, default: Callable[[], Any] = dict, flush_delay: float = DEFAULT_FLUSH_DELAY) -> JsonStore:
+    """获取路径对应的存储，同一文件在进程内只有一个实例"""
+    key = Path(path).resolve()
+    store = _stores.get(key)
+    if store is None:
+        store = JsonStore(path, default, flush_delay)
+        _stores[key] = store
+    return store
+
+
+async def close_all():
+    """关闭时写入所有存储的剩余修改"""
+    for store in list(_stores.values()):
+        await store.close()
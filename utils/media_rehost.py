@@ -0,0 +1,291 @@
+"""Telegram 媒体流式转存
+
+将 Telegram 文件下载流经有界的分块缓冲直接接入 Discord 的 multipart 上传，
+整个文件不会写入磁盘，也不会完整驻留内存。超过 Discord 上传限制的文件保持链接形式。
+
+aiohttp 在线程池中同步读取上传的文件对象，因此缓冲区使用线程安全的 queue.Queue：
+下载协程写入分块，上传线程读取分块。缓冲区满时下载协程在事件循环中等待读取端的通知 (背压)，
+不占用线程池线程，否则多个文件同时等待会耗尽默认线程池，上传线程反而无法读取。
+
+同一条消息发往多个频道时只在第一个频道下载并上传一次，其余频道通过 RehostCache
+引用第一次上传得到的 Discord CDN 链接。
+"""
+import io
+import queue
+import asyncio
+import logging
+import time
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+import discord
+
+import config
+from utils.http_session import get_session
+from utils.forward_payload import MediaItem
+
+logger = logging.getLogger(__name__)
+
+# Discord 单条消息最多携带 10 个附件
+MAX_ATTACHMENTS = 10
+_DEFAULT_NAMES = {"photo": "photo.jpg", "video": "video.mp4", "document": "file"}
+# 转存得到的 Discord CDN 链接的复用时间(秒)，CDN 链接带签名，不宜长期使用
+REHOST_URL_TTL = 3600
+
+
+class MediaTooLarge(Exception):
+    """文件超过上传限制"""
+
+
+class StreamingBuffer(io.RawIOBase):
+    """有界分块缓冲，只能顺序读取"""
+
+    def __init__(self, max_chunks: int, timeout: float):
+        super().__init__()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_chunks))
+        self._timeout = timeout
+        self._current = b""
+        self._position = 0
+        self._eof = False
+        self._aborted = threading.Event()
+        # 读取端取走分块或关闭时通过 call_soon_threadsafe 唤醒等待中的写入端
+        self._loop = asyncio.get_running_loop()
+        self._space = asyncio.Event()
+
+    # --- 读取端 (上传线程) ---
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        # discord.File 要求文件对象可定位，这里只支持定位到当前位置 (即不移动)
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if (whence == io.SEEK_SET and offset == self._position) or (whence == io.SEEK_CUR and offset == 0):
+            return self._position
+        raise io.UnsupportedOperation("流式缓冲不支持回退")
+
+    def _fill(self):
+        while not self._current and not self._eof:
+            try:
+                item = self._queue.get(timeout=self._timeout)
+            except queue.Empty:
+                raise TimeoutError("等待 Telegram 文件数据超时") from None
+            self._notify()
+            if item is None:
+                self._eof = True
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                self._current = item
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            parts = []
+            while True:
+                chunk = self.read(1 << 16)
+                if not chunk:
+                    return b"".join(parts)
+                parts.append(chunk)
+        self._fill()
+        chunk, self._current = self._current[:size], self._current[size:]
+        self._position += len(chunk)
+        return chunk
+
+    def readinto(self, buffer) -> int:
+        chunk = self.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    def close(self):
+        self._aborted.set()
+        self._notify()
+        super().close()
+
+    def _notify(self):
+        try:
+            self._loop.call_soon_threadsafe(self._space.set)
+        except RuntimeError:
+            pass  # 事件循环已关闭
+
+    # --- 写入端 (下载协程) ---
+
+    async def put(self, item) -> bool:
+        """写入一个分块 (None 表示结束，异常表示下载失败)，读取端已关闭时返回 False"""
+        while not self._aborted.is_set():
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                # 先清除再检查，清除之后读取端取走分块发出的通知不会丢失
+                self._space.clear()
+                if self._queue.full() and not self._aborted.is_set():
+                    await self._space.wait()
+        return False
+
+
+def upload_limit(channel) -> int:
+    """频道允许的单条消息上传总大小"""
+    limit = config.TG_REHOST_MAX_BYTES
+    guild = getattr(channel, "guild", None)
+    if guild is not None:
+        limit = min(limit, guild.filesize_limit)
+    return limit
+
+
+async def _pump(response: aiohttp.ClientResponse, buffer: StreamingBuffer, limit: int):
+    """将下载响应逐块写入缓冲区，超过 limit (为该文件预留的字节数) 时中止"""
+    received = 0
+    try:
+        async for chunk in response.content.iter_chunked(config.TG_REHOST_CHUNK_SIZE):
+            received += len(chunk)
+            if received > limit:
+                raise MediaTooLarge(f"文件超过上传限制 {limit} 字节")
+            if not await buffer.put(chunk):
+                return
+        await buffer.put(None)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await buffer.put(e)
+    finally:
+        response.release()
+
+
+class MediaUpload:
+    """一条消息中需要流式转存的全部媒体
+
+    用法:
+        async with MediaUpload(channel, items) as upload:
+            await channel.send(..., files=upload.files)
+    """
+
+    def __init__(self, channel, items: List[MediaItem]):
+        self.channel = channel
+        self.items = items
+        self.files: List[discord.File] = []
+        # 已转存的媒体 {原始链接: attachment://文件名}，以及与 files 顺序一致的媒体列表
+        self.uploaded: Dict[str, str] = {}
+        self.uploaded_items: List[MediaItem] = []
+        self._buffers: List[StreamingBuffer] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def _filename(self, index: int, item: MediaItem) -> str:
+        if item.kind == "photo":
+            # 图片通过 attachment:// 在Embed中引用，使用固定的 ASCII 文件名
+            return f"photo_{index}.jpg"
+        name = item.name or _DEFAULT_NAMES.get(item.kind, "file")
+        return f"{index}_{name}"
+
+    async def __aenter__(self) -> "MediaUpload":
+        limit = upload_limit(self.channel)
+        session = await get_session()
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=config.TG_REHOST_READ_TIMEOUT)
+        total = 0
+        for index, item in enumerate(self.items[:MAX_ATTACHMENTS]):
+            size = item.size or 0
+            if total + size > limit:
+                logger.info(f"{item.kind} 大小 {size} 超过频道 {self.channel.id} 的上传限制，保持链接形式")
+                continue
+            try:
+                response = await session.get(item.url, timeout=timeout)
+                response.raise_for_status()
+            except Exception as e:
+                logger.warning(f"下载 Telegram 媒体失败，保持链接形式: {e}")
+                continue
+            length = response.content_length or size
+            if not length:
+                # 大小未知的文件无法预留上传额度，多个这样的文件合计可能超过上传限制
+                response.release()
+                logger.info(f"{item.kind} 大小未知，保持链接形式")
+                continue
+            if total + length > limit:
+                response.release()
+                logger.info(f"{item.kind} 大小 {length} 超过频道 {self.channel.id} 的上传限制，保持链接形式")
+                continue
+
+            buffer = StreamingBuffer(config.TG_REHOST_BUFFER_CHUNKS, config.TG_REHOST_READ_TIMEOUT)
+            self._buffers.append(buffer)
+            # 每个文件只能使用为它预留的额度，所有文件合计不会超过上传限制
+            self._tasks.append(asyncio.create_task(_pump(response, buffer, length)))
+            total += length
+
+            filename = self._filename(index, item)
+            self.files.append(discord.File(buffer, filename=filename))
+            self.uploaded[item.url] = f"attachment://{filename}"
+            self.uploaded_items.append(item)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        for buffer in self._buffers:
+            buffer.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+
+class RehostCache:
+    """已转存媒体 -> Discord CDN 链接，同一媒体发往多个频道时只下载、上传一次"""
+
+    def __init__(self, ttl: float = REHOST_URL_TTL, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        # 媒体组合 -> (锁, 使用者数量)，同一组媒体同一时间只有一个频道在转存
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self._entries[key]
+            return None
+        return entry[0]
+
+    def put(self, key: str, url: str):
+        self._entries[key] = (url, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    @asynccontextmanager
+    async def claim(self, items: List[MediaItem]):
+        """独占转存这组媒体，其他频道等待第一次转存完成后直接使用其链接"""
+        key = "|".join(sorted(item.key for item in items))
+        lock, users = self._locks.get(key, (asyncio.Lock(), 0))
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users <= 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+    def apply(self, items: List[MediaItem]) -> List[MediaItem]:
+        """将已转存过的媒体替换为指向 Discord CDN 的副本"""
+        media = []
+        for item in items:
+            url = self.get(item.key)
+            media.append(item if url is None else MediaItem(item.kind, url, item.name, item.size))
+        return media
+
+    def record(self, upload: MediaUpload, message):
+        """记录一次转存上传得到的附件链接 (附件顺序与 upload.files 一致)"""
+        for item, attachment in zip(upload.uploaded_items, getattr(message, "attachments", None) or []):
+            self.put(item.key, attachment.url)
+
+
+# 全局缓存，出站队列的多个频道条目共用
+rehost_cache = RehostCache()
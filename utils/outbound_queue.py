@@ -0,0 +1,260 @@
+"""持久化出站消息队列
+
+消息按目标频道拆分为独立条目写入 SQLite，由后台工作协程投递：
+- 同一频道严格按入队顺序投递 (只有队首条目可被领取)
+- 失败后按指数退避重试，超过最大次数或遇到永久性错误时转入死信
+- 进程重启后未完成的条目会被重新投递 (至少一次)
+- 死信保留 dead_retention 秒后自动清理
+数据库操作通过 asyncio.to_thread 在线程中执行，不阻塞事件循环。
+"""
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 清理过期死信的间隔(秒)
+PRUNE_INTERVAL = 3600
+
+
+class PermanentDeliveryError(Exception):
+    """不可重试的投递错误，条目将直接转入死信"""
+
+
+class OutboundQueue:
+    """基于 SQLite 的持久化出站队列"""
+
+    def __init__(
+        self,
+        db_path: str,
+        deliver: Callable[[int, Dict[str, Any]], Awaitable[Any]],
+        workers: int = 4,
+        max_attempts: int = 8,
+        base_delay: float = 2.0,
+        max_delay: float = 300.0,
+        dead_retention: float = 7 * 86400,
+    ):
+        """
+        参数:
+            db_path: SQLite 数据库路径
+            deliver: 投递函数，接收 (channel_id, payload)，失败时抛出异常
+            workers: 并发投递的工作协程数量
+            max_attempts: 最大投递次数，超过后转入死信
+            base_delay: 指数退避的基础延迟(秒)
+            max_delay: 单次退避的最大延迟(秒)
+            dead_retention: 死信的保留时间(秒)
+        """
+        self.db_path = Path(db_path)
+        self.deliver = deliver
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.dead_retention = dead_retention
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._wake = asyncio.Event()
+        self._jobs: "asyncio.Queue[tuple]" = asyncio.Queue()
+        self._busy_channels: Set[int] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._last_prune: Optional[float] = None
+
+    # --- 数据库操作 (在线程中执行) ---
+
+    def _open(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbound (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel_id INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_outbound_channel ON outbound(status, channel_id, id)")
+        self._conn = conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _insert(self, channel_ids: List[int], payload: str) -> int:
+        now = time.time()
+        with self._db_lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT INTO outbound (channel_id, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+                    [(channel_id, payload, now, now) for channel_id in channel_ids]
+                )
+        return len(channel_ids)
+
+    def _claim_ready(self, exclude: Set[int], limit: int) -> Tuple[list, Optional[float]]:
+        """
+        获取各频道已到期的队首条目
+
+        返回:
+            tuple: (领取的条目, 其余空闲频道中最早的队首到期还需等待的秒数，没有时为 None)
+        """
+        now = time.time()
+        heads = self._execute(
+            """
+            SELECT id, channel_id, payload, attempts, next_attempt_at FROM outbound AS o
+            WHERE status = 'pending'
+              AND id = (SELECT MIN(id) FROM outbound WHERE channel_id = o.channel_id AND status = 'pending')
+            ORDER BY id
+            """
+        )
+        # 正在投递的频道和排在退避条目之后的条目不参与计算，否则调度会空转
+        heads = [row for row in heads if row[1] not in exclude]
+        ready = [row[:4] for row in heads if row[4] <= now][:limit]
+        waiting = [row[4] for row in heads if row[4] > now]
+        next_due_in = max(0.0, min(waiting) - now) if waiting else None
+        return ready, next_due_in
+
+    def _prune_dead(self) -> int:
+        """删除超过保留时间的死信 (死信的 next_attempt_at 记录转入死信的时间)"""
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "DELETE FROM outbound WHERE status = 'dead' AND next_attempt_at < ?",
+                (time.time() - self.dead_retention,)
+            )
+            return cursor.rowcount
+
+    # --- 公共接口 ---
+
+    async def start(self):
+        """打开数据库并启动调度与工作协程"""
+        if self._tasks:
+            return
+        await asyncio.to_thread(self._open)
+        pending = await asyncio.to_thread(
+            self._execute, "SELECT COUNT(*) FROM outbound WHERE status = 'pending'"
+        )
+        if pending and pending[0][0]:
+            logger.info(f"出站队列恢复了 {pending[0][0]} 条未投递的消息")
+        self._tasks.append(asyncio.create_task(self._dispatch_loop()))
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker_loop()))
+        logger.info(f"出站队列已启动: {self.db_path} (工作协程 {self.workers} 个)")
+
+    async def stop(self):
+        """停止所有协程并关闭数据库，未完成的条目保留在库中待下次启动投递"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self._conn is not None:
+            with self._db_lock:
+                self._conn.close()
+            self._conn = None
+        logger.info("出站队列已停止")
+
+    async def enqueue(self, channel_ids: Iterable[int], payload: Dict[str, Any]) -> int:
+        """
+        将消息按频道拆分入队
+
+        参数:
+            channel_ids: 目标频道ID列表
+            payload: 可JSON序列化的消息内容
+
+        返回:
+            int: 入队的条目数量
+        """
+        channel_ids = list(channel_ids)
+        if not channel_ids:
+            return 0
+        count = await asyncio.to_thread(self._insert, channel_ids, json.dumps(payload, ensure_ascii=False))
+        self._wake.set()
+        return count
+
+    async def stats(self) -> Dict[str, int]:
+        """各状态的条目数量"""
+        rows = await asyncio.to_thread(self._execute, "SELECT status, COUNT(*) FROM outbound GROUP BY status")
+        return {status: count for status, count in rows}
+
+    # --- 调度与投递 ---
+
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                # 先清除再查询，查询期间工作协程发出的唤醒不会丢失
+                self._wake.clear()
+                timeout = None
+                free = self.workers - len(self._busy_channels)
+                if free > 0:
+                    rows, timeout = await asyncio.to_thread(self._claim_ready, set(self._busy_channels), free)
+                    for row in rows:
+                        self._busy_channels.add(row[1])
+                        self._jobs.put_nowait(row)
+
+                if self._last_prune is None or time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+                    self._last_prune = time.monotonic()
+                    pruned = await asyncio.to_thread(self._prune_dead)
+                    if pruned:
+                        logger.info(f"出站队列已清理 {pruned} 条过期死信")
+
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=min(timeout, 30.0) if timeout is not None else 30.0)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"出站队列调度出错: {e}")
+                await asyncio.sleep(5)
+
+    async def _worker_loop(self):
+        while True:
+            row_id, channel_id, payload, attempts = await self._jobs.get()
+            try:
+                await self._process(row_id, channel_id, json.loads(payload), attempts)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"处理出站条目 {row_id} 时出错: {e}")
+            finally:
+                self._busy_channels.discard(channel_id)
+                self._wake.set()
+
+    async def _process(self, row_id: int, channel_id: int, payload: Dict[str, Any], attempts: int):
+        try:
+            await self.deliver(channel_id, payload)
+        except Exception as e:
+            attempts += 1
+            if isinstance(e, PermanentDeliveryError) or attempts >= self.max_attempts:
+                await asyncio.to_thread(
+                    self._execute,
+                    "UPDATE outbound SET status = 'dead', attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    (attempts, time.time(), str(e)[:500], row_id)
+                )
+                logger.error(f"出站条目 {row_id} (频道 {channel_id}) 投递失败 {attempts} 次，已转入死信: {e}")
+                return
+            delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+            delay *= random.uniform(0.8, 1.2)
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE outbound SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, str(e)[:500], row_id)
+            )
+            logger.warning(f"出站条目 {row_id} (频道 {channel_id}) 投递失败，{delay:.1f}s 后第 {attempts + 1} 次重试: {e}")
+            return
+
+        await asyncio.to_thread(self._execute, "DELETE FROM outbound WHERE id = ?", (row_id,))
+        logger.debug(f"出站条目 {row_id} 已投递到频道 {channel_id}")
@@ -0,0 +1,99 @@
+"""转发路由索引
+
+在机器人就绪时根据已连接频道和 SPECIAL_CHANNELS 预先计算各 forward_mode 的目标频道ID集合，
+频道事件到达时增量更新，避免每次命令都重新解析配置和扫描频道。
+每个模式同时保存有序元组 (按配置顺序发送) 和集合 (用于成员判断与集合运算)。
+"""
+import logging
+from typing import Dict, FrozenSet, Iterable, Tuple, Union
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+def parse_special_channels(special_channels: Union[Iterable[int], str, None]) -> Tuple[int, ...]:
+    """解析特殊频道配置，兼容列表与逗号分隔字符串两种形式，按配置顺序去重"""
+    if not special_channels:
+        return ()
+    if isinstance(special_channels, str):
+        special_channels = [id_str.strip() for id_str in special_channels.split(',') if id_str.strip()]
+    return tuple(dict.fromkeys(int(channel_id) for channel_id in special_channels))
+
+
+class RoutingIndex:
+    """转发路由索引
+
+    forward_mode:
+        0: 不转发到特殊频道 (所有文本频道 - 特殊频道)
+        1: 转发到所有文本频道
+        2: 只转发到特殊频道
+    """
+
+    def __init__(self, special_channels: Union[Iterable[int], str, None]):
+        self.special_order: Tuple[int, ...] = parse_special_channels(special_channels)
+        self.special_ids: FrozenSet[int] = frozenset(self.special_order)
+        # 按连接顺序保存的文本频道ID (dict 保持插入顺序)
+        self._text_ids: Dict[int, None] = {}
+        self._order_by_mode: Dict[int, Tuple[int, ...]] = {}
+        self._by_mode: Dict[int, FrozenSet[int]] = {}
+        self.forward_special_ids: Tuple[int, ...] = ()
+        self._rebuild()
+
+    @classmethod
+    def build(cls, channels: dict, special_channels) -> "RoutingIndex":
+        """根据 {channel_id: channel_object} 构建索引"""
+        index = cls(special_channels)
+        index._text_ids = {
+            channel_id: None for channel_id, channel in channels.items()
+            if isinstance(channel, (discord.TextChannel, discord.Thread))
+        }
+        index._rebuild()
+        logger.info(
+            f"路由索引已构建: {len(index._text_ids)} 个文本频道, {len(index.special_ids)} 个特殊频道"
+        )
+        return index
+
+    def _rebuild(self):
+        all_order = tuple(self._text_ids)
+        self._order_by_mode = {
+            0: tuple(channel_id for channel_id in all_order if channel_id not in self.special_ids),
+            1: all_order,
+            2: self.special_order,
+        }
+        self._by_mode = {mode: frozenset(order) for mode, order in self._order_by_mode.items()}
+        # 已连接的特殊频道 (按特殊频道的配置顺序)，用于 Telegram 转发的默认目标
+        self.forward_special_ids = tuple(
+            channel_id for channel_id in self.special_order if channel_id in self._text_ids
+        )
+
+    @property
+    def all_ids(self) -> FrozenSet[int]:
+        """所有已连接的文本频道ID"""
+        return self._by_mode[1]
+
+    def base_ids(self, forward_mode: int) -> FrozenSet[int]:
+        """获取指定转发模式的基础频道ID集合，未知模式按只转发到特殊频道处理 (与原逻辑一致)"""
+        return self._by_mode.get(forward_mode, self._by_mode[2])
+
+    def base_order(self, forward_mode: int) -> Tuple[int, ...]:
+        """获取指定转发模式的基础频道ID，按配置顺序排列"""
+        return self._order_by_mode.get(forward_mode, self._order_by_mode[2])
+
+    def add_channel(self, channel):
+        """新增或更新频道，非文本频道会被移出索引"""
+        if isinstance(channel, (discord.TextChannel, discord.Thread)):
+            if channel.id in self._text_ids:
+                return
+            self._text_ids[channel.id] = None
+        elif channel.id in self._text_ids:
+            del self._text_ids[channel.id]
+        else:
+            return
+        self._rebuild()
+
+    def remove_channel(self, channel_id: int):
+        """从索引中移除频道"""
+        if channel_id in self._text_ids:
+            del self._text_ids[channel_id]
+            self._rebuild()
@@ -0,0 +1,58 @@
+"""Telegram file_id 复用缓存
+
+本地图片首次上传后，以文件内容的 SHA-256 为键保存 Telegram 返回的 file_id，
+之后发送相同内容的图片时直接使用 file_id，不再重新上传文件。
+缓存经由 JsonStore 持久化，超过容量时淘汰最久未使用的条目。
+"""
+import time
+import hashlib
+import logging
+from typing import Dict, Optional
+
+from utils.json_store import get_store
+
+logger = logging.getLogger(__name__)
+
+
+class FileIdCache:
+    """内容哈希 → Telegram file_id 的持久化缓存"""
+
+    def __init__(self, data_path: str, max_entries: int = 1000):
+        # {sha256: {"file_id", "last_used"}}
+        self.store = get_store(data_path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _entries(self) -> Dict[str, Dict]:
+        return self.store.data
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    # --- 查询与更新 ---
+
+    def get(self, digest: str) -> Optional[str]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        # 使用时间只影响淘汰顺序，不单独触发写入
+        entry["last_used"] = time.time()
+        self.hits += 1
+        return entry["file_id"]
+
+    def put(self, digest: str, file_id: str):
+        self._entries[digest] = {"file_id": file_id, "last_used": time.time()}
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            for key, _ in sorted(self._entries.items(), key=lambda item: item[1]["last_used"])[:overflow]:
+                del self._entries[key]
+        self.store.mark_dirty()
+
+    def invalidate(self, digest: str):
+        """Telegram 不再接受该 file_id 时删除"""
+        if self._entries.pop(digest, None) is not None:
+            self.store.mark_dirty()
@@ -0,0 +1,143 @@
+"""Telegram 媒体解析工具
+
+将消息中的图片/文件/视频并发解析为下载链接，并以 file_unique_id 为键缓存结果，
+避免同一文件被再次转发时重复请求 Bot API。Telegram 保证 file_path 至少 1 小时有效。
+"""
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import config
+from utils.forward_payload import MediaItem
+
+logger = logging.getLogger(__name__)
+
+
+class FileUrlCache:
+    """file_unique_id → 下载链接的 TTL 缓存 (超出容量时淘汰最久未使用的条目)"""
+
+    def __init__(self, ttl: float, max_size: int = 2048):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, unique_id: str) -> Optional[str]:
+        entry = self._entries.get(unique_id)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._entries[unique_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(unique_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, unique_id: str, url: str):
+        self._entries[unique_id] = (url, time.monotonic() + self.ttl)
+        self._entries.move_to_end(unique_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+# 全局缓存
+file_url_cache = FileUrlCache(ttl=config.TG_FILE_URL_TTL)
+# 正在解析中的请求，避免同一文件被并发重复解析
+_inflight: Dict[str, "asyncio.Future[str]"] = {}
+
+
+async def resolve_file_url(bot, media) -> str:
+    """
+    获取媒体的下载链接，优先使用缓存
+
+    参数:
+        bot: telegram.Bot 实例
+        media: PhotoSize / Document / Video 等带有 file_id 和 file_unique_id 的对象
+    """
+    unique_id = media.file_unique_id
+    cached = file_url_cache.get(unique_id)
+    if cached:
+        return cached
+
+    inflight = _inflight.get(unique_id)
+    if inflight:
+        try:
+            return await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            if not inflight.cancelled():
+                raise
+            # 负责解析的任务被取消，由当前任务重新解析
+            return await resolve_file_url(bot, media)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[unique_id] = future
+    try:
+        file = await bot.get_file(media.file_id)
+        file_url_cache.put(unique_id, file.file_path)
+        future.set_result(file.file_path)
+        return file.file_path
+    except Exception as e:
+        future.set_exception(e)
+        # 没有其他等待者时避免 "exception was never retrieved" 警告
+        future.exception()
+        raise
+    finally:
+        # 解析任务本身被取消时 (CancelledError 不被 except Exception 捕获) 也要结束 Future，否则等待者会永远挂起
+        if not future.done():
+            future.cancel()
+        _inflight.pop(unique_id, None)
+
+
+def collect_media(message) -> List[Tuple[str, object]]:
+    """按 图片 → 文件 → 视频 的顺序收集消息中的媒体 [(类型, 媒体对象)]"""
+    items = []
+    if message.photo:
+        items.append(("photo", message.photo[-1]))
+    if message.document:
+        items.append(("document", message.document))
+    if message.video:
+        items.append(("video", message.video))
+    return items
+
+
+async def resolve_media(bot, messages) -> List[MediaItem]:
+    """
+    并发解析一条或多条消息中的全部媒体
+
+    返回:
+        MediaItem 列表，顺序与消息及 collect_media 的顺序一致；
+        无法获取链接的媒体 (例如超过 20MB 的文件) 会被跳过，不影响同一消息中的其他媒体
+    """
+    items = [item for message in messages for item in collect_media(message)]
+    if not items:
+        return []
+    urls = await asyncio.gather(*(resolve_file_url(bot, media) for _, media in items), return_exceptions=True)
+    media_items = []
+    for (kind, media), url in zip(items, urls):
+        if isinstance(url, BaseException):
+            logger.warning(f"获取 Telegram {kind} 的下载链接失败，已跳过: {url}")
+            continue
+        media_items.append(MediaItem(kind, url, getattr(media, "file_name", None), getattr(media, "file_size", None),
+                                     media.file_id, media.file_unique_id))
+    return media_items
+
+
+async def refresh_media_urls(bot, items: List[MediaItem]):
+    """
+    发送前为带有 file_id 的媒体重新获取下载链接 (优先使用缓存)
+
+    出站队列中的条目可能在链接过期后才重试，因此链接不随条目保存，在投递时解析；
+    获取失败的媒体链接置为 None，由调用方跳过
+    """
+    items = [item for item in items if item.file_id]
+    if not items:
+        return
+    urls = await asyncio.gather(*(resolve_file_url(bot, item) for item in items), return_exceptions=True)
+    for item, url in zip(items, urls):
+        if isinstance(url, BaseException):
+            logger.warning(f"获取 Telegram {item.kind} 的下载链接失败，已跳过: {url}")
+            url = None
+        item.url = url
@@ -0,0 +1,249 @@
+"""Telegram 出站发送调度
+
+所有发往 Telegram 的消息经由此处排队：
+- 每个会话一个令牌桶，限制发送速率，遇到 RetryAfter 时暂停该会话并重新排队
+- 队列积压时，将连续的纯文本消息合并为一条 (不超过 4096 字符)
+- 调用方得到一个 Future，可等待实际的发送结果
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Union
+
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+from utils.telegram_file_cache import FileIdCache
+
+logger = logging.getLogger(__name__)
+
+# Telegram 单条消息文本长度上限
+MAX_MESSAGE_LENGTH = 4096
+MERGE_SEPARATOR = "\n\n"
+
+
+class TokenBucket:
+    """令牌桶限速器"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """服务端要求等待时清空令牌并暂停"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        """等待直到获得一个令牌"""
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class OutboxItem:
+    """一条待发送的消息"""
+
+    __slots__ = ("kind", "text", "photo", "future")
+
+    def __init__(self, kind: str, text: Optional[str], photo=None):
+        self.kind = kind  # text / photo
+        self.text = text
+        self.photo = photo
+        self.future: "asyncio.Future" = asyncio.get_running_loop().create_future()
+
+
+class TelegramOutbox:
+    """按会话限速、合并文本的 Telegram 发送队列"""
+
+    def __init__(self, bot: Bot, rate: float = 1.0, burst: float = 3, max_retries: int = 3,
+                 file_cache: Optional[FileIdCache] = None):
+        """
+        参数:
+            bot: telegram.Bot 实例
+            rate: 每个会话每秒允许发送的消息数
+            burst: 令牌桶容量 (允许的突发数量)
+            max_retries: 网络错误时的最大重试次数 (RetryAfter 不计入)
+            file_cache: 本地图片的 file_id 缓存，None 表示每次都上传
+        """
+        self.bot = bot
+        self.file_cache = file_cache
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self._queues: Dict[Union[int, str], Deque[OutboxItem]] = {}
+        self._buckets: Dict[Union[int, str], TokenBucket] = {}
+        self._workers: Dict[Union[int, str], asyncio.Task] = {}
+        self.sent = 0
+        self.merged = 0
+        self.failed = 0
+        self.retry_after = 0
+
+    # --- 提交 ---
+
+    def submit_text(self, chat_id: Union[int, str], text: str) -> "asyncio.Future":
+        """提交一条文本消息，返回发送结果的 Future"""
+        return self._submit(chat_id, OutboxItem("text", text))
+
+    def submit_photo(self, chat_id: Union[int, str], photo: Union[str, Path], caption: Optional[str] = None) -> "asyncio.Future":
+        """提交一张图片 (URL 或本地路径，本地文件在发送时才读取)，返回发送结果的 Future"""
+        return self._submit(chat_id, OutboxItem("photo", caption, photo))
+
+    def _submit(self, chat_id, item: OutboxItem) -> "asyncio.Future":
+        self._queues.setdefault(chat_id, deque()).append(item)
+        worker = self._workers.get(chat_id)
+        if worker is None or worker.done():
+            self._workers[chat_id] = asyncio.create_task(self._worker(chat_id))
+        return item.future
+
+    # --- 指标 ---
+
+    def depth(self, chat_id: Union[int, str] = None) -> int:
+        """排队中的消息数量，不指定会话时返回总数"""
+        if chat_id is not None:
+            return len(self._queues.get(chat_id, ()))
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.depth(),
+            "sent": self.sent,
+            "merged": self.merged,
+            "failed": self.failed,
+            "retry_after": self.retry_after,
+        }
+
+    # --- 发送 ---
+
+    def _take_batch(self, queue: Deque[OutboxItem]) -> List[OutboxItem]:
+        """取出队首消息；积压时将后续连续的纯文本消息合并进来"""
+        batch = [queue.popleft()]
+        if batch[0].kind != "text":
+            return batch
+        length = len(batch[0].text)
+        while queue and queue[0].kind == "text":
+            extra = len(MERGE_SEPARATOR) + len(queue[0].text)
+            if length + extra > MAX_MESSAGE_LENGTH:
+                break
+            length += extra
+            batch.append(queue.popleft())
+        return batch
+
+    async def _send(self, chat_id, batch: List[OutboxItem]):
+        head = batch[0]
+        if head.kind == "photo":
+            if isinstance(head.photo, Path):
+                return await self._send_local_photo(chat_id, head.photo, head.text)
+            return await self.bot.send_photo(chat_id=chat_id, photo=head.photo, caption=head.text)
+        text = MERGE_SEPARATOR.join(item.text for item in batch)
+        return await self.bot.send_message(chat_id=chat_id, text=text)
+
+    async def _send_local_photo(self, chat_id, path: Path, caption: Optional[str]):
+        """发送本地图片，相同内容已上传过时直接使用缓存的 file_id"""
+        data = await asyncio.to_thread(path.read_bytes)
+        if self.file_cache is None:
+            return await self.bot.send_photo(chat_id=chat_id, photo=data, caption=caption)
+
+        digest = FileIdCache.digest(data)
+        file_id = self.file_cache.get(digest)
+        if file_id:
+            try:
+                return await self.bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+            except BadRequest as e:
+                logger.warning(f"缓存的 file_id 已失效，重新上传 {path.name}: {e}")
+                self.file_cache.invalidate(digest)
+
+        message = await self.bot.send_photo(chat_id=chat_id, photo=data, caption=caption)
+        if message.photo:
+            self.file_cache.put(digest, message.photo[-1].file_id)
+        return message
+
+    async def _worker(self, chat_id):
+        queue = self._queues[chat_id]
+        bucket = self._buckets.setdefault(chat_id, TokenBucket(self.rate, self.burst))
+        while queue:
+            await bucket.acquire()
+            if not queue:
+                break
+            batch = self._take_batch(queue)
+            batch = [item for item in batch if not item.future.cancelled()]
+            if not batch:
+                continue
+
+            try:
+                await self._deliver(chat_id, batch, bucket, queue)
+            except asyncio.CancelledError:
+                for item in batch:
+                    item.future.cancel()
+                raise
+        self._workers.pop(chat_id, None)
+
+    async def _deliver(self, chat_id, batch: List[OutboxItem], bucket: TokenBucket, queue: Deque[OutboxItem]):
+        """发送一批消息并设置 Future 结果"""
+        attempts = 0
+        while True:
+            try:
+                result = await self._send(chat_id, batch)
+            except RetryAfter as e:
+                # 不计入重试次数，暂停该会话后重新发送同一批消息
+                self.retry_after += 1
+                delay = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                logger.warning(f"Telegram 会话 {chat_id} 触发限速，{delay} 秒后重试 (队列积压 {len(queue)})")
+                bucket.pause(delay)
+                await bucket.acquire()
+                continue
+            except BadRequest as e:
+                # BadRequest 继承自 NetworkError，但重试没有意义
+                self._fail(batch, e)
+            except (TimedOut, NetworkError) as e:
+                attempts += 1
+                if attempts <= self.max_retries:
+                    logger.warning(f"发送到 Telegram 会话 {chat_id} 出现网络错误，第 {attempts} 次重试: {e}")
+                    await asyncio.sleep(min(2 ** attempts, 30))
+                    continue
+                self._fail(batch, e)
+            except Exception as e:
+                self._fail(batch, e)
+            else:
+                self.sent += 1
+                self.merged += len(batch) - 1
+                if len(batch) > 1:
+                    logger.info(f"已将 {len(batch)} 条积压的文本消息合并发送到 Telegram 会话 {chat_id}")
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_result(result)
+            return
+
+    def _fail(self, batch: List[OutboxItem], error: Exception):
+        self.failed += len(batch)
+        for item in batch:
+            if not item.future.done():
+                item.future.set_exception(error)
+
+    async def close(self):
+        """停止所有发送协程，取消尚未发送的消息"""
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._workers.clear()
+        for queue in self._queues.values():
+            while queue:
+                queue.popleft().future.cancel()
+        logger.info("Telegram 发送队列已停止")
@@ -0,0 +1,75 @@
+"""Telegram Webhook 更新接收
+
+运行内嵌的 aiohttp 监听服务，校验 X-Telegram-Bot-Api-Secret-Token 后
+将收到的更新放入 Application.update_queue，由与轮询模式相同的处理器处理。
+"""
+import hmac
+import logging
+import secrets
+from typing import Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class TelegramWebhookServer:
+    """内嵌的 Telegram Webhook 监听服务"""
+
+    def __init__(self, application: Application, listen: str, port: int, path: str,
+                 secret_token: Optional[str] = None):
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = "/" + path.lstrip("/")
+        # 未配置时每次启动随机生成，set_webhook 会同步给 Telegram
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _handle_update(self, request: web.Request) -> web.Response:
+        """接收并校验 Telegram 推送的更新"""
+        received = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(received, self.secret_token):
+            logger.warning(f"拒绝了来自 {request.remote} 的 Webhook 请求: secret token 不匹配")
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+        except Exception:
+            return web.Response(status=400)
+
+        update = Update.de_json(data, self.application.bot)
+        if update is None:
+            return web.Response(status=400)
+        await self.application.update_queue.put(update)
+        return web.Response(status=200)
+
+    async def start(self, webhook_url: str, drop_pending_updates: bool = False):
+        """启动监听服务并向 Telegram 注册 Webhook"""
+        app = web.Application()
+        app.router.add_post(self.path, self._handle_update)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        logger.info(f"Telegram Webhook 监听已启动: {self.listen}:{self.port}{self.path}")
+
+        full_url = webhook_url.rstrip("/") + self.path
+        await self.application.bot.set_webhook(
+            url=full_url,
+            secret_token=self.secret_token,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=drop_pending_updates
+        )
+        logger.info(f"已向 Telegram 注册 Webhook: {full_url}")
+
+    async def stop(self):
+        """停止监听服务 (保留 Telegram 侧的 Webhook 注册，重启期间的更新由 Telegram 暂存)"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+            logger.info("Telegram Webhook 监听已停止")
@@ -0,0 +1,134 @@
+"""Webhook 发送通道
+
+为配置在 WEBHOOK_CHANNELS 中的频道创建或复用 Webhook，并通过共享的 aiohttp 会话发送消息。
+Webhook 拥有独立于机器人账号的限速 bucket，同时支持为不同来源设置用户名和头像。
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional
+
+import discord
+
+import config
+from utils.http_session import get_session
+from utils.json_store import get_store
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookTransport:
+    """按频道管理 Webhook 并发送消息"""
+
+    def __init__(self, bot: discord.Client, data_path: str, channel_ids: Iterable[int]):
+        self.bot = bot
+        self.channel_ids = frozenset(channel_ids)
+        self._webhooks: Dict[int, discord.Webhook] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        # {channel_id: webhook_url}
+        self.store = get_store(data_path)
+        self._urls: Dict[str, str] = self.store.data
+
+    # --- Webhook 获取 ---
+
+    def enabled_for(self, channel) -> bool:
+        """检查频道是否启用了 Webhook 发送"""
+        return channel.id in self.channel_ids
+
+    @staticmethod
+    def _webhook_channel(channel):
+        """子区没有独立的 Webhook，需要使用父频道的 Webhook"""
+        if isinstance(channel, discord.Thread):
+            return channel.parent
+        return channel
+
+    async def get_webhook(self, channel) -> discord.Webhook:
+        """获取频道的 Webhook，优先使用缓存和已保存的地址，否则复用或创建新的 Webhook"""
+        host = self._webhook_channel(channel)
+        if host is None:
+            raise ValueError(f"无法确定子区 {channel.id} 的父频道")
+
+        webhook = self._webhooks.get(host.id)
+        if webhook:
+            return webhook
+
+        lock = self._locks.setdefault(host.id, asyncio.Lock())
+        async with lock:
+            webhook = self._webhooks.get(host.id)
+            if webhook:
+                return webhook
+
+            session = await get_session()
+            url = self._urls.get(str(host.id))
+            if url:
+                webhook = discord.Webhook.from_url(url, session=session, client=self.bot)
+            else:
+                webhook = await self._find_or_create_webhook(host)
+                self._urls[str(host.id)] = webhook.url
+                self.store.mark_dirty()
+                webhook = discord.Webhook.from_url(webhook.url, session=session, client=self.bot)
+
+            self._webhooks[host.id] = webhook
+            return webhook
+
+    async def _find_or_create_webhook(self, host) -> discord.Webhook:
+        """复用机器人已创建的 Webhook，没有则创建"""
+        for existing in await host.webhooks():
+            if existing.token and existing.user and self.bot.user and existing.user.id == self.bot.user.id:
+                logger.info(f"复用频道 {host.id} 中已有的 Webhook {existing.id}")
+                return existing
+        webhook = await host.create_webhook(name=config.BOT_NAME, reason="转发消息使用的 Webhook")
+        logger.info(f"已为频道 {host.id} 创建 Webhook {webhook.id}")
+        return webhook
+
+    def _forget(self, channel):
+        """Webhook 失效时清除缓存和已保存的地址"""
+        host = self._webhook_channel(channel)
+        if host is None:
+            return
+        self._webhooks.pop(host.id, None)
+        if self._urls.pop(str(host.id), None) is not None:
+            self.store.mark_dirty()
+
+    # --- 发送 ---
+
+    async def send(self, channel, username: Optional[str] = None, avatar_url: Optional[str] = None, **kwargs):
+        """通过 Webhook 发送消息，Webhook 被删除时自动重建一次"""
+        if isinstance(channel, discord.Thread):
+            kwargs["thread"] = channel
+        for attempt in range(2):
+            webhook = await self.get_webhook(channel)
+            try:
+                return await webhook.send(
+                    username=username or discord.utils.MISSING,
+                    avatar_url=avatar_url or discord.utils.MISSING,
+                    wait=True,
+                    **kwargs
+                )
+            except discord.NotFound:
+                if attempt:
+                    raise
+                logger.warning(f"频道 {channel.id} 的 Webhook 已失效，正在重建")
+                self._forget(channel)
+
+
+async def send_message(transport: Optional[WebhookTransport], channel, username: Optional[str] = None,
+                       avatar_url: Optional[str] = None, **kwargs):
+    """
+    向频道发送消息，启用了 Webhook 的频道走 Webhook 通道，其余频道使用机器人账号发送
+
+    参数:
+        transport: Webhook 发送通道，None 表示只使用机器人账号
+        channel: 目标频道或子区
+        username: Webhook 显示的用户名(仅 Webhook 通道生效)
+        avatar_url: Webhook 显示的头像(仅 Webhook 通道生效)
+        **kwargs: 传递给 send 的参数 (content/embed/embeds/file 等)
+    """
+    if transport and transport.enabled_for(channel):
+        try:
+            await transport.get_webhook(channel)
+        except Exception as e:
+            # 无法获取 Webhook (例如缺少管理 Webhook 权限) 时回退到机器人账号
+            logger.warning(f"获取频道 {channel.id} 的 Webhook 失败，回退到机器人发送: {e}")
+        else:
+            return await transport.send(channel, username=username, avatar_url=avatar_url, **kwargs)
+    return await channel.send(**kwargs)